@@ -7,7 +7,8 @@ This is a temporary script file.
 
 import numpy as np
 import pickle
-from gather_tce_fromdvxml import tce_seed
+from gather_tce_fromdvxml import TceCatalog
+from tce_join import join_values
 import os
 from subprocess import Popen, PIPE
 import math
@@ -20,6 +21,7 @@ from astropy.visualization import simple_norm
 import fluxts_conditioning as flux_cond
 import glob
 import cjb_utils as cjb
+from tpf_bulk_resamp import tpf_pixel_reader
 import tec_run_parameters as tecrp
 
 
@@ -114,31 +116,30 @@ if __name__ == '__main__':
 
 
     tceSeedInFile = run_name + '_tce.h5'
-    tcedata = tce_seed()
-    all_tces = tcedata.fill_objlist_from_hd5f(tceSeedInFile)
+    tcecat = TceCatalog(tceSeedInFile)
 
     #fin = open(tceSeedInFile, 'rb')
     #all_tces = pickle.load(fin)
     #fin.close()
     
-    alltic = np.array([x.epicId for x in all_tces], dtype=np.int64)
-    allpn = np.array([x.planetNum for x in all_tces], dtype=np.int)
-    allatvalid = np.array([x.at_valid for x in all_tces], dtype=np.int)
-    allrp = np.array([x.at_rp for x in all_tces])
-    allrstar = np.array([x.rstar for x in all_tces])
-    alllogg = np.array([x.logg for x in all_tces])
-    allper = np.array([x.at_period for x in all_tces])
-    alltmags = np.array([x.tmag for x in all_tces])
-    allmes = np.array([x.mes for x in all_tces])
-    allsnr = np.array([x.at_snr for x in all_tces])
-    alldur = np.array([x.at_dur for x in all_tces])
-    allsolarflux = np.array([x.at_effflux for x in all_tces])
-    allatdep = np.array([x.at_depth for x in all_tces])
-    allatepoch = np.array([x.at_epochbtjd for x in all_tces])
-    alltrpvalid = np.array([x.trp_valid for x in all_tces])
-    allatrpdrstar = np.array([x.at_rpDrstar for x in all_tces])
-    allatrpdrstare = np.array([x.at_rpDrstar_e for x in all_tces])
-    allatadrstar = np.array([x.at_aDrstar for x in all_tces])
+    alltic = np.asarray(tcecat['epicId'], dtype=np.int64)
+    allpn = np.asarray(tcecat['planetNum'], dtype=np.int)
+    allatvalid = np.asarray(tcecat['at_valid'], dtype=np.int)
+    allrp = tcecat['at_rp']
+    allrstar = tcecat['rstar']
+    alllogg = tcecat['logg']
+    allper = tcecat['at_period']
+    alltmags = tcecat['tmag']
+    allmes = tcecat['mes']
+    allsnr = tcecat['at_snr']
+    alldur = tcecat['at_dur']
+    allsolarflux = tcecat['at_effflux']
+    allatdep = tcecat['at_depth']
+    allatepoch = tcecat['at_epochbtjd']
+    alltrpvalid = tcecat['trp_valid']
+    allatrpdrstar = tcecat['at_rpDrstar']
+    allatrpdrstare = tcecat['at_rpDrstar_e']
+    allatadrstar = tcecat['at_aDrstar']
 
     # Load the  flux vetting
     dataBlock = np.genfromtxt(vetFile, dtype=[int,int,int,'S1'])
@@ -146,11 +147,7 @@ if __name__ == '__main__':
     fvpn = dataBlock['f1']
     fvvet = dataBlock['f2']
     
-    allvet = np.zeros_like(allpn)
-    for i in range(len(allvet)):
-        idx = np.where((alltic[i] == fvtic) & (allpn[i] == fvpn))[0]
-        if len(idx) > 0:
-            allvet[i] = fvvet[idx]
+    allvet = join_values(alltic, allpn, fvtic, fvpn, fvvet).astype(allpn.dtype)
     # only keep tces with both valid dv and trapezoid fits
     # and flux vetted pass
     #idx = np.where((allatvalid == 1) & (alltrpvalid == 1) & (allsolarflux > 0.0) & \
@@ -201,14 +198,15 @@ if __name__ == '__main__':
                         f = h5py.File(fileInput, 'r')
                         tpf_cad = np.array(f['cadenceNo'])
                         tpf_time = np.array(f['timetbjd'])
-                        tpf_array = np.array(f['flux_array'])
-                        tpf_bkg_array = np.array(f['flux_bkg_array'])
+                        # pixel time series are read as they are used
+                        tpf_array = tpf_pixel_reader(fileInput)
                         tpf_dq = np.array(f['dq_flag'])
                         tpf_vd = np.array(f['valid_data_flag'])
                         tpf_sat = np.array(f['saturate_pixel'])
                         tpf_medimg = np.array(f['median_image'])
                         centRow0 = f['1CRV4P'][0]
                         centCol0 = f['2CRV4P'][0]
+                        f.close()
                         ia, ib = cjb.intersect(cadNo, tpf_cad)
                         useTime = time[ia]
                         useVD = validData[ia]
@@ -264,7 +262,7 @@ if __name__ == '__main__':
                             doDebug = False
                             for ii in range(nr):
                                 for jj in range(nc):
-                                    curFlx = tpf_array[:,ii,jj]
+                                    curFlx = tpf_array.pixel(ii,jj)
                                     # Need to add a bias level 
                                     mnFlx = np.min(curFlx[useVD])
                                     print('MinFlux: {:f}'.format(mnFlx))
@@ -382,6 +380,7 @@ if __name__ == '__main__':
                             plt.close()
                             print('alpha')
                             f.close()
+                        tpf_array.close()
             else:
                 print('Skipping {0}'.format(outFile))
                     
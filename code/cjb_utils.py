@@ -23,6 +23,28 @@ def intersect(*arrays):
     matched = np.array(list(set(arrays[0]).intersection(*arrays[1:])))
     return np.array([np.where(np.in1d(array, matched))[0] for array in arrays])
 
+def near_times(t, refTimes, halfWidth):
+    """ Mask of times within halfWidth of any of refTimes,
+        min(abs(t - refTimes)) < halfWidth, for a whole time array at once.
+        refTimes are sorted and every time is only compared to its
+        neighbors on either side found with searchsorted
+        INPUT:
+          t - array of times
+          refTimes - times to mask around (e.g., skyline or momentum dumps)
+          halfWidth - scalar or array the length of t
+        OUTPUT:
+          mask - bool array length of t
+    """
+    t = np.asarray(t, dtype=float)
+    srtTimes = np.sort(np.asarray(refTimes, dtype=float).ravel())
+    if len(srtTimes) == 0:
+        return np.zeros(t.shape, dtype=bool)
+    j = np.searchsorted(srtTimes, t)
+    left = srtTimes[np.maximum(j-1, 0)]
+    right = srtTimes[np.minimum(j, len(srtTimes)-1)]
+    dist = np.minimum(np.abs(t - left), np.abs(t - right))
+    return dist < halfWidth
+
 def copy_dir_diff(dir1, dir2, dirout):
     """ Copy files in dir1 that are missingin dir2 into dirout """
     print(dir1)
@@ -16,7 +16,7 @@ here and the CHASES test.
 """
 
 import numpy as np
-from gather_tce_fromdvxml import tce_seed
+from gather_tce_fromdvxml import TceCatalog
 import tec_run_parameters as tecrp
 
 if __name__ == "__main__":
@@ -29,8 +29,7 @@ if __name__ == "__main__":
     tceSeedInFile = run_name + '_tce.h5'
     outFile = run_name + '_tce.txt'
     delim = ' | '
-    tcedata = tce_seed()
-    all_tces = tcedata.fill_objlist_from_hd5f(tceSeedInFile)
+    tcecat = TceCatalog(tceSeedInFile)
     
     # Loop over tces and write their info out
     cnt = 0
@@ -132,7 +131,7 @@ if __name__ == "__main__":
 
 
 
-    for td in all_tces:        
+    for td in tcecat:        
         sout = '{0:16d}'.format(td.epicId)  #1
         print(cnt)
         cnt = cnt+1
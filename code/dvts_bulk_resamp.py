@@ -16,6 +16,8 @@ import h5py
 import glob
 import os
 import math
+import argparse
+import multiprocessing
 import tec_run_parameters as tecrp
 
 
@@ -23,11 +25,11 @@ def make_data_dirs(prefix, sector, epic):
     secDir = 'S{0:02d}'.format(sector)
     localDir = os.path.join(prefix,secDir)
     if not os.path.exists(localDir):
-        os.mkdir(localDir)
+        os.makedirs(localDir, exist_ok=True)
     epcDir = '{0:04d}'.format(int(math.floor(epic/1000.0)))
     localDir = os.path.join(prefix,secDir,epcDir)
     if not os.path.exists(localDir):
-        os.mkdir(localDir)
+        os.makedirs(localDir, exist_ok=True)
     return localDir
 
 def idx_filter(idx, *array_list):
@@ -36,11 +38,25 @@ def idx_filter(idx, *array_list):
         new_array_list.append(array[idx])
     return new_array_list
 
+# Time series columns kept from each TCE_n extension and from the
+#  statistics extension.  (fits column, h5d dataset name)
+tce_ts_cols = [('TIME', 'timetbjd'), ('LC_INIT', 'lc_init'), \
+               ('LC_INIT_ERR', 'lc_init_err'), ('LC_WHITE', 'lc_white'), \
+               ('LC_DETREND', 'lc_med_detrend'), ('MODEL_INIT', 'lc_model'), \
+               ('MODEL_WHITE', 'lc_white_model'), ('PHASE', 'lc_phase')]
+stat_ts_cols = [('PDCSAP_FLUX', 'pdc_flux'), ('PDCSAP_FLUX_ERR', 'pdc_flux_err'), \
+                ('DEWEIGHTS', 'deweights')]
+# The statistics columns are stored once per target in
+#  tess_dvstats_<tic>.h5d and linked from each tess_dvts_<tic>_<pn>.h5d
+# These columns are summed rather than averaged in a resample bin
+sum_ts_cols = ['pdc_flux']
+
 def dvts_resamp(file, dirOut, RESAMP, SECTOR=None, overwrite=True):
     """ Resample TESS dv time series file and save as h5d format
         resamp - Resample factor just make it odd okay"""    
 
-    hdulist = fits.open(file)
+    # memmap the binary tables, columns are only read when used
+    hdulist = fits.open(file, memmap=True)
     prihdr = hdulist[0].header
     nTces = prihdr['NUMTCES']
 
@@ -66,6 +82,16 @@ def dvts_resamp(file, dirOut, RESAMP, SECTOR=None, overwrite=True):
     kpTimetbjd = np.array([0.0], dtype=float)
     kpQuality = np.array([0], dtype=int)
     kpPDC = np.array([0.0], dtype=float)
+    # The statistics extension is the same for every TCE on the target
+    #  so it is decoded and resampled once and kept in one shared
+    #  per-target h5d that the per-planet h5d files link to
+    statData = hdulist['statistics'].data
+    statStack = None
+    statFp = None
+    statGroupsDone = []
+    tceNames = [x[1] for x in tce_ts_cols]
+    statNames = [x[1] for x in stat_ts_cols]
+    tceDtypes = None
     for ii in range(nTces):
         # Check if already done
         epic = hdulist[0].header['TICID']
@@ -74,30 +100,44 @@ def dvts_resamp(file, dirOut, RESAMP, SECTOR=None, overwrite=True):
         else:
             sec = SECTOR
         pn = ii+1
-        fileoutput = os.path.join(make_data_dirs(dirOut,sec,epic), 'tess_dvts_{0:016d}_{1:02d}.h5d'.format(epic,pn))
+        localDir = make_data_dirs(dirOut,sec,epic)
+        fileoutput = os.path.join(localDir, 'tess_dvts_{0:016d}_{1:02d}.h5d'.format(epic,pn))
         fileExists=os.path.isfile(fileoutput)
         if (not fileExists) or overwrite:
 
             extname = 'TCE_{0:d}'.format(ii+1)
-            arr = hdulist[extname].data['TIME']
-            nImage = len(arr)
-    
-            cadenceNo = hdulist[extname].data['CADENCENO']
+            tceData = hdulist[extname].data
+            cadenceNo = np.array(tceData['CADENCENO'])
+            nImage = len(cadenceNo)
             kpCadenceNo = cadenceNo
-            timetbjd = hdulist[extname].data['TIME']
-            kpTimetbjd = timetbjd
-            lc_init = hdulist[extname].data['LC_INIT']
-            lc_init_err = hdulist[extname].data['LC_INIT_ERR']
-            lc_white = hdulist[extname].data['LC_WHITE']
-            lc_med_detrend = hdulist[extname].data['LC_DETREND']
-            lc_model = hdulist[extname].data['MODEL_INIT']
-            lc_white_model = hdulist[extname].data['MODEL_WHITE']
-            lc_phase = hdulist[extname].data['PHASE']
-            pdc_flux = hdulist['statistics'].data['PDCSAP_FLUX']
-            pdc_flux_err = hdulist['statistics'].data['PDCSAP_FLUX_ERR']
-            deweights = hdulist['statistics'].data['DEWEIGHTS']
-            kpQuality = hdulist['statistics'].data['QUALITY']
-            kpPDC = hdulist['statistics'].data['PDCSAP_FLUX']
+            newNImage = int(np.floor(nImage / RESAMP))
+            oldNImage = newNImage*RESAMP
+            if statStack is None:
+                statStack = np.array([statData[x[0]] for x in stat_ts_cols], dtype=float)
+                statDtypes = [statData[x[0]].dtype.newbyteorder('=') for x in stat_ts_cols]
+                kpQuality = np.array(statData['QUALITY'])
+                kpPDC = np.array(statData['PDCSAP_FLUX'])
+                # trim off the excess images not integral into resamp
+                #  and downsample the statistics once
+                statBin = np.sum(np.reshape(statStack[:,0:oldNImage], \
+                                        (len(statNames), newNImage, RESAMP)), axis=2)
+                for i, curName in enumerate(statNames):
+                    if not curName in sum_ts_cols:
+                        statBin[i] = statBin[i] / RESAMP
+                statFileName = 'tess_dvstats_{0:016d}.h5d'.format(epic)
+                if overwrite:
+                    statFp = h5py.File(os.path.join(localDir, statFileName), 'w')
+                else:
+                    statFp = h5py.File(os.path.join(localDir, statFileName), 'a')
+            # Stack every TCE float time series into one 2-D array
+            #  rows are in tceNames order
+            tsData = [tceData[x[0]] for x in tce_ts_cols]
+            if tceDtypes is None:
+                tceDtypes = [x.dtype.newbyteorder('=') for x in tsData]
+            tsStack = np.array(tsData, dtype=float)
+            timetbjd = tsStack[0]
+            lc_init = tsStack[1]
+            pdc_flux = statStack[0]
 
             # Fix the issue of having times close to zero
             # First get time stamps on valid data
@@ -106,58 +146,40 @@ def dvts_resamp(file, dirOut, RESAMP, SECTOR=None, overwrite=True):
             minGdTime = np.min(timetbjd[idx])
             idx = np.where(timetbjd < minGdTime-30.0)[0]
             timetbjd[idx] = np.nan
+            kpTimetbjd = timetbjd.copy()
     
-            newNImage = int(np.floor(nImage / RESAMP))
-            oldNImage = newNImage*RESAMP
             # trim off the excess images not integral into resamp
-            idx = np.arange(0,oldNImage)
-            cadenceNo, timetbjd, lc_init, lc_init_err, lc_white, lc_med_detrend, \
-                lc_model, lc_white_model, lc_phase, pdc_flux, pdc_flux_err, \
-                deweights = idx_filter(idx, cadenceNo, timetbjd, lc_init, lc_init_err, lc_white, lc_med_detrend, \
-                                       lc_model, lc_white_model, lc_phase, pdc_flux, pdc_flux_err, \
-                                       deweights)
-        
-            # Do downsampling of data stream
-            cadenceNoBeg = np.min(np.reshape(cadenceNo, (newNImage, RESAMP)), axis=1)
-            cadenceNoEnd = np.max(np.reshape(cadenceNo, (newNImage, RESAMP)), axis=1)
-            cadenceNo = np.mean(np.reshape(cadenceNo, (newNImage, RESAMP)), axis=1, dtype=int)
-            timetbjd = np.mean(np.reshape(timetbjd, (newNImage, RESAMP)), axis=1)
-            lc_init = np.mean(np.reshape(lc_init, (newNImage, RESAMP)), axis=1)
-            lc_init_err = np.mean(np.reshape(lc_init_err, (newNImage, RESAMP)), axis=1)
-            lc_white = np.mean(np.reshape(lc_white, (newNImage, RESAMP)), axis=1)
-            lc_med_detrend = np.mean(np.reshape(lc_med_detrend, (newNImage, RESAMP)), axis=1)
-            lc_model = np.mean(np.reshape(lc_model, (newNImage, RESAMP)), axis=1)
-            lc_white_model = np.mean(np.reshape(lc_white_model, (newNImage, RESAMP)), axis=1)
-            lc_phase = np.mean(np.reshape(lc_phase, (newNImage, RESAMP)), axis=1)
-            pdc_flux = np.sum(np.reshape(pdc_flux, (newNImage, RESAMP)), axis=1)
-            pdc_flux_err = np.mean(np.reshape(pdc_flux_err, (newNImage, RESAMP)), axis=1)
-            deweights = np.mean(np.reshape(deweights, (newNImage, RESAMP)), axis=1)
+            #  and do downsampling of all data streams in one pass
+            cadBlk = np.reshape(cadenceNo[0:oldNImage], (newNImage, RESAMP))
+            cadenceNoBeg = np.min(cadBlk, axis=1)
+            cadenceNoEnd = np.max(cadBlk, axis=1)
+            cadenceNo = np.mean(cadBlk, axis=1, dtype=int)
+            tsStack = np.sum(np.reshape(tsStack[:,0:oldNImage], \
+                                        (len(tceNames), newNImage, RESAMP)), axis=2)
+            for i, curName in enumerate(tceNames):
+                if not curName in sum_ts_cols:
+                    tsStack[i] = tsStack[i] / RESAMP
     
             # Identify data that is missing or NaN
+            timetbjd = tsStack[0]
+            lc_init = tsStack[1]
+            pdc_flux = statBin[0]
             idx = np.where((np.isfinite(timetbjd)) & (np.isfinite(lc_init)) & (np.isfinite(pdc_flux)))[0]
             valid_data_flag = np.zeros((newNImage,), dtype=np.bool_)
             valid_data_flag[idx] = True
             
             # Trim all leading in-valid data
+            trimIdx = 0
             if not valid_data_flag[0]:
                 idx = np.where(valid_data_flag)[0]
                 if not len(idx) == 0:
-                    idx = idx[0]
-                    cadenceNoBeg = cadenceNoBeg[idx:]
-                    cadenceNoEnd = cadenceNoEnd[idx:]
-                    cadenceNo = cadenceNo[idx:]
-                    timetbjd = timetbjd[idx:]
-                    lc_init = lc_init[idx:]
-                    lc_init_err = lc_init_err[idx:]
-                    lc_white = lc_white[idx:]
-                    lc_med_detrend = lc_med_detrend[idx:]
-                    lc_model = lc_model[idx:]
-                    lc_white_model = lc_white_model[idx:]
-                    lc_phase = lc_phase[idx:]
-                    pdc_flux = pdc_flux[idx:]
-                    pdc_flux_err = pdc_flux_err[idx:]
-                    deweights = deweights[idx:]
-                    valid_data_flag = valid_data_flag[idx:]
+                    trimIdx = idx[0]
+                    cadenceNoBeg = cadenceNoBeg[trimIdx:]
+                    cadenceNoEnd = cadenceNoEnd[trimIdx:]
+                    cadenceNo = cadenceNo[trimIdx:]
+                    tsStack = tsStack[:,trimIdx:]
+                    valid_data_flag = valid_data_flag[trimIdx:]
+                    timetbjd = tsStack[0]
                 else:
                     print('No Valid data? {0:d} {1:d}'.format(ii,epic))
             
@@ -167,23 +189,30 @@ def dvts_resamp(file, dirOut, RESAMP, SECTOR=None, overwrite=True):
                 dataSpan = np.max(timetbjd[idx]) - np.min(timetbjd[idx])
                 if dataSpan > dataSpanMax:
                     dataSpanMax = dataSpan
+
+            # Statistics trimmed the same as this TCE go in the shared file
+            #  TCEs on a target normally share the trim so this is written once
+            statGroup = 'trim_{0:06d}'.format(trimIdx)
+            if not statGroup in statGroupsDone:
+                if statGroup in statFp:
+                    del statFp[statGroup]
+                for i, curName in enumerate(statNames):
+                    tmp = statFp.create_dataset(statGroup + '/' + curName, \
+                            data=statBin[i,trimIdx:].astype(statDtypes[i]), compression='gzip')
+                statGroupsDone.append(statGroup)
     
             # Now save data as h5py 
             f = h5py.File(fileoutput, 'w')
             tmp = f.create_dataset('cadenceNo', data=cadenceNo, compression='gzip') 
             tmp = f.create_dataset('cadenceNoBeg', data=cadenceNoBeg, compression='gzip') 
             tmp = f.create_dataset('cadenceNoEnd', data=cadenceNoEnd, compression='gzip') 
-            tmp = f.create_dataset('timetbjd', data=timetbjd, compression='gzip')
-            tmp = f.create_dataset('lc_init', data=lc_init, compression='gzip')
-            tmp = f.create_dataset('lc_init_err', data=lc_init_err, compression='gzip')
-            tmp = f.create_dataset('lc_white', data=lc_white, compression='gzip')
-            tmp = f.create_dataset('lc_med_detrend', data=lc_med_detrend, compression='gzip')
-            tmp = f.create_dataset('lc_model', data=lc_model, compression='gzip')
-            tmp = f.create_dataset('lc_white_model', data=lc_white_model, compression='gzip')
-            tmp = f.create_dataset('lc_phase', data=lc_phase, compression='gzip')
-            tmp = f.create_dataset('pdc_flux', data=pdc_flux, compression='gzip')
-            tmp = f.create_dataset('pdc_flux_err', data=pdc_flux_err, compression='gzip')
-            tmp = f.create_dataset('deweights', data=deweights, compression='gzip')
+            # Keep the fits column data types (native byte order) in the h5d
+            for i, curName in enumerate(tceNames):
+                tmp = f.create_dataset(curName, data=tsStack[i].astype(tceDtypes[i]), compression='gzip')
+            # Statistics columns are links into the shared per-target file
+            #  which is found relative to the directory of this file
+            for curName in statNames:
+                f[curName] = h5py.ExternalLink(statFileName, '/' + statGroup + '/' + curName)
             tmp = f.create_dataset('valid_data_flag', data=valid_data_flag, compression='gzip')
             for i in range(len(keepprihdr)):
                 curval = hdulist[0].header[keepprihdr[i]]
@@ -193,9 +222,27 @@ def dvts_resamp(file, dirOut, RESAMP, SECTOR=None, overwrite=True):
                     tmp = f.create_dataset(keepprihdr[i], data=np.array([-1], dtype=formatprihdr[i]))
                             
             f.close()
+    if statFp is not None:
+        statFp.close()
+    hdulist.close()
     return dataSpanMax, kpCadenceNo, kpTimetbjd, kpQuality, kpPDC
 
+def dvts_resamp_worker(args):
+    """ Unpack the arguments for dvts_resamp so it can be used
+        with multiprocessing Pool.imap """
+    fil, dirOut, RESAMP, SECTOR, overwrite = args
+    return dvts_resamp(fil, dirOut, RESAMP, SECTOR=SECTOR, overwrite=overwrite)
+
 if __name__ == "__main__":
+    # Parse the command line arguments for multiprocessing
+    # The fits files are resampled in a pool of nWrk processes
+    # python dvts_bulk_resamp.py -n 13
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int,\
+                        default = 1, \
+                        help="Number of Workers")
+    args = parser.parse_args()
+    nWrk = int(args.n)
 
     # get run parameters
     tec_root 		= tecrp.tec_root
@@ -246,11 +293,19 @@ if __name__ == "__main__":
     maxCad = -1
     cadenceDict = {}
     
-    for fil in fileList:
+    # Files are resampled in the pool, but results come back in fileList
+    #  order so the cadence map does not depend on the number of workers
+    workArgs = [(fil, dirOutputs, RESAMP, SECTOR_OVRRIDE, overwrite) for fil in fileList]
+    if nWrk > 1:
+        pool = multiprocessing.Pool(nWrk)
+        results = pool.imap(dvts_resamp_worker, workArgs, chunksize=4)
+    else:
+        pool = None
+        results = map(dvts_resamp_worker, workArgs)
+    for dataSpan, cadno, timetjd, quality, pdc in results:
         cnt = cnt + 1
         if np.mod(cnt,10) == 0:
             print(cnt,' Data Span {0:f} GdFrac: {1:f}'.format(dataSpanMax, gdFracMax))
-        dataSpan, cadno, timetjd, quality, pdc = dvts_resamp(fil, dirOutputs, RESAMP, SECTOR=SECTOR_OVRRIDE, overwrite=overwrite)
         # Do things differently in single sector versus multi-sector
         if SECTOR_OVRRIDE is None:
             # Single sector portion
@@ -274,6 +329,9 @@ if __name__ == "__main__":
             for i, curCad in enumerate(cadno):
                 cadenceDict[curCad] = timetjd[i]
             dataSpanMax = len(cadenceDict)
+    if pool is not None:
+        pool.close()
+        pool.join()
                 
     # multisector output all times encountered
     if not SECTOR_OVRRIDE is None:    
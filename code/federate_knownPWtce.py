@@ -11,8 +11,7 @@ work.  Also queries MAST for TIC's that may be near.
 
 import numpy as np
 import toidb_federate as fed
-from gather_tce_fromdvxml import tce_seed
-import scipy.special as spec
+from gather_tce_fromdvxml import TceCatalog
 import csv
 import sys
 import time
@@ -115,18 +114,6 @@ def query_ticcone(curRa, curDec, searchRad):
 
     return ticList
 
-def coughlin_sigmap(p1,p2):
-    up1 = p1
-    up2 = p2
-    if up1 > up2:
-        tmp = up2
-        up2 = up1
-        up1 = tmp
-    delP = (up1 - up2)/up1
-    delPp = abs(delP - round(delP))
-    return np.sqrt(2.0)*spec.erfcinv(delPp)
-
-
 if __name__ == '__main__':
 
     # get run parameters
@@ -253,24 +240,23 @@ if __name__ == '__main__':
 
     # Load the tce data h5
     tceSeedInFile = run_name + '_tce.h5'
-    tcedata = tce_seed()
-    all_tces = tcedata.fill_objlist_from_hd5f(tceSeedInFile)
+    tcecat = TceCatalog(tceSeedInFile)
     
-    alltic = np.array([x.epicId for x in all_tces], dtype=np.int64)
-    allpn = np.array([x.planetNum for x in all_tces], dtype=int)
-    allatvalid = np.array([x.at_valid for x in all_tces], dtype=int)
-    allrp = np.array([x.at_rp for x in all_tces])
-    allper = np.array([x.at_period for x in all_tces])
-    alldur = np.array([x.at_dur for x in all_tces])
-    allepc = np.array([x.at_epochbtjd for x in all_tces])
-    alltrpvalid = np.array([x.trp_valid for x in all_tces], dtype=int)
-    alltrpdur = np.array([x.trp_dur for x in all_tces])
-    alltrpepc = np.array([x.trp_epochbtjd for x in all_tces])
-    alltcedur = np.array([x.pulsedur for x in all_tces])
-    alltceepc = np.array([x.tce_epoch for x in all_tces])
-    alltceper = np.array([x.tce_period for x in all_tces])
-    alltceCadStrt = np.array([x.data_start for x in all_tces], dtype=np.int64)
-    alltceCadEnd = np.array([x.data_end for x in all_tces], dtype=np.int64)
+    alltic = np.asarray(tcecat['epicId'], dtype=np.int64)
+    allpn = np.asarray(tcecat['planetNum'], dtype=int)
+    allatvalid = np.asarray(tcecat['at_valid'], dtype=int)
+    allrp = tcecat['at_rp']
+    allper = tcecat['at_period']
+    alldur = tcecat['at_dur']
+    allepc = tcecat['at_epochbtjd']
+    alltrpvalid = np.asarray(tcecat['trp_valid'], dtype=int)
+    alltrpdur = tcecat['trp_dur']
+    alltrpepc = tcecat['trp_epochbtjd']
+    alltcedur = tcecat['pulsedur']
+    alltceepc = tcecat['tce_epoch']
+    alltceper = tcecat['tce_period']
+    alltceCadStrt = np.asarray(tcecat['data_start'], dtype=np.int64)
+    alltceCadEnd = np.asarray(tcecat['data_end'], dtype=np.int64)
     # Go through each tce and use valid fits from dv, trpzd, tce in that order for matching
     useper = np.zeros_like(allper)
     useepc = np.zeros_like(allper)
@@ -347,9 +333,7 @@ if __name__ == '__main__':
             bstpn, bsttic, bstMatch, bstStat, bstPeriodRatio, bstPeriodRatioFlag, bstFederateFlag, nFed = \
                     genericFed(curper, curepc, tryper, tryepc, trydur, trypn, trytic, uowStartUse, uowEndUse)
 
-#            sigMatch = np.zeros((len(tryper),), dtype=float)
-#            for j in range(len(tryper)):
-#                sigMatch[j] = coughlin_sigmap(curper, tryper[j])
+#            sigMatch = fed.coughlin_sigmap(curper, tryper)
 #            idxSig = np.where(sigMatch > 3.0)[0]
 #            if len(idxSig)>0:
 #                tryper = tryper[idxSig]
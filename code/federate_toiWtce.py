@@ -8,7 +8,7 @@ Created on Wed Feb 28 11:51:04 2018
 
 import numpy as np
 import toidb_federate as fed
-from gather_tce_fromdvxml import tce_seed
+from gather_tce_fromdvxml import TceCatalog
 import csv
 import sys
 import time
@@ -216,31 +216,30 @@ if __name__ == '__main__':
 
     # Load the tce data h5
     tceSeedInFile = run_name + '_tce.h5'
-    tcedata = tce_seed()
-    all_tces = tcedata.fill_objlist_from_hd5f(tceSeedInFile)
+    tcecat = TceCatalog(tceSeedInFile)
     
-    alltic = np.array([x.epicId for x in all_tces], dtype=np.int64)
-    allpn = np.array([x.planetNum for x in all_tces], dtype=int)
-    allatvalid = np.array([x.at_valid for x in all_tces], dtype=int)
-    allra = np.array([x.raDeg for x in all_tces])
-    alldec = np.array([x.decDeg for x in all_tces])
-    allrow = np.array([x.row for x in all_tces])
-    allcol = np.array([x.col for x in all_tces])
-    allcam = np.array([x.camera for x in all_tces])
-    allccd = np.array([x.ccd for x in all_tces])
-    allpixvalid = np.array([x.pixposvalid for x in all_tces])
-    allrp = np.array([x.at_rp for x in all_tces])
-    allper = np.array([x.at_period for x in all_tces])
-    alldur = np.array([x.at_dur for x in all_tces])
-    allepc = np.array([x.at_epochbtjd for x in all_tces])
-    alltrpvalid = np.array([x.trp_valid for x in all_tces], dtype=int)
-    alltrpdur = np.array([x.trp_dur for x in all_tces])
-    alltrpepc = np.array([x.trp_epochbtjd for x in all_tces])
-    alltcedur = np.array([x.pulsedur for x in all_tces])
-    alltceepc = np.array([x.tce_epoch for x in all_tces])
-    alltceper = np.array([x.tce_period for x in all_tces])
-    alltceCadStrt = np.array([x.data_start for x in all_tces], dtype=np.int64)
-    alltceCadEnd = np.array([x.data_end for x in all_tces], dtype=np.int64)
+    alltic = np.asarray(tcecat['epicId'], dtype=np.int64)
+    allpn = np.asarray(tcecat['planetNum'], dtype=int)
+    allatvalid = np.asarray(tcecat['at_valid'], dtype=int)
+    allra = tcecat['raDeg']
+    alldec = tcecat['decDeg']
+    allrow = tcecat['row']
+    allcol = tcecat['col']
+    allcam = tcecat['camera']
+    allccd = tcecat['ccd']
+    allpixvalid = tcecat['pixposvalid']
+    allrp = tcecat['at_rp']
+    allper = tcecat['at_period']
+    alldur = tcecat['at_dur']
+    allepc = tcecat['at_epochbtjd']
+    alltrpvalid = np.asarray(tcecat['trp_valid'], dtype=int)
+    alltrpdur = tcecat['trp_dur']
+    alltrpepc = tcecat['trp_epochbtjd']
+    alltcedur = tcecat['pulsedur']
+    alltceepc = tcecat['tce_epoch']
+    alltceper = tcecat['tce_period']
+    alltceCadStrt = np.asarray(tcecat['data_start'], dtype=np.int64)
+    alltceCadEnd = np.asarray(tcecat['data_end'], dtype=np.int64)
     # Go through each tce and use valid fits from dv, trpzd, tce in that order for matching
     useper = np.zeros_like(allper)
     useepc = np.zeros_like(allper)
@@ -13,44 +13,26 @@ import matplotlib.pyplot as plt
 import os
 import pickle
 import math
-from gather_tce_fromdvxml import tce_seed
-import scipy.special as spec
+from gather_tce_fromdvxml import TceCatalog
+import toidb_federate as fed
 import tec_run_parameters as tecrp
 
 
-def coughlin_sigmap(p1,p2):
-    up1 = p1
-    up2 = p2
-    if up1 > up2:
-        tmp = up2
-        up2 = up1
-        up1 = tmp
-    delP = (up1 - up2)/up1
-    delPp = abs(delP - round(delP))
-    return np.sqrt(2.0)*spec.erfcinv(delPp)
-    
-
-def get_useable_ephems(all_tces):
-    allepics = np.zeros((len(all_tces),), dtype=np.int64)
-    allpns = np.zeros((len(all_tces),), dtype=int)
-    allper = np.zeros((len(all_tces),))
-    allepoch = np.zeros_like(allper)
-    allduration = np.zeros_like(allper)
-    for i,td in enumerate(all_tces):
-        allepics[i] = td.epicId
-        allpns[i] = td.planetNum
-        if td.at_valid == 1:		# all transit fit valid
-            allper[i] = td.at_period
-            allepoch[i] = td.at_epochbtjd
-            allduration[i] = td.at_dur
-        elif td.trp_valid ==1:		# trapazoidal fit valid
-            allper[i] = td.tce_period
-            allepoch[i] = td.trp_epochbtjd
-            allduration[i] = td.trp_dur
-        else:				# use TCE parameters
-            allper[i] = td.tce_period
-            allepoch[i] = td.tce_epoch
-            allduration[i] = td.pulsedur
+def get_useable_ephems(tcecat):
+    allepics = np.asarray(tcecat['epicId'], dtype=np.int64)
+    allpns = np.asarray(tcecat['planetNum'], dtype=int)
+    atvalid = tcecat['at_valid'] == 1		# all transit fit valid
+    trpvalid = np.logical_and(np.logical_not(atvalid), \
+                              tcecat['trp_valid'] == 1)	# trapazoidal fit valid
+    # Default to TCE parameters
+    allper = np.array(tcecat['tce_period'])
+    allepoch = np.array(tcecat['tce_epoch'])
+    allduration = np.array(tcecat['pulsedur'])
+    allper[atvalid] = tcecat['at_period'][atvalid]
+    allepoch[atvalid] = tcecat['at_epochbtjd'][atvalid]
+    allduration[atvalid] = tcecat['at_dur'][atvalid]
+    allepoch[trpvalid] = tcecat['trp_epochbtjd'][trpvalid]
+    allduration[trpvalid] = tcecat['trp_dur'][trpvalid]
     return allepics, allpns, allper, allepoch, allduration
 
 if __name__ == '__main__':
@@ -73,21 +55,20 @@ if __name__ == '__main__':
     SECTOR = sector_number
     fluxVetOut = 'spoc_fluxtriage_' + run_name + '.txt'
 
-    tcedata = tce_seed()
-    all_tces = tcedata.fill_objlist_from_hd5f(tceSeedInFile)
+    tcecat = TceCatalog(tceSeedInFile)
     
-    allepics, allpns, allpers, allepochs, alldurations = get_useable_ephems(all_tces)
+    allepics, allpns, allpers, allepochs, alldurations = get_useable_ephems(tcecat)
     
     fout = open(fluxVetOut, 'w')
     debug = False
     # Loop over tces and perform flux vetting
     # For a particular id
     #debug=True
-    #alltic = np.array([x.epicId for x in all_tces], dtype=np.int64)
+    #alltic = np.asarray(tcecat['epicId'], dtype=np.int64)
     #idxdebug = np.where(alltic == 123702439)[0]
     cnt = 0
-    #for td in [all_tces[idxdebug[0]],all_tces[idxdebug[0]]]:
-    for td in all_tces:
+    #for td in [tcecat.row(idxdebug[0]),tcecat.row(idxdebug[0])]:
+    for td in tcecat:
         print(cnt)
         cnt = cnt+1
         epicid = td.epicId
@@ -190,19 +171,12 @@ if __name__ == '__main__':
         # Check for TCE being a secondary of previous TCE
         if flux_pass:
             if pn >= 2:
-                idx = np.where(allepics == epicid)[0]
-                tmppns = allpns[idx]
-                tmppers = allpers[idx]
-                tmpepochs = allepochs[idx]
-                tmpdurations = alldurations[idx]
-                haveMatch = False
-                for jj in range(len(tmppns)):
-                    if (tmppns[jj] < pn) and (not haveMatch):
-                        sigp = coughlin_sigmap(period, tmppers[jj])
-                        if sigp > 2.9:
-                            haveMatch = True
-                            flux_pass = False
-                            flux_str.append('SecondaryOfPN_{:02d}'.format(tmppns[jj]))
+                idx = np.where((allepics == epicid) & (allpns < pn))[0]
+                sigp = fed.coughlin_sigmap(period, allpers[idx])
+                idxMatch = np.where(sigp > 2.9)[0]
+                if len(idxMatch) > 0:
+                    flux_pass = False
+                    flux_str.append('SecondaryOfPN_{:02d}'.format(allpns[idx[idxMatch[0]]]))
         if flux_pass:            
             str = '{0:9d} {1:2d} {2:1d} PASS\n'.format(epicid, pn, int(flux_pass))
         else:
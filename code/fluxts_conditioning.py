@@ -114,6 +114,55 @@ def fill_noise(nW, preY, postY, SIG=3.0, orderAR=4, debug=False):
         plt.show()
     return finalFill
     
+def smoothn_parameter(tmp_linflat, durat, medfiltScaleFac=10, \
+                      filterCircularShift=20, debug=False):
+    # Estimate the smoothn smoothing parameter for a linearly flattened
+    #  light curve.  smoothn chooses the parameter for a median filtered
+    #  version that only has long time scale variability, which is then scaled
+    #  to the native time series
+    # tmp_linflat - light curve normalized by a linear fit, valid oot data only
+    # durat - [cadences] transit duration to protect during smoothing
+    # medfiltScaleFac - the initial medfilt window is durat*medfiltScaleFac
+    # Step 2 make a median filtered lightcurve that only keeps very long
+    #  time scale variability
+    medfilterlen = np.int(durat * medfiltScaleFac)
+    # Make sure medfilterlen is odd
+    if np.mod(medfilterlen,2) == 0:
+        medfilterlen = medfilterlen+1
+    tmp_medfilt = sig.medfilt2d(tmp_linflat.reshape(1,-1), (1, medfilterlen))[0]
+    # medfilt2d is much faster than medfilt
+    #tmp_medfilt = sig.medfilt(tmp_linflat, medfilterlen)
+    # We only need this median filter to get the alpha parameter from smoothn
+    # Trim away the begining and end to remove edge effects
+    # Protect agains tmp_medfilt being shorter than twice medfilterlen
+    if len(tmp_medfilt) > 3*medfilterlen:
+        tmp2_medfilt = tmp_medfilt[medfilterlen:-medfilterlen]
+    else:
+        medfilterlen = int(0.1*len(tmp_medfilt))
+        tmp2_medfilt = tmp_medfilt[medfilterlen:-medfilterlen]
+    smthresult = smth.smoothn(tmp2_medfilt, np.ones_like(tmp2_medfilt))
+    medsmthparm = smthresult[2]
+    # Scale the smoothing parameter by the variance in the median filtered and
+    #  the native time series.  This results in smoothing of similar scale
+    #  when smoothn is used with the native time scale.  Not too sure why the roll
+    #   function is used, but doing it because this was done in matlab version
+    fluxAmp = (np.max(smthresult[0]) - np.min(smthresult[0])) / np.std(tmp_linflat[medfilterlen:-medfilterlen]-smthresult[0])
+    smthparm  = np.var(np.diff(np.roll(tmp_linflat, filterCircularShift) ) ) \
+                    / np.var( np.diff(tmp2_medfilt-smthresult[0]) )  * medsmthparm * fluxAmp
+    print(medsmthparm, smthparm, smthparm/medsmthparm, fluxAmp)
+    if not np.isfinite(smthparm):
+        print("Bad smoothing parameter!")
+#    else:
+#        print("Smoothing parameter: {0:f}".format(smthparm))
+    if debug:
+        plt.plot(tmp_linflat, '.')
+        plt.plot(tmp_medfilt, '-')
+        plt.show()
+        plt.plot(tmp2_medfilt, '.')
+        plt.plot(smthresult[0], '-')
+        plt.show()
+    return smthparm
+
 def detrend_with_smoothn_edgefix(flux, vd, ootvd, durat, fixEdge=True, \
                                  medfiltScaleFac=10, gapThreshold=5, edgeExamWindow=8, \
                                  edgeSig=6.0, edgeMinCad=50, debug=False, secNum=None):
@@ -180,44 +229,8 @@ def detrend_with_smoothn_edgefix(flux, vd, ootvd, durat, fixEdge=True, \
         plt.plot(tmpcadwt, tmp_linflat_wt, '.')
         plt.show()
     
-    # Step 2 make a median filtered lightcurve that only keeps very long
-    #  time scale variability
-    medfilterlen = np.int(durat * medfiltScaleFac)
-    # Make sure medfilterlen is odd
-    if np.mod(medfilterlen,2) == 0:
-        medfilterlen = medfilterlen+1
-    tmp_medfilt = sig.medfilt2d(tmp_linflat.reshape(1,-1), (1, medfilterlen))[0]
-    # medfilt2d is much faster than medfilt
-    #tmp_medfilt = sig.medfilt(tmp_linflat, medfilterlen)
-    # We only need this median filter to get the alpha parameter from smoothn
-    # Trim away the begining and end to remove edge effects
-    # Protect agains tmp_medfilt being shorter than twice medfilterlen
-    if len(tmp_medfilt) > 3*medfilterlen:
-        tmp2_medfilt = tmp_medfilt[medfilterlen:-medfilterlen]
-    else:
-        medfilterlen = int(0.1*len(tmp_medfilt))
-        tmp2_medfilt = tmp_medfilt[medfilterlen:-medfilterlen]
-    smthresult = smth.smoothn(tmp2_medfilt, np.ones_like(tmp2_medfilt))
-    medsmthparm = smthresult[2]
-    # Scale the smoothing parameter by the variance in the median filtered and
-    #  the native time series.  This results in smoothing of similar scale
-    #  when smoothn is used with the native time scale.  Not too sure why the roll
-    #   function is used, but doing it because this was done in matlab version
-    fluxAmp = (np.max(smthresult[0]) - np.min(smthresult[0])) / np.std(tmp_linflat[medfilterlen:-medfilterlen]-smthresult[0])
-    smthparm  = np.var(np.diff(np.roll(tmp_linflat, filterCircularShift) ) ) \
-                    / np.var( np.diff(tmp2_medfilt-smthresult[0]) )  * medsmthparm * fluxAmp
-    print(medsmthparm, smthparm, smthparm/medsmthparm, fluxAmp)
-    if not np.isfinite(smthparm):
-        print("Bad smoothing parameter!")
-#    else:
-#        print("Smoothing parameter: {0:f}".format(smthparm))
-    if debug:
-        plt.plot(tmpcad, tmp_linflat, '.')
-        plt.plot(tmpcad, tmp_medfilt, '-')
-        plt.show()
-        plt.plot(tmp2_medfilt, '.')
-        plt.plot(smthresult[0], '-')
-        plt.show()
+    smthparm = smoothn_parameter(tmp_linflat, durat, medfiltScaleFac, \
+                                 filterCircularShift=filterCircularShift, debug=debug)
     # Look for gaps bigger than gapThreshold
     idxGaps = np.where(np.diff(tmpcadwt) > gapThreshold)[0]
     idxGapStart = np.array([0])
@@ -307,6 +320,102 @@ def detrend_with_smoothn_edgefix(flux, vd, ootvd, durat, fixEdge=True, \
         plt.show()
     return final_smooth_flux, bad_edge_flag
 
+def detrend_with_smoothn_edgefix_batch(fluxArr, vd, ootvd, durat, fixEdge=True, \
+                                 medfiltScaleFac=10, gapThreshold=5, edgeExamWindow=8, \
+                                 edgeSig=6.0, edgeMinCad=50, smthparm=None, debug=False):
+    # Batched version of detrend_with_smoothn_edgefix for many light curves
+    #  sharing the same cadences (e.g., all the pixels of a target pixel stamp)
+    # fluxArr - [nPix, nCad] one light curve per row
+    # vd, ootvd, durat and the edge/gap parameters are the same as
+    #   detrend_with_smoothn_edgefix and are shared by all rows.  The valid data
+    #   must be finite for every row.
+    # smthparm - smoothn smoothing parameter used for all rows.  If None it
+    #   is estimated once from the sum of the rows
+    # Returns final_smooth_flux and bad_edge_flag with the shape of fluxArr
+    fluxArr = np.atleast_2d(np.asarray(fluxArr, dtype=float))
+    nPix, nCad = fluxArr.shape
+    bad_edge_flag = np.zeros_like(fluxArr)
+    final_smooth_flux = np.zeros_like(fluxArr)
+    runcad = np.arange(nCad)
+    combvd = np.logical_and(vd, ootvd)
+    tmpcad = runcad[combvd]
+    tmpflux = fluxArr[:,combvd]
+    tmpcadwt = runcad[vd]
+    tmpfluxwt = fluxArr[:,vd]
+    tmpbadedgewt = np.zeros_like(tmpfluxwt)
+    tmpootvd = ootvd[vd]
+
+    # Linear fit of every row at once (same as linregress)
+    delcad = tmpcad - np.mean(tmpcad)
+    slope = np.dot(tmpflux - np.mean(tmpflux, axis=1, keepdims=True), delcad) / \
+                np.dot(delcad, delcad)
+    intercept = np.mean(tmpflux, axis=1) - slope * np.mean(tmpcad)
+    tmp_linflat_wt = tmpfluxwt / (slope[:,np.newaxis]*tmpcadwt + intercept[:,np.newaxis])
+    
+    # One smoothing parameter from the summed light curve
+    if smthparm is None:
+        sumflux = np.sum(tmpflux, axis=0)
+        linfit = st.linregress(tmpcad, sumflux)
+        sum_linflat = sumflux / (linfit[0]*tmpcad + linfit[1])
+        smthparm = smoothn_parameter(sum_linflat, durat, medfiltScaleFac, debug=debug)
+
+    # Look for gaps bigger than gapThreshold
+    idxGaps = np.where(np.diff(tmpcadwt) > gapThreshold)[0]
+    idxGapStart = np.array([0])
+    idxGapEnd = np.array([nCad])
+    if len(idxGaps)>0:
+        idxGapStart = np.append(idxGapStart, idxGaps+1)
+        idxGapEnd = np.append(idxGaps+1, nCad)
+    tmp_smooth_flux = np.zeros_like(tmp_linflat_wt)
+    for j in range(len(idxGaps)+1):
+        ist = idxGapStart[j]
+        ien = idxGapEnd[j]
+        curflux = tmp_linflat_wt[:,ist:ien]
+        nCur = curflux.shape[1]
+        curootvd = tmpootvd[ist:ien]
+        wght = np.where(np.logical_not(curootvd), 0.0, 1.0)
+        # In transit data set to nan for smoothn to interpolate over
+        ucurflux = np.where(np.logical_not(curootvd), np.nan, curflux)
+        # Check to make sure there is at least three valid data points in current chunk
+        if np.sum(curootvd)>3:
+            smthresult = smth.smoothn_batch(ucurflux, wght, smthparm)
+            cursmoothflux = smthresult[0]
+        else:
+            cursmoothflux = np.ones_like(curflux)
+        # Check for bad smoothing
+        idxBad = np.where(np.logical_not(np.all(np.isfinite(cursmoothflux), axis=1)))[0]
+        if len(idxBad)>0:
+            print("non finite smoothing detected {:d} rows".format(len(idxBad)))
+            print("{:d} {:d}".format(nCur, len(np.where(curootvd)[0])))
+            cursmoothflux[idxBad] = 1.0
+        tmp_smooth_flux[:,ist:ien] = curflux / cursmoothflux
+        # Check for edge issues, only rows with a bad edge are refit
+        if nCur > edgeMinCad and fixEdge:
+            # Calculate noise in data before edge at end
+            tmpsmth = tmp_smooth_flux[:,ist:ien]
+            preEdgeMad = robust.mad(tmpsmth[:,nCur-4*edgeExamWindow:nCur-edgeExamWindow], axis=1)
+            edge = tmpsmth[:,nCur-edgeExamWindow-1:]
+            edgePosOutlier = np.max((edge-1.0)/preEdgeMad[:,np.newaxis], axis=1)
+            for ip in np.where(edgePosOutlier > edgeSig)[0]:
+                fullEdge = np.copy(tmpsmth[ip,nCur-4*edgeExamWindow:])
+                subsmthresult = smth.smoothn(fullEdge, np.ones_like(fullEdge)*preEdgeMad[ip], smthparm/100.0, robust=False)
+                tmp_smooth_flux[ip,ist:ien][nCur-4*edgeExamWindow:] = (fullEdge/subsmthresult[0])
+                tmpbadedgewt[ip,ist:ien][nCur-edgeExamWindow-1:] = 1.0
+            # Calculat noise in data after edge at beginning
+            tmpsmth = tmp_smooth_flux[:,ist:ien]
+            postEdgeMad = robust.mad(tmpsmth[:,edgeExamWindow+1:4*edgeExamWindow], axis=1)
+            edge = tmpsmth[:,0:edgeExamWindow+1]
+            edgePosOutlier = np.max((edge-1.0)/postEdgeMad[:,np.newaxis], axis=1)
+            for ip in np.where(edgePosOutlier > edgeSig)[0]:
+                fullEdge = np.copy(tmpsmth[ip,0:4*edgeExamWindow])
+                subsmthresult = smth.smoothn(fullEdge, np.ones_like(fullEdge)*postEdgeMad[ip], smthparm/100.0, robust=False)
+                tmp_smooth_flux[ip,ist:ien][0:4*edgeExamWindow] = (fullEdge/subsmthresult[0])
+                tmpbadedgewt[ip,ist:ien][0:edgeExamWindow+1] = 1.0
+
+    final_smooth_flux[:,vd] = tmp_smooth_flux
+    bad_edge_flag[:,vd] = tmpbadedgewt
+    return final_smooth_flux, bad_edge_flag
+
 def fill_extend_fluxts(flux, vd, noiseWindow, doExtend=True, debug=False):
     #  fill all gaps and extend to the next power of two
     # Work on extending flux, detrending, filling gaps and identify outliers
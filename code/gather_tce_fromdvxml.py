@@ -8,12 +8,24 @@ with TEC and makes a convenient pickle file with all this information
 """
 import numpy as np
 import glob
+import os
 import gzip
 #from xml.dom.minidom import parse, parseString
-import xml.etree.cElementTree as ET
+try:
+    import xml.etree.cElementTree as ET
+except ImportError: # cElementTree was removed in Python 3.9
+    import xml.etree.ElementTree as ET
 import copy
 import h5py
+import argparse
+import multiprocessing
+import time
 import tec_run_parameters as tecrp
+from tce_join import tce_key, join_index
+
+# Namespace there is extra junk prepended to tags
+#  This is supposed to make it easier to use
+ns = {'ns': 'http://www.nasa.gov/2018/TESS/DV'}
 
 
 class tce_seed(object):
@@ -165,21 +177,93 @@ class tce_seed(object):
         self.all_cadstart = np.array([-1]*100, dtype=int)
         self.all_cadend = np.array([-1]*100, dtype=int)
         
-    def store_objlist_as_hd5f(self, objlist, fileName):
+    def objlist_as_struct_array(self, objlist):
+        # Convert a list of tce_seed objects into the numpy structured array
+        #  one whole column at a time
+        np_dset = np.zeros(len(objlist), dtype=self.store_struct_numpy_dtype)
+        if len(objlist) > 0:
+            for curname in self.store_names:
+                np_dset[curname] = [getattr(curobj, curname) for curobj in objlist]
+        return np_dset
+
+    def store_objlist_as_hd5f(self, objlist, fileName, dvFiles=None):
         # save the class structure into hd5
         # objlist is a list of the tce_seed objects
-        # First create the array of numpy structered arrays
-        np_dset = np.ndarray(len(objlist), dtype=self.store_struct_numpy_dtype)
-        # Convert the class variables into the numpy structured dtype
-        for i, curobj in enumerate(objlist):
-            for j in range(len(self.store_names)):
-                np_dset[i][self.store_names[j]] = getattr(curobj, self.store_names[j])
-        # Data set should be all loaded ready to write out
+        np_dset = self.objlist_as_struct_array(objlist)
+        self.store_struct_array_as_hd5f(np_dset, fileName, dvFiles)
+
+    def store_struct_array_as_hd5f(self, np_dset, fileName, dvFiles=None, \
+                                   chunkRows=1024):
+        # Data set is chunked, compressed and resizable so later batches
+        #  can be added with append_objlist_to_hd5f
+        # dvFiles are the names of the DV xml files the TCEs came from
         fp = h5py.File(fileName, 'w')
-        h5f_dset = fp.create_dataset('dset', shape=(len(objlist),), dtype=self.store_struct_numpy_dtype)
+        h5f_dset = fp.create_dataset('dset', shape=(len(np_dset),), \
+                        maxshape=(None,), chunks=(chunkRows,), \
+                        compression='gzip', shuffle=True, \
+                        dtype=self.store_struct_numpy_dtype)
         h5f_dset[:] = np_dset
         fp.close()
-        
+        if dvFiles is not None:
+            self.add_ingested_files_hd5f(dvFiles, fileName)
+
+    def ingested_files_hd5f(self, fileName):
+        # Set of DV xml file names already stored in the hd5 file
+        fp = h5py.File(fileName, 'r')
+        if 'dvFiles' in fp:
+            dvFiles = set(fp['dvFiles'].asstr()[:])
+        else:
+            dvFiles = set()
+        fp.close()
+        return dvFiles
+
+    def add_ingested_files_hd5f(self, dvFiles, fileName):
+        # Add DV xml file names to the resizable dvFiles list in the hd5 file
+        oldFiles = self.ingested_files_hd5f(fileName)
+        newFiles = sorted(set([os.path.basename(x) for x in dvFiles]) - oldFiles)
+        fp = h5py.File(fileName, 'a')
+        if not 'dvFiles' in fp:
+            fp.create_dataset('dvFiles', shape=(0,), maxshape=(None,), \
+                              chunks=(256,), dtype=h5py.string_dtype())
+        h5f_files = fp['dvFiles']
+        nOld = h5f_files.shape[0]
+        h5f_files.resize((nOld + len(newFiles),))
+        h5f_files[nOld:] = newFiles
+        fp.close()
+
+    def append_objlist_to_hd5f(self, objlist, fileName, dvFiles=None):
+        # Add a batch of tce_seed objects to the end of an existing hd5
+        #  file without rewriting it.  Creates the file if it is not there.
+        #  A TCE that is already in the file (same TIC and planet number)
+        #  replaces the stored row in place.  Appended rows follow the
+        #  rows already stored rather than being merged into their order
+        if not os.path.isfile(fileName):
+            self.store_objlist_as_hd5f(objlist, fileName, dvFiles)
+            return
+        np_dset = self.objlist_as_struct_array(objlist)
+        fp = h5py.File(fileName, 'a')
+        h5f_dset = fp['dset']
+        if h5f_dset.maxshape[0] is not None:
+            fp.close()
+            raise ValueError('{0} dset is not resizable, rewrite it with store_objlist_as_hd5f'.format(fileName))
+        # Only the key columns of the stored TCEs are needed
+        idx = join_index(np_dset['epicId'], np_dset['planetNum'], \
+                         h5f_dset.fields('epicId')[:], h5f_dset.fields('planetNum')[:])
+        ia = np.where(idx >= 0)[0]
+        if len(ia) > 0:
+            # h5py wants increasing unique indices, the last copy of a
+            #  TCE in the batch wins
+            uidx, iLast = np.unique(idx[ia][::-1], return_index=True)
+            h5f_dset[uidx] = np_dset[ia[::-1][iLast]]
+            print('Replaced {0:d} TCEs already in {1}'.format(len(uidx), fileName))
+        np_dset = np_dset[idx < 0]
+        nOld = h5f_dset.shape[0]
+        h5f_dset.resize((nOld + len(np_dset),))
+        h5f_dset[nOld:] = np_dset
+        fp.close()
+        if dvFiles is not None:
+            self.add_ingested_files_hd5f(dvFiles, fileName)
+
     def fill_objlist_from_hd5f(self, fileName):
         fp = h5py.File(fileName, 'r')
         np_dset = np.array(fp['dset'])
@@ -195,159 +279,411 @@ class tce_seed(object):
         return all_objs
         
         
+class TceCatalog(object):
+    """ Column oriented view of the TCE seed h5 file written by
+        tce_seed.store_objlist_as_hd5f.  The chunked, compressed dset
+        is read one chunk at a time the first time a column is touched,
+        so each chunk is only decompressed once.  Rows can be read without
+        loading the columns.  Older files with a contiguous uncompressed
+        dset are memory mapped straight from the h5 file instead.
+        cat['at_period'] - column array for every TCE
+        cat[mask] - new TceCatalog with only the selected TCEs
+        cat.find(tic, pn) - row index of a TCE or -1 if not present
+        cat.row(i) - np.record for TCE i with attribute access (td.mes)
+        for td in cat: - iterate np.record rows as for a tce_seed list
+    """
+    def __init__(self, fileName=None, data=None):
+        self.fileName = fileName
+        self.data = data
+        self.h5fp = None
+        self.h5dset = None
+        self.sortkey = None
+        self.sortidx = None
+        if data is None and fileName is not None:
+            self.open_hd5f(fileName)
+        if self.data is not None:
+            self.nTce = len(self.data)
+
+    def open_hd5f(self, fileName):
+        fp = h5py.File(fileName, 'r')
+        h5dset = fp['dset']
+        self.nTce = h5dset.shape[0]
+        dtype = h5dset.dtype
+        offset = h5dset.id.get_offset()
+        if (offset is not None) and (h5dset.chunks is None):
+            # Contiguous storage, map it directly
+            fp.close()
+            self.data = np.memmap(fileName, dtype=dtype, mode='c', \
+                                  offset=offset, shape=(self.nTce,))
+        elif self.nTce == 0:
+            fp.close()
+            self.data = np.zeros((0,), dtype=dtype)
+        else:
+            # Chunked/compressed storage, read columns as they are needed
+            self.h5fp = fp
+            self.h5dset = h5dset
+
+    def close(self):
+        if self.h5fp is not None:
+            self.h5fp.close()
+            self.h5fp = None
+            self.h5dset = None
+
+    @property
+    def dtype(self):
+        if self.data is not None:
+            return self.data.dtype
+        return self.h5dset.dtype
+
+    @property
+    def names(self):
+        return self.dtype.names
+
+    def __len__(self):
+        return self.nTce
+
+    def column(self, name):
+        if self.data is None:
+            self.read_chunks()
+        return self.data[name]
+
+    def read_chunks(self):
+        """ Read a chunked/compressed dset one chunk at a time so each
+            chunk is decompressed once for all of the columns, rather
+            than once for every column requested
+        """
+        data = np.empty((self.nTce,), dtype=self.h5dset.dtype)
+        blockSize = self.h5dset.chunks[0]
+        for i in range(0, self.nTce, blockSize):
+            data[i:i+blockSize] = self.h5dset[i:i+blockSize]
+        self.data = data
+        self.close()
+
+    def rows(self, idx):
+        """ Return a structured array copy of the requested rows """
+        if self.data is not None:
+            return np.asarray(self.data[idx])
+        # h5py wants increasing indices
+        idx = np.arange(self.nTce)[idx]
+        if np.isscalar(idx):
+            return self.h5dset[idx]
+        uidx, inv = np.unique(idx, return_inverse=True)
+        if len(uidx) == 0:
+            return np.zeros((0,), dtype=self.dtype)
+        return self.h5dset[uidx][inv]
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.column(key)
+        if self.data is not None:
+            # Slices stay views into the map, masks/indices copy
+            return TceCatalog(data=self.data[key])
+        return TceCatalog(data=self.rows(key))
+
+    def row(self, i):
+        return self.rows(i).view(np.recarray)
+
+    def __iter__(self):
+        blockSize = 4096
+        for i in range(0, self.nTce, blockSize):
+            blk = self.rows(slice(i, i+blockSize)).view(np.recarray)
+            for td in blk:
+                yield td
+
+    def find(self, tic, pn):
+        """ Return row index of TCE tic-pn or -1 if not in catalog """
+        if self.sortkey is None:
+            key = tce_key(self.column('epicId'), self.column('planetNum'))
+            self.sortidx = np.argsort(key, kind='mergesort')
+            self.sortkey = key[self.sortidx]
+        want = tce_key(tic, pn)
+        j = np.searchsorted(self.sortkey, want)
+        if j < len(self.sortkey) and self.sortkey[j] == want:
+            return int(self.sortidx[j])
+        return -1
+
+    def find_row(self, tic, pn):
+        i = self.find(tic, pn)
+        if i < 0:
+            return None
+        return self.row(i)
+
+
+def nstag(tag):
+    """ Return the fully namespace qualified tag name """
+    return '{' + ns['ns'] + '}' + tag
+
+# Target level elements and planetResults elements needed to fill tce_seed
+#  all other elements are discarded as soon as they are parsed
+keep_target_tags = set([nstag(x) for x in ['decDegrees', 'raDegrees', \
+                    'effectiveTemp', 'limbDarkeningModel', 'log10Metallicity', \
+                    'pmRa', 'pmDec', 'radius', 'tessMag', 'planetResults']])
+keep_planet_tags = set([nstag(x) for x in ['allTransitsFit', 'trapezoidalFit', \
+                    'ghostDiagnosticResults', 'planetCandidate', 'centroidResults', \
+                    'binaryDiscriminationResults', 'differenceImageResults']])
+
+# modelParameter lookup tables for the fits
+#  (tce_seed variable name, modelParameter name, xml attribute to read)
+atfit_params = [('at_epochbtjd', 'transitEpochBtjd', 'value'), \
+                ('at_epochbtjd_e', 'transitEpochBtjd', 'uncertainty'), \
+                ('at_rp', 'planetRadiusEarthRadii', 'value'), \
+                ('at_rp_e', 'planetRadiusEarthRadii', 'uncertainty'), \
+                ('at_imp', 'minImpactParameter', 'value'), \
+                ('at_dur', 'transitDurationHours', 'value'), \
+                ('at_depth', 'transitDepthPpm', 'value'), \
+                ('at_period', 'orbitalPeriodDays', 'value'), \
+                ('at_period_e', 'orbitalPeriodDays', 'uncertainty'), \
+                ('at_rpDrstar', 'ratioPlanetRadiusToStarRadius', 'value'), \
+                ('at_rpDrstar_e', 'ratioPlanetRadiusToStarRadius', 'uncertainty'), \
+                ('at_aDrstar', 'ratioSemiMajorAxisToStarRadius', 'value'), \
+                ('at_eqtemp', 'equilibriumTempKelvin', 'value'), \
+                ('at_effflux', 'effectiveStellarFlux', 'value')]
+trpfit_params = [('trp_epochbtjd', 'transitEpochBtjd', 'value'), \
+                 ('trp_dur', 'transitDurationHours', 'value'), \
+                 ('trp_depth', 'transitDepthPpm', 'value')]
+
+def model_parameter_dict(fitElem):
+    """ Build a name -> modelParameter element dictionary for the
+        modelParameters block of a fit so every parameter is found
+        with a single pass over the block rather than one xpath
+        search per parameter
+    """
+    mpdict = {}
+    mpblock = fitElem.find('ns:modelParameters', ns)
+    if mpblock is not None:
+        for mp in mpblock:
+            mpdict[mp.get('name')] = mp
+    return mpdict
+
+def open_dvxml(fileName):
+    """ Locally the xml files are gzipped, but they are not gzipped
+        from MAST. Open either kind for binary reading
+    """
+    infile = open(fileName, 'rb')
+    magic = infile.read(2)
+    infile.seek(0)
+    if magic == b'\x1f\x8b':
+        infile.close()
+        infile = gzip.open(fileName, 'rb')
+    return infile
+
+def iterparse_dvxml(fileName):
+    """ Stream parse a DV xml file with iterparse and return the root element
+        Only the elements needed to fill tce_seed are kept in the tree;
+        the other elements are cleared right after they are parsed
+        so a single large target never holds the full tree in memory
+    """
+    infile = open_dvxml(fileName)
+    root = None
+    depth = 0
+    topTag = ''
+    try:
+        for event, elem in ET.iterparse(infile, events=('start', 'end')):
+            if event == 'start':
+                depth = depth + 1
+                if depth == 1:
+                    root = elem
+                elif depth == 2:
+                    topTag = elem.tag
+            else:
+                if depth == 2 and not elem.tag in keep_target_tags:
+                    elem.clear()
+                elif depth == 3 and topTag == nstag('planetResults') and \
+                                not elem.tag in keep_planet_tags:
+                    elem.clear()
+                depth = depth - 1
+    finally:
+        infile.close()
+    return root
+
+def parse_dvxml_file(fileName):
+    """ Parse a single DV xml file and return the list of tce_seed
+        for every TCE on the target.  This is the unit of work handed
+        to the process pool so it must only depend on fileName
+        OUTPUT:
+          fileName - the input file name
+          tces - list of tce_seed for the TCEs on this target
+          parseTime - [s] wall time spent parsing this file
+    """
+    startTime = time.time()
+    try:
+        root = iterparse_dvxml(fileName)
+        # Number of candidates
+        ticId = int(root.get('ticId'))
+        nCand = int(root.get('planetCandidateCount'))
+    except:
+        print('ERROR READING FILE {0}'.format(fileName))
+        return fileName, [], time.time() - startTime
+    # instantiate tce_seed class
+    targdata = tce_seed()
+    # Fill in the target specific information
+    targdata.epicId = ticId
+    targdata.totPlanetNum = nCand
+    targdata.data_start = int(root.get('startCadence'))
+    targdata.data_end = int(root.get('endCadence'))
+    targdata.sourceId = 'SPOC'
+    targdata.decDeg = float(root.find('ns:decDegrees', ns).attrib['value'])
+    targdata.raDeg = float(root.find('ns:raDegrees', ns).attrib['value'])
+    targdata.teff = float(root.find('ns:effectiveTemp', ns).attrib['value'])
+    targdata.teff_e = float(root.find('ns:effectiveTemp', ns).attrib['uncertainty'])
+    targdata.limbc[0] = float(root.find('ns:limbDarkeningModel', ns).attrib['coefficient1'])
+    targdata.limbc[1] = float(root.find('ns:limbDarkeningModel', ns).attrib['coefficient2'])
+    targdata.limbc[2] = float(root.find('ns:limbDarkeningModel', ns).attrib['coefficient3'])
+    targdata.limbc[3] = float(root.find('ns:limbDarkeningModel', ns).attrib['coefficient4'])
+    targdata.feh = float(root.find('ns:log10Metallicity', ns).attrib['value'])
+    targdata.logg = float(root.find('ns:log10Metallicity', ns).attrib['value'])
+    targdata.pmra = float(root.find('ns:pmRa', ns).attrib['value'])
+    targdata.pmdec = float(root.find('ns:pmDec', ns).attrib['value'])
+    targdata.rstar = float(root.find('ns:radius', ns).attrib['value'])
+    targdata.rstar_e = float(root.find('ns:radius', ns).attrib['uncertainty'])
+    targdata.tmag = float(root.find('ns:tessMag', ns).attrib['value'])
+    # Get the camera position information from the first availalbe diff iage analysis
+    tmp = root.find("ns:planetResults[@planetNumber='1']/ns:differenceImageResults", ns)
+    targdata.sector = int(tmp.get('sector'))
+    targdata.ccd = int(tmp[0].get('ccdNumber'))
+    targdata.camera = int(tmp[0].get('cameraNumber'))
+    tmp2 = tmp.find("ns:ticReferenceCentroid", ns)
+    targdata.row = float(tmp2[0].get('value'))
+    targdata.col = float(tmp2[1].get('value'))
+    if np.isfinite(targdata.row) and np.isfinite(targdata.col) and (targdata.row > 0.0) and (targdata.col > 0.0):
+        targdata.pixposvalid = 1
+
+    # Get the cadence start and end for all sectors with data
+    tmpall = root.findall("ns:planetResults[@planetNumber='1']/ns:differenceImageResults", ns)
+    for idx, itmp in enumerate(tmpall):
+        targdata.all_sectors[idx] =  int(itmp.get('sector'))
+        targdata.all_cadstart[idx] = int(itmp.get('startCadence'))
+        targdata.all_cadend[idx] = int(itmp.get('endCadence'))
+    # Double check that the number of sectors agrees with sectorsObserved
+    secobs = root.get('sectorsObserved')
+    secsum = 0
+    for x in secobs:
+        secsum = secsum + int(x)
+    if not len(np.where(targdata.all_sectors>=0)[0]) == secsum:
+        print('Sector avail mismatch! {0} {1:d}'.format(fileName, targdata.epicId))
+
+    tces = []
+    for j in range(nCand):
+        # Copy the target specific information to a new tce_seed class
+        tcedata = copy.deepcopy(targdata)
+        pres = root.find("ns:planetResults[@planetNumber='{0:d}']".format(j+1), ns)
+        tcedata.planetNum = j+1
+        # Get all transit fit information
+        atfit = pres.find('ns:allTransitsFit', ns)
+        tcedata.at_valid = int(atfit.get('fullConvergence') == 'true')
+        tcedata.at_snr = float(atfit.get('modelFitSnr'))
+        atparams = model_parameter_dict(atfit)
+        for attr, name, key in atfit_params:
+            setattr(tcedata, attr, float(atparams[name].get(key)))
+        ghostdat = pres.find('ns:ghostDiagnosticResults', ns)
+        tcedata.ghostcoreval = float(ghostdat.find('ns:coreApertureCorrelationStatistic', ns).get('value'))
+        tcedata.ghostcoresig = float(ghostdat.find('ns:coreApertureCorrelationStatistic', ns).get('significance'))
+        tcedata.ghosthaloval = float(ghostdat.find('ns:haloApertureCorrelationStatistic', ns).get('value'))
+        tcedata.ghosthalosig = float(ghostdat.find('ns:haloApertureCorrelationStatistic', ns).get('significance'))
+        pcdat = pres.find('ns:planetCandidate', ns)
+        tcedata.modchi2 = float(pcdat.get('modelChiSquare2'))/np.sqrt(float(pcdat.get('modelChiSquareDof2')))
+        tcedata.ntran = int(pcdat.get('observedTransitCount'))
+        tcedata.chi2 = float(pcdat.get('chiSquare2'))/np.sqrt(float(pcdat.get('chiSquareDof2')))
+        tcedata.tce_epoch = float(pcdat.get('epochTjd'))
+        tcedata.mes = float(pcdat.get('maxMultipleEventSigma'))
+        tcedata.maxsesinmes = float(pcdat.get('maxSesInMes'))
+        tcedata.tce_period = float(pcdat.get('orbitalPeriodInDays'))
+        tcedata.robstat = float(pcdat.get('robustStatistic'))
+        tcedata.pulsedur = float(pcdat.get('trialTransitPulseDurationInHours'))
+        trpdat = pres.find('ns:trapezoidalFit', ns)
+        tcedata.trp_valid = int(trpdat.get('fullConvergence') == 'true')
+        tcedata.trp_snr = float(trpdat.get('modelFitSnr'))
+        if tcedata.trp_valid == 1:
+            trpparams = model_parameter_dict(trpdat)
+            for attr, name, key in trpfit_params:
+                setattr(tcedata, attr, float(trpparams[name].get(key)))
+
+        centdat = pres.find('ns:centroidResults', ns)
+        tcedata.cent_tic_offset = float(centdat.find("ns:differenceImageMotionResults/ns:msTicCentroidOffsets/ns:meanSkyOffset", ns).get('value'))
+        tcedata.cent_tic_offset_e = float(centdat.find("ns:differenceImageMotionResults/ns:msTicCentroidOffsets/ns:meanSkyOffset", ns).get('uncertainty'))
+        tcedata.cent_oot_offset = float(centdat.find("ns:differenceImageMotionResults/ns:msControlCentroidOffsets/ns:meanSkyOffset", ns).get('value'))
+        tcedata.cent_oot_offset_e = float(centdat.find("ns:differenceImageMotionResults/ns:msControlCentroidOffsets/ns:meanSkyOffset", ns).get('uncertainty'))
+        bindiscrim = pres.find('ns:binaryDiscriminationResults', ns)
+        tcedata.oe_signif = float(bindiscrim.find("ns:oddEvenTransitDepthComparisonStatistic", ns).get('significance'))
+        tces.append(tcedata)
+#        for child in pcdat:
+#            print(child.tag, child.attrib)
+#        for child in pres:
+#            print(child.tag, child.attrib)
+#        print("hello World")
+    return fileName, tces, time.time() - startTime
+
+
 if __name__ == "__main__":
-    
+    # Parse the command line arguments for multiprocessing
+    # The xml files are parsed in a pool of nWrk processes
+    # python gather_tce_fromdvxml.py -n 13
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int,\
+                        default = 1, \
+                        help="Number of Workers")
+    parser.add_argument("-a", action='store_true', \
+                        help="Append TCEs to an existing _tce.h5 rather than overwrite")
+    args = parser.parse_args()
+    nWrk = int(args.n)
+    appendFlag = args.a
+
     # get run parameters
     run_name 		= tecrp.run_name
     data_root_dir	= tecrp.data_root_dir
     dv_results_dir	= tecrp.dv_results_dir
 
     tceSeedOutFile = run_name + '_tce.h5'
+    # Record the parse time of every file to see where ingest time goes
+    parseTimeOutFile = run_name + '_tce_parsetime.txt'
     headXMLPath = data_root_dir + dv_results_dir + '/'
     #headXMLPath = '/nobackupp15/spocops/incoming-outgoing/exports/science-products-tsop-2630/sector-48/ftl-dv-results/'
 
-    # Namespace there is extra junk prepended to tags
-    #  This is supposed to make it easier to use 
-    ns = {'ns': 'http://www.nasa.gov/2018/TESS/DV'}
-    
     # Get list of XML files 
     fileList = glob.glob(headXMLPath + '*dvr.xml*')
+    if appendFlag and os.path.isfile(tceSeedOutFile):
+        # Only parse the xml files that are not already in the _tce.h5
+        doneFiles = tce_seed().ingested_files_hd5f(tceSeedOutFile)
+        fileList = [x for x in fileList if not os.path.basename(x) in doneFiles]
+        print("Appending {0:d} new xml files".format(len(fileList)))
     # Gather data for each TCE
+    #  Each file is parsed independently and the results are merged
+    #  here in whatever order the workers finish
+    if nWrk > 1:
+        pool = multiprocessing.Pool(nWrk)
+        results = pool.imap_unordered(parse_dvxml_file, fileList, chunksize=8)
+    else:
+        pool = None
+        results = map(parse_dvxml_file, fileList)
     all_tces = []
-    for i in range(len(fileList)):
+    fpt = open(parseTimeOutFile, 'w')
+    totParseTime = 0.0
+    maxParseTime = 0.0
+    for i, (curFile, tces, parseTime) in enumerate(results):
         if np.mod(i,20)==0:
             print("Parsed {0:d} of {1:d} Targs w/TCEs: {2:d}".format(i, len(fileList), len(all_tces)))
-
-        
-        # open and read gzipped xml file locally files are gzipped
-        #  but they are not gzip from MAST deal with both situations
-        # parse xml file content
-        try:
-            infile = gzip.open( fileList[i] )
-            tree = ET.parse(infile)
-        except:
-            infile = open(fileList[i])
-            tree = ET.parse(infile)
-
-        #dom = parseString( content )
-        root = tree.getroot()
-        # Number of candidates
-        try:
-            ticId = int(root.get('ticId'))
-            nCand = int(root.get('planetCandidateCount'))
-        except:
-            print('ERROR READING FILE {0}'.format(fileList[i]))
-        # instantiate tce_seed class
-        targdata = tce_seed()
-        # Fill in the target specific information
-        targdata.epicId = ticId
-        targdata.totPlanetNum = nCand
-        targdata.data_start = int(root.get('startCadence'))
-        targdata.data_end = int(root.get('endCadence'))
-        targdata.sourceId = 'SPOC'
-        targdata.decDeg = float(root.find('ns:decDegrees', ns).attrib['value'])
-        targdata.raDeg = float(root.find('ns:raDegrees', ns).attrib['value'])
-        targdata.teff = float(root.find('ns:effectiveTemp', ns).attrib['value'])
-        targdata.teff_e = float(root.find('ns:effectiveTemp', ns).attrib['uncertainty'])
-        targdata.limbc[0] = float(root.find('ns:limbDarkeningModel', ns).attrib['coefficient1'])
-        targdata.limbc[1] = float(root.find('ns:limbDarkeningModel', ns).attrib['coefficient2'])
-        targdata.limbc[2] = float(root.find('ns:limbDarkeningModel', ns).attrib['coefficient3'])
-        targdata.limbc[3] = float(root.find('ns:limbDarkeningModel', ns).attrib['coefficient4'])
-        targdata.feh = float(root.find('ns:log10Metallicity', ns).attrib['value'])
-        targdata.logg = float(root.find('ns:log10Metallicity', ns).attrib['value'])
-        targdata.pmra = float(root.find('ns:pmRa', ns).attrib['value'])
-        targdata.pmdec = float(root.find('ns:pmDec', ns).attrib['value'])
-        targdata.rstar = float(root.find('ns:radius', ns).attrib['value'])
-        targdata.rstar_e = float(root.find('ns:radius', ns).attrib['uncertainty'])
-        targdata.tmag = float(root.find('ns:tessMag', ns).attrib['value'])
-        # Get the camera position information from the first availalbe diff iage analysis
-        tmp = root.find("ns:planetResults[@planetNumber='1']/ns:differenceImageResults", ns)
-        targdata.sector = int(tmp.get('sector'))
-        targdata.ccd = int(tmp[0].get('ccdNumber'))
-        targdata.camera = int(tmp[0].get('cameraNumber'))
-        tmp2 = tmp.find("ns:ticReferenceCentroid", ns)
-        targdata.row = float(tmp2[0].get('value'))
-        targdata.col = float(tmp2[1].get('value'))
-        if np.isfinite(targdata.row) and np.isfinite(targdata.col) and (targdata.row > 0.0) and (targdata.col > 0.0):
-            targdata.pixposvalid = 1
-            
-        # Get the cadence start and end for all sectors with data
-        tmpall = root.findall("ns:planetResults[@planetNumber='1']/ns:differenceImageResults", ns)
-        for idx, itmp in enumerate(tmpall):
-            targdata.all_sectors[idx] =  int(itmp.get('sector'))
-            targdata.all_cadstart[idx] = int(itmp.get('startCadence'))
-            targdata.all_cadend[idx] = int(itmp.get('endCadence'))
-        # Double check that the number of sectors agrees with sectorsObserved
-        secobs = root.get('sectorsObserved')
-        secsum = 0
-        for x in secobs:
-            secsum = secsum + int(x)
-        if not len(np.where(targdata.all_sectors>=0)[0]) == secsum:
-            print('Sector avail mismatch! {0:d} {1:d}'.format(i, targdata.epicId))
-        
-        
-        for j in range(nCand):
-            # Copy the target specific information to a new tce_seed class
-            tcedata = copy.deepcopy(targdata)
-            pres = root.find("ns:planetResults[@planetNumber='{0:d}']".format(j+1), ns)
-            tcedata.planetNum = j+1
-            # Get all transit fit information
-            atfit = pres.find('ns:allTransitsFit', ns)
-            tcedata.at_valid = int(atfit.get('fullConvergence') == 'true')
-            tcedata.at_snr = float(atfit.get('modelFitSnr'))
-            tcedata.at_epochbtjd = float(atfit.find("ns:modelParameters/ns:modelParameter[@name='transitEpochBtjd']", ns).get('value'))
-            tcedata.at_epochbtjd_e = float(atfit.find("ns:modelParameters/ns:modelParameter[@name='transitEpochBtjd']", ns).get('uncertainty'))
-            tcedata.at_rp = float(atfit.find("ns:modelParameters/ns:modelParameter[@name='planetRadiusEarthRadii']", ns).get('value'))
-            tcedata.at_rp_e = float(atfit.find("ns:modelParameters/ns:modelParameter[@name='planetRadiusEarthRadii']", ns).get('uncertainty'))
-            tcedata.at_imp = float(atfit.find("ns:modelParameters/ns:modelParameter[@name='minImpactParameter']", ns).get('value'))
-            tcedata.at_dur = float(atfit.find("ns:modelParameters/ns:modelParameter[@name='transitDurationHours']", ns).get('value'))
-            tcedata.at_depth = float(atfit.find("ns:modelParameters/ns:modelParameter[@name='transitDepthPpm']", ns).get('value'))
-            tcedata.at_period = float(atfit.find("ns:modelParameters/ns:modelParameter[@name='orbitalPeriodDays']", ns).get('value'))
-            tcedata.at_period_e = float(atfit.find("ns:modelParameters/ns:modelParameter[@name='orbitalPeriodDays']", ns).get('uncertainty'))
-            tcedata.at_rpDrstar = float(atfit.find("ns:modelParameters/ns:modelParameter[@name='ratioPlanetRadiusToStarRadius']", ns).get('value'))
-            tcedata.at_rpDrstar_e = float(atfit.find("ns:modelParameters/ns:modelParameter[@name='ratioPlanetRadiusToStarRadius']", ns).get('uncertainty'))
-            tcedata.at_aDrstar = float(atfit.find("ns:modelParameters/ns:modelParameter[@name='ratioSemiMajorAxisToStarRadius']", ns).get('value'))
-            tcedata.at_eqtemp = float(atfit.find("ns:modelParameters/ns:modelParameter[@name='equilibriumTempKelvin']", ns).get('value'))
-            tcedata.at_effflux = float(atfit.find("ns:modelParameters/ns:modelParameter[@name='effectiveStellarFlux']", ns).get('value'))
-            ghostdat = pres.find('ns:ghostDiagnosticResults', ns)
-            tcedata.ghostcoreval = float(ghostdat.find('ns:coreApertureCorrelationStatistic', ns).get('value'))
-            tcedata.ghostcoresig = float(ghostdat.find('ns:coreApertureCorrelationStatistic', ns).get('significance'))
-            tcedata.ghosthaloval = float(ghostdat.find('ns:haloApertureCorrelationStatistic', ns).get('value'))
-            tcedata.ghosthalosig = float(ghostdat.find('ns:haloApertureCorrelationStatistic', ns).get('significance'))
-            pcdat = pres.find('ns:planetCandidate', ns)
-            tcedata.modchi2 = float(pcdat.get('modelChiSquare2'))/np.sqrt(float(pcdat.get('modelChiSquareDof2')))
-            tcedata.ntran = int(pcdat.get('observedTransitCount'))
-            tcedata.chi2 = float(pcdat.get('chiSquare2'))/np.sqrt(float(pcdat.get('chiSquareDof2')))
-            tcedata.tce_epoch = float(pcdat.get('epochTjd'))
-            tcedata.mes = float(pcdat.get('maxMultipleEventSigma'))
-            tcedata.maxsesinmes = float(pcdat.get('maxSesInMes'))
-            tcedata.tce_period = float(pcdat.get('orbitalPeriodInDays'))
-            tcedata.robstat = float(pcdat.get('robustStatistic'))
-            tcedata.pulsedur = float(pcdat.get('trialTransitPulseDurationInHours'))
-            trpdat = pres.find('ns:trapezoidalFit', ns)
-            tcedata.trp_valid = int(trpdat.get('fullConvergence') == 'true')
-            tcedata.trp_snr = float(trpdat.get('modelFitSnr'))
-            if tcedata.trp_valid == 1:                
-                tcedata.trp_epochbtjd = float(trpdat.find("ns:modelParameters/ns:modelParameter[@name='transitEpochBtjd']", ns).get('value'))
-                tcedata.trp_dur = float(trpdat.find("ns:modelParameters/ns:modelParameter[@name='transitDurationHours']", ns).get('value'))
-                tcedata.trp_depth = float(trpdat.find("ns:modelParameters/ns:modelParameter[@name='transitDepthPpm']", ns).get('value'))
-
-            centdat = pres.find('ns:centroidResults', ns)
-            tcedata.cent_tic_offset = float(centdat.find("ns:differenceImageMotionResults/ns:msTicCentroidOffsets/ns:meanSkyOffset", ns).get('value'))
-            tcedata.cent_tic_offset_e = float(centdat.find("ns:differenceImageMotionResults/ns:msTicCentroidOffsets/ns:meanSkyOffset", ns).get('uncertainty'))
-            tcedata.cent_oot_offset = float(centdat.find("ns:differenceImageMotionResults/ns:msControlCentroidOffsets/ns:meanSkyOffset", ns).get('value'))
-            tcedata.cent_oot_offset_e = float(centdat.find("ns:differenceImageMotionResults/ns:msControlCentroidOffsets/ns:meanSkyOffset", ns).get('uncertainty'))
-            bindiscrim = pres.find('ns:binaryDiscriminationResults', ns)
-            tcedata.oe_signif = float(bindiscrim.find("ns:oddEvenTransitDepthComparisonStatistic", ns).get('significance'))
-            all_tces.append(tcedata)
-#            for child in pcdat:
-#                print(child.tag, child.attrib)
-#            for child in pres:
-#                print(child.tag, child.attrib)
-#            print("hello World")
+        all_tces.extend(tces)
+        fpt.write('{0} {1:d} {2:.4f}\n'.format(curFile, len(tces), parseTime))
+        totParseTime = totParseTime + parseTime
+        maxParseTime = np.max([maxParseTime, parseTime])
+    if pool is not None:
+        pool.close()
+        pool.join()
+    sumryStr = "Parse time total: {0:.1f} s mean: {1:.4f} s max: {2:.4f} s".format( \
+            totParseTime, totParseTime/np.max([len(fileList),1]), maxParseTime)
+    print(sumryStr)
+    # Summary goes last as a comment line so the file still loads with loadtxt
+    fpt.write('# {0}\n'.format(sumryStr))
+    fpt.close()
+    # Sort by TIC and planet number so the output does not depend on
+    #  the order files were listed or finished parsing
+    all_tces.sort(key=lambda x: (x.epicId, x.planetNum))
 
     print("Found {0:d} TCEs".format(len(all_tces)))
         # Write out hd5 file
-    targdata.store_objlist_as_hd5f(all_tces, tceSeedOutFile)
+    if appendFlag:
+        tce_seed().append_objlist_to_hd5f(all_tces, tceSeedOutFile, fileList)
+    else:
+        tce_seed().store_objlist_as_hd5f(all_tces, tceSeedOutFile, fileList)
 
     print("Wrote {0}".format(tceSeedOutFile))
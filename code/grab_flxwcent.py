@@ -11,7 +11,8 @@ AUTHOR: Christopher J. Burke
 
 import numpy as np
 import pickle
-from gather_tce_fromdvxml import tce_seed
+from gather_tce_fromdvxml import TceCatalog
+from tce_join import join_values
 import os
 import math
 import h5py
@@ -196,27 +197,26 @@ if __name__ == '__main__':
 
     # Load the tce data h5
     tceSeedInFile = run_name + '_tce.h5'
-    tcedata = tce_seed()
-    all_tces = tcedata.fill_objlist_from_hd5f(tceSeedInFile)
+    tcecat = TceCatalog(tceSeedInFile)
     
-    alltic = np.array([x.epicId for x in all_tces], dtype=np.int64)
-    allpn = np.array([x.planetNum for x in all_tces], dtype=int)
-    allatvalid = np.array([x.at_valid for x in all_tces], dtype=int)
-    allrp = np.array([x.at_rp for x in all_tces])
-    allrstar = np.array([x.rstar for x in all_tces])
-    alllogg = np.array([x.logg for x in all_tces])
-    allper = np.array([x.at_period for x in all_tces])
-    alltmags = np.array([x.tmag for x in all_tces])
-    allmes = np.array([x.mes for x in all_tces])
-    allsnr = np.array([x.at_snr for x in all_tces])
-    alldur = np.array([x.at_dur for x in all_tces])
-    allsolarflux = np.array([x.at_effflux for x in all_tces])
-    allatdep = np.array([x.at_depth for x in all_tces])
-    allatepoch = np.array([x.at_epochbtjd for x in all_tces])
-    alltrpvalid = np.array([x.trp_valid for x in all_tces])
-    allatrpdrstar = np.array([x.at_rpDrstar for x in all_tces])
-    allatrpdrstare = np.array([x.at_rpDrstar_e for x in all_tces])
-    allatadrstar = np.array([x.at_aDrstar for x in all_tces])
+    alltic = np.asarray(tcecat['epicId'], dtype=np.int64)
+    allpn = np.asarray(tcecat['planetNum'], dtype=int)
+    allatvalid = np.asarray(tcecat['at_valid'], dtype=int)
+    allrp = tcecat['at_rp']
+    allrstar = tcecat['rstar']
+    alllogg = tcecat['logg']
+    allper = tcecat['at_period']
+    alltmags = tcecat['tmag']
+    allmes = tcecat['mes']
+    allsnr = tcecat['at_snr']
+    alldur = tcecat['at_dur']
+    allsolarflux = tcecat['at_effflux']
+    allatdep = tcecat['at_depth']
+    allatepoch = tcecat['at_epochbtjd']
+    alltrpvalid = tcecat['trp_valid']
+    allatrpdrstar = tcecat['at_rpDrstar']
+    allatrpdrstare = tcecat['at_rpDrstar_e']
+    allatadrstar = tcecat['at_aDrstar']
 
     # Load the  flux vetting
     dataBlock = np.genfromtxt(vetFile, dtype=[int,int,int,'S1'])
@@ -224,11 +224,7 @@ if __name__ == '__main__':
     fvpn = dataBlock['f1']
     fvvet = dataBlock['f2']
     
-    allvet = np.zeros_like(allpn)
-    for i in range(len(allvet)):
-        idx = np.where((alltic[i] == fvtic) & (allpn[i] == fvpn))[0]
-        if len(idx) > 0:
-            allvet[i] = fvvet[idx]
+    allvet = join_values(alltic, allpn, fvtic, fvpn, fvvet).astype(allpn.dtype)
     # only keep tces with both valid dv and trapezoid fits
     # and flux vetted pass
     idx = np.where((allatvalid == 1) & (alltrpvalid == 1) & (allsolarflux > 0.0) & \
@@ -36,10 +36,20 @@ Modification from original matlab source to Python by
 """
 
 import numpy as np
+import os
+import functools
 import matplotlib.pyplot as plt
 from statsmodels import robust
 import scipy.signal as sig
 import scipy.io as sio
+try:
+    import pandas as pd
+except ImportError: # running_median falls back to medfilt2d
+    pd = None
+
+# Directory to save the filter banks in so later runs read them back
+#  rather than rebuild them.  None keeps them in memory only
+filterBankDir = None
 
 class waveletObject:
     h0 = np.array([])
@@ -51,9 +61,9 @@ class waveletObject:
         self.fluxTS = np.array(fluxTS).flatten()
         self.whiteningCoeffs = np.array([])
         self.waveletCoeffs = np.array([])
+        self.waveletlen = waveletlen
         # Build the wavelet and whitening coeffs   
-        self.h0, tmp = daubcqf(waveletlen)
-        self.nBands = calcNBands(waveletlen, len(fluxTS))
+        self.nBands = calcNBands(waveletlen, len(self.fluxTS))
         self.H, self.G = self.set_filter_bank()
         self.waveletCoeffs = self.overcomplete_wavelet_transform()
         self.whiteningCoeffs = self.set_whitening_coefficients(varwindow)
@@ -61,68 +71,12 @@ class waveletObject:
         
     # Set the filter banks
     def set_filter_bank(self):
-        wavObj = self
-        nSamples = len(wavObj.fluxTS)
-        filterLength = len(wavObj.h0)
-        nBands = wavObj.nBands
-        
-        # construct the 4 basis vectors
-        # matlab assumed h0 is 1,filterLength
-        h0 = np.reshape(wavObj.h0, (filterLength,1))
-        h1 = np.flipud(h0) * np.reshape(np.power(-1, np.arange(0,filterLength)), (filterLength,1))
-        g0 = np.flipud(h0)
-        g1 = np.flipud(h1)
-
-        # construct the FFT of each of the vectors, with appropriate padding -- note that here we
-        # explicitly show which are low-pass and which are high-pass
-        HL = np.fft.fft(h0.flatten(), nSamples)
-        HH = np.fft.fft(h1.flatten(), nSamples)
-        GL = np.fft.fft(g0.flatten(), nSamples)
-        GH = np.fft.fft(g1.flatten(), nSamples)
-        #np.save('sfb_HLR', np.real(HL))
-        #np.save('sfb_HLI', np.imag(HL))
-        #np.save('sfb_HHR', np.real(HH))
-        #np.save('sfb_HHI', np.imag(HH))
-        #np.save('sfb_GLR', np.real(GL))
-        #np.save('sfb_GLI', np.imag(GL))
-        #np.save('sfb_GHR', np.real(GL))
-        #np.save('sfb_GHI', np.imag(GL))
-        # define the filters
-        wavObj.G = np.zeros((nSamples, nBands), dtype=np.complex)
-        wavObj.H = np.zeros((nSamples, nBands), dtype=np.complex)
-        
-        # define 2 vectors which will hold product of low-pass filters
-        GLProduct = np.ones((nSamples,), dtype=np.complex)
-        HLProduct = np.ones((nSamples,), dtype=np.complex)
-
-        # Loop over bands
-        for iBand in range(0,nBands):
-            #on the last band, the GH and HH vectors have to be set to one, since the lowest band
-            #sees only low-pass filters all the way down
-            if iBand == nBands -1:
-                HH = np.ones((nSamples,))
-                GH = np.ones((nSamples,))
-            wavObj.G[:,iBand] = GH * GLProduct
-            wavObj.H[:,iBand] = HH * HLProduct
-            # Increment the products of the low-pass filters
-            GLProduct = GLProduct * GL
-            HLProduct = HLProduct * HL
-            # convert the elemental filters to the next band down in freq
-            tmp = GL[0::2]
-            GL = np.append(tmp, tmp)
-            tmp = HL[0::2]
-            HL = np.append(tmp, tmp)
-            tmp = GH[0::2]
-            GH = np.append(tmp, tmp)
-            tmp = HH[0::2]
-            HH = np.append(tmp, tmp)
-            
-#        print("hello world")
-        #np.save('sfb_HR',np.real(wavObj.H))
-        #np.save('sfb_HI',np.imag(wavObj.H))
-        #np.save('sfb_GR',np.real(wavObj.G))
-        #np.save('sfb_GI',np.imag(wavObj.G))
-        return wavObj.H, wavObj.G
+        """ The bank only depends on the wavelet length and number of
+            samples so it comes from the filter_bank cache.  H and G
+            are the nSamples//2+1 non-negative frequencies of the bank
+            for use with rfft/irfft """
+        self.h0, nBands, H, G = filter_bank(self.waveletlen, len(self.fluxTS))
+        return H, G
 
     def overcomplete_wavelet_transform(self, usets=None):
         wavObj = self
@@ -135,17 +89,17 @@ class waveletObject:
             usets = wavObj.fluxTS
         if not len(usets) == nSamples:
             print("Warning the input time series to owt is not the same as was used to setup wavelet object!!!")
-        waveletCoefficients = -1.0 * np.ones((nSamples, nBands))
-        #% construct the FFT of the initial vector and repmat it to the # of bands
-        Xoneband = np.reshape(np.fft.fft(usets, axis=0), (nSamples,1))
+        #% construct the FFT of the initial vector and broadcast it over the bands
+        #  The time series is real so only the non-negative frequencies
+        #  are needed
+        Xoneband = np.reshape(np.fft.rfft(np.ravel(usets)), (-1,1))
         #if default:
             #np.save('owt_usets', usets)
             #np.save('owt_XonebandR',np.real(Xoneband))
             #np.save('owt_XonebandI',np.imag(Xoneband))
-        X = np.tile(Xoneband, (1,nBands))
         #% the wavelet expansion is ALMOST just the IFFT of X multiplied by H ...
 
-        waveletCoefficients = np.real(np.fft.ifft(X * wavObj.H, axis=0))
+        waveletCoefficients = np.fft.irfft(Xoneband * wavObj.H, nSamples, axis=0)
         #if default:
         #    np.save('owt_wc1',waveletCoefficients)
         # Except for some circshifts
@@ -208,14 +162,15 @@ class waveletObject:
             vecCirc = np.append(vecCirc, vec[0:window])
             nSamplesCirc = len(vecCirc)
             ##%     if median subtracted is desired, compute the median; otherwise, set equal to zero
+            # Only the windows that lie fully inside the circular
+            #  extension are kept so the end handling of running_median
+            #  does not matter
             if subMedian:
-                medianValue = sig.medfilt(vecCirc, window)
+                medianValue = running_median(vecCirc, window)
             else:
                 medianValue = np.zeros((nSamplesCirc,))
             tmp = np.abs(vecCirc-medianValue)
-            # medfilt2d is much faster than medfilt based upon
-            #https://gist.github.com/f0k/2f8402e4dfb6974bfcf1
-            madValuesCirc = sig.medfilt2d(tmp.reshape(1,-1), (1, window))[0]
+            madValuesCirc = running_median(tmp, window)
 #            madValuesCirc = sig.medfilt(np.abs(vecCirc-medianValue), window)
             # How about convolve for moving mean
             #  This is much faster than medfilt2, but the signal is supprresed
@@ -235,6 +190,127 @@ class waveletObject:
 
         
   
+def build_filter_bank(h0, nSamples, nBands):
+    """ FFT of the overcomplete wavelet filters for each band
+        INPUT:
+          h0 - Daubechies scaling filter from daubcqf
+          nSamples - length of the time series, power of 2
+          nBands - number of bands from calcNBands
+        OUTPUT:
+          H, G - [nSamples, nBands] complex filter bank
+    """
+    filterLength = len(h0)
+    # construct the 4 basis vectors
+    # matlab assumed h0 is 1,filterLength
+    h0 = np.reshape(h0, (filterLength,1))
+    h1 = np.flipud(h0) * np.reshape(np.power(-1, np.arange(0,filterLength)), (filterLength,1))
+    g0 = np.flipud(h0)
+    g1 = np.flipud(h1)
+
+    # construct the FFT of each of the vectors, with appropriate padding -- note that here we
+    # explicitly show which are low-pass and which are high-pass
+    HL = np.fft.fft(h0.flatten(), nSamples)
+    HH = np.fft.fft(h1.flatten(), nSamples)
+    GL = np.fft.fft(g0.flatten(), nSamples)
+    GH = np.fft.fft(g1.flatten(), nSamples)
+    #np.save('sfb_HLR', np.real(HL))
+    #np.save('sfb_HLI', np.imag(HL))
+    #np.save('sfb_HHR', np.real(HH))
+    #np.save('sfb_HHI', np.imag(HH))
+    #np.save('sfb_GLR', np.real(GL))
+    #np.save('sfb_GLI', np.imag(GL))
+    #np.save('sfb_GHR', np.real(GL))
+    #np.save('sfb_GHI', np.imag(GL))
+    # define the filters
+    G = np.zeros((nSamples, nBands), dtype=np.complex)
+    H = np.zeros((nSamples, nBands), dtype=np.complex)
+    
+    # define 2 vectors which will hold product of low-pass filters
+    GLProduct = np.ones((nSamples,), dtype=np.complex)
+    HLProduct = np.ones((nSamples,), dtype=np.complex)
+
+    # Loop over bands
+    for iBand in range(0,nBands):
+        #on the last band, the GH and HH vectors have to be set to one, since the lowest band
+        #sees only low-pass filters all the way down
+        if iBand == nBands -1:
+            HH = np.ones((nSamples,))
+            GH = np.ones((nSamples,))
+        G[:,iBand] = GH * GLProduct
+        H[:,iBand] = HH * HLProduct
+        # Increment the products of the low-pass filters
+        GLProduct = GLProduct * GL
+        HLProduct = HLProduct * HL
+        # convert the elemental filters to the next band down in freq
+        tmp = GL[0::2]
+        GL = np.append(tmp, tmp)
+        tmp = HL[0::2]
+        HL = np.append(tmp, tmp)
+        tmp = GH[0::2]
+        GH = np.append(tmp, tmp)
+        tmp = HH[0::2]
+        HH = np.append(tmp, tmp)
+        
+#        print("hello world")
+    #np.save('sfb_HR',np.real(H))
+    #np.save('sfb_HI',np.imag(H))
+    #np.save('sfb_GR',np.real(G))
+    #np.save('sfb_GI',np.imag(G))
+    return H, G
+
+@functools.lru_cache(maxsize=4)
+def filter_bank(waveletlen, nSamples):
+    """ Scaling filter and filter bank for a wavelet length and number
+        of samples.  The last few banks are kept in memory and, if
+        filterBankDir is set, saved there.  The filters are real so only
+        the non-negative frequencies are kept for use with rfft/irfft.
+        The arrays are shared between wavelet objects so they are made
+        read only
+        OUTPUT:
+          h0 - Daubechies scaling filter
+          nBands - number of bands
+          H, G - [nSamples//2+1, nBands] complex filter bank
+    """
+    h0, tmp = daubcqf(waveletlen)
+    nBands = calcNBands(waveletlen, nSamples)
+    bankFile = None
+    if filterBankDir is not None:
+        bankFile = os.path.join(filterBankDir, \
+                'kepwav_rbank_{0:d}_{1:d}.npz'.format(waveletlen, nSamples))
+    if bankFile is not None and os.path.isfile(bankFile):
+        bank = np.load(bankFile)
+        H = bank['H']
+        G = bank['G']
+    else:
+        H, G = build_filter_bank(h0, nSamples, nBands)
+        H = np.ascontiguousarray(H[0:nSamples//2+1,:])
+        G = np.ascontiguousarray(G[0:nSamples//2+1,:])
+        if bankFile is not None:
+            os.makedirs(filterBankDir, exist_ok=True)
+            # Write then rename so other processes never read part of a bank
+            tmpFile = bankFile + '.{0:d}.tmp'.format(os.getpid())
+            with open(tmpFile, 'wb') as fp:
+                np.savez(fp, H=H, G=G)
+            os.replace(tmpFile, bankFile)
+    for arr in (h0, H, G):
+        arr.flags.writeable = False
+    return h0, nBands, H, G
+
+def running_median(vec, window):
+    """ Centered running median with an odd window.  Values within
+        window//2 of the ends are not valid.
+        medfilt is O(N W) and even medfilt2d is slow for the wide
+        windows of the coarse bands (varWindow*2^iBand).  The pandas
+        rolling median uses a skip list, O(N log W), and gives the same
+        values since the median of an odd window is one of the samples.
+        Without pandas fall back to medfilt2d
+    """
+    if pd is None:
+        # medfilt2d is much faster than medfilt based upon
+        #https://gist.github.com/f0k/2f8402e4dfb6974bfcf1
+        return sig.medfilt2d(vec.reshape(1,-1), (1, window))[0]
+    return pd.Series(vec).rolling(window, center=True).median().to_numpy()
+
 def calcNBands(wN, fN):
     return int(np.log2(fN) - np.int(np.floor(np.log2(wN))) + 1)
 
@@ -280,42 +356,155 @@ def set_trial_transit_pulse(duration):
     trial_pulse[-1] = 0.0
     return trial_pulse
 
-def compute_statistic_time_series(wavObj, searchLen, trial_pulse):
-    whtC = wavObj.whiteningCoeffs    
-    x = wavObj.waveletCoeffs
-    nSamples = x.shape[0]
-    nBands = x.shape[1]
-    shiftLength =  np.int(np.fix(searchLen/2.0)) + 1
-    #% zero pad the pulse so its the same length as x
-    full_trial_pulse = np.zeros((nSamples,))
-    full_trial_pulse[0:len(trial_pulse)] = trial_pulse
-    s = wavObj.overcomplete_wavelet_transform(full_trial_pulse)
-    #np.save('csts_s', s)
-    corrTS = np.zeros((nSamples,))
-    normTS = np.zeros((nSamples,))    
-    for iBand in range(0,nBands-1):
-        factorOfTwo = np.power(2.0, -np.min([iBand+1, nBands-1]))
-        SNRi = circfilt(np.flip(s[:,iBand]*s[:,iBand], 0), whtC[:,iBand])
-        Li = circfilt(np.flip(s[:,iBand], 0), x[:,iBand]*whtC[:,iBand])
-        SNRi = np.roll(SNRi, shiftLength)
-        Li = np.roll(Li, shiftLength)
-        normTS = normTS + SNRi*factorOfTwo
-        corrTS = corrTS + Li*factorOfTwo
-        if iBand == nBands-2:
-            normTS = np.sqrt(normTS)
-    #np.save('csts_normTS', normTS)
-    #np.save('csts_corrTS', corrTS)        
+def overcomplete_wavelet_transform_stack(wavObj, tsStack):
+    """ overcomplete_wavelet_transform of every row of tsStack using
+        the filter bank of wavObj
+        INPUT:
+          wavObj - waveletObject setup for time series of this length
+          tsStack - [nSeries, nSamples] time series
+        OUTPUT:
+          waveletCoefficients - [nSeries, nSamples, nBands]
+    """
+    nBands = wavObj.nBands
+    filterLength = len(wavObj.h0)
+    nSamples = tsStack.shape[1]
+    X = np.fft.rfft(tsStack, axis=1)
+    waveletCoefficients = np.fft.irfft(X[:,:,np.newaxis] * \
+                                  wavObj.H[np.newaxis,:,:], nSamples, axis=1)
+    for iBand in range(nBands):
+        shiftIndex = np.min([iBand+1, nBands-1])
+        nShift = filterLength*np.int(np.power(2, shiftIndex-1)) - np.int(np.power(2, shiftIndex-1))
+        waveletCoefficients[:,:,iBand] = np.roll(waveletCoefficients[:,:,iBand], -nShift, axis=1)
+    return waveletCoefficients
+
+def compute_statistic_time_series_stack(wavObj, searchLen, trial_pulse, tsStack=None):
+    """ Single event statistic time series of several time series that
+        share the whitening coefficients of wavObj (e.g., the flux and
+        an injected reference signal).  The trial pulse transform and the
+        normalization only depend on the pulse and whitening so they are
+        done once, and the per band circular filters are done as one
+        batch of FFTs.  searchLen may be a vector of durations, the
+        whitened wavelet coefficients are transformed once for all of them
+        INPUT:
+          wavObj - waveletObject providing the filter bank and whitening
+          searchLen - transit search width in cadences, scalar or vector
+          trial_pulse - from set_trial_transit_pulse.  For a vector
+                        searchLen a list of pulses, or None to use
+                        set_trial_transit_pulse for each duration
+          tsStack - [nSeries, nSamples] time series.  None uses the
+                    wavelet coefficients of wavObj
+        OUTPUT:
+          normTS - [nSamples] normalization, the same for every series
+                   [nDur, nSamples] for a vector searchLen
+          corrTS - [nSeries, nSamples] correlation
+                   [nSeries, nDur, nSamples] for a vector searchLen
+    """
+    whtC = wavObj.whiteningCoeffs
+    if tsStack is None:
+        x = wavObj.waveletCoeffs[np.newaxis,:,:]
+    else:
+        x = overcomplete_wavelet_transform_stack(wavObj, np.atleast_2d(tsStack))
+    nSeries = x.shape[0]
+    nSamples = x.shape[1]
+    nBands = x.shape[2]
+    isVec = np.ndim(searchLen) > 0
+    searchLens = np.atleast_1d(searchLen)
+    nDur = len(searchLens)
+    if not isVec:
+        pulses = [trial_pulse]
+    elif trial_pulse is None:
+        pulses = [set_trial_transit_pulse(int(L)) for L in searchLens]
+    else:
+        pulses = trial_pulse
+    #% zero pad the pulses so they are the same length as x
+    full_trial_pulse = np.zeros((nDur, nSamples))
+    for k in range(nDur):
+        full_trial_pulse[k,0:len(pulses[k])] = pulses[k]
+    s = overcomplete_wavelet_transform_stack(wavObj, full_trial_pulse)
+    # The lowest band does not enter the statistic
+    nUse = nBands-1
+    s = s[:,:,0:nUse]
+    factorOfTwo = np.power(2.0, -np.minimum(np.arange(1,nUse+1), nBands-1))
+    # circfilt of every band at once.  The whitened data transform does
+    #  not depend on the pulse
+    WHT = np.fft.rfft(whtC[:,0:nUse], axis=0)
+    XW = np.fft.rfft(x[:,:,0:nUse] * whtC[np.newaxis,:,0:nUse], axis=1)
+    normTS = np.zeros((nDur, nSamples))
+    corrTS = np.zeros((nSeries, nDur, nSamples))
+    for k in range(nDur):
+        shiftLength =  np.int(np.fix(searchLens[k]/2.0)) + 1
+        SNRi = np.fft.irfft(np.fft.rfft(np.flip(s[k]*s[k], 0), axis=0) * WHT, nSamples, axis=0)
+        normTS[k] = np.sqrt(np.roll(np.sum(SNRi*factorOfTwo, axis=1), shiftLength))
+        S = np.fft.rfft(np.flip(s[k], 0), axis=0)
+        Li = np.fft.irfft(S[np.newaxis,:,:] * XW, nSamples, axis=1)
+        corrTS[:,k,:] = np.roll(np.sum(Li*factorOfTwo, axis=2), shiftLength, axis=1)
+    if not isVec:
+        return normTS[0], corrTS[:,0,:]
     return normTS, corrTS
 
+def compute_statistic_time_series(wavObj, searchLen, trial_pulse):
+    """ normTS and corrTS of the wavObj time series.  A vector searchLen
+        gives [nDur, nSamples] arrays (see compute_statistic_time_series_stack)
+    """
+    normTS, corrTS = compute_statistic_time_series_stack(wavObj, searchLen, trial_pulse)
+    return normTS, corrTS[0]
+
 def circfilt(vec1, vec2):
     nLength = len(vec2)
-    X = np.fft.fft(vec2)
-    H = np.fft.fft(vec1, nLength)
-    y = np.real(np.fft.ifft(H*X))
+    X = np.fft.rfft(vec2)
+    H = np.fft.rfft(vec1, nLength)
+    y = np.fft.irfft(H*X, nLength)
     return y
     
 if __name__ == '__main__':
     waveletLen = 12
+    # Check the cached filter bank against building it directly
+    h0, tmp = daubcqf(waveletLen)
+    chkH, chkG = build_filter_bank(h0, 2048, calcNBands(waveletLen, 2048))
+    wavObj = waveletObject(waveletLen, np.random.randn(2048), 30)
+    print("Cached filter bank matches: {0}".format(np.array_equal(wavObj.H, chkH[0:1025,:]) and \
+          np.array_equal(wavObj.G, chkG[0:1025,:])))
+    # Check the rfft path against the complex fft transform and per band
+    #  circfilt loop with the full filter bank, as done before rfft
+    refTS = np.random.randn(2048)
+    searchLen = 5
+    trial_pulse = set_trial_transit_pulse(searchLen)
+    normTS, corrTS = compute_statistic_time_series_stack(wavObj, searchLen, \
+                            trial_pulse, np.vstack((wavObj.fluxTS, refTS)))
+    def complex_owt(ts):
+        wavc = np.real(np.fft.ifft(np.fft.fft(ts)[:,np.newaxis] * chkH, axis=0))
+        for iBand in range(wavObj.nBands):
+            shiftIndex = np.min([iBand+1, wavObj.nBands-1])
+            nShift = len(h0)*int(np.power(2, shiftIndex-1)) - int(np.power(2, shiftIndex-1))
+            wavc[:,iBand] = np.roll(wavc[:,iBand], -nShift)
+        return wavc
+    def complex_circfilt(vec1, vec2):
+        return np.real(np.fft.ifft(np.fft.fft(vec1)*np.fft.fft(vec2)))
+    whtC = wavObj.whiteningCoeffs
+    refWavc = complex_owt(refTS)
+    full_trial_pulse = np.zeros((2048,))
+    full_trial_pulse[0:len(trial_pulse)] = trial_pulse
+    s = complex_owt(full_trial_pulse)
+    chkNorm = np.zeros((2048,))
+    chkCorr = np.zeros((2048,))
+    for iBand in range(0,wavObj.nBands-1):
+        factorOfTwo = np.power(2.0, -np.min([iBand+1, wavObj.nBands-1]))
+        chkNorm = chkNorm + np.roll(complex_circfilt(np.flip(s[:,iBand]*s[:,iBand], 0), \
+                    whtC[:,iBand]), searchLen//2+1)*factorOfTwo
+        chkCorr = chkCorr + np.roll(complex_circfilt(np.flip(s[:,iBand], 0), \
+                    refWavc[:,iBand]*whtC[:,iBand]), searchLen//2+1)*factorOfTwo
+    print("Stacked statistic matches: {0}".format(np.allclose(normTS, np.sqrt(chkNorm)) and \
+          np.allclose(corrTS[1], chkCorr)))
+    # Check the running median against medfilt over the valid range
+    vec = np.random.randn(4096)
+    chkMed = sig.medfilt(vec, 301)
+    print("Running median matches medfilt: {0}".format(np.array_equal( \
+          running_median(vec, 301)[150:-150], chkMed[150:-150])))
+    # Check a vector of durations against one duration at a time
+    durNorm, durCorr = compute_statistic_time_series(wavObj, np.array([3, 5, 9]), None)
+    print("Duration vector matches: {0}".format(np.allclose(durNorm[1], normTS) and \
+          np.allclose(durCorr[1], corrTS[0]) and np.allclose(durCorr[2], \
+          compute_statistic_time_series(wavObj, 9, set_trial_transit_pulse(9))[1])))
     nTrials = 200
     depth = 6.0
     durat = 3
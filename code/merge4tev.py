@@ -13,16 +13,53 @@ import glob
 from shutil import copyfile
 import argparse
 import tec_run_parameters as tecrp
+from tec_scheduler import run_tasks, exit_if_failed
+
+
+def merge_tic_worker(args):
+    """ Merge the DV mini report and the TEC reports for the planets
+        of one TIC into the TEV report.  Used with tec_scheduler.run_tasks """
+    curTic, curPns, sourceDir, outDir, miniDir, miniHdr, miniTail, \
+            SECTOR, useSector = args
+    outFile = os.path.join(outDir, 'tec-s{0:04d}-{1:016d}-00001_dvm.pdf'.format(useSector, curTic))
+    miniList = glob.glob(os.path.join(miniDir,'{0}*{1:016d}*{2}'.format(miniHdr,curTic,miniTail)))
+#    miniFile = os.path.join(miniDir, '{0}{1:016d}{2}'.format(miniHdr,curTic,miniTail))
+#    miniExists = os.path.isfile(miniFile)
+    if len(curPns) == 1:
+        curPn = curPns[0]
+        inFile = os.path.join(sourceDir, 'tec-s{0:04d}-{1:016d}-{2:02d}.pdf'.format(SECTOR, curTic, curPn))
+
+#        if miniExists:
+        if len(miniList)>0:
+            comstring = 'gs -dBATCH -dNOPAUSE -q -sDEVICE=pdfwrite -sOutputFile={0} {1} {2}'.format(outFile, miniList[0], inFile)
+            tmp = call(comstring, shell=True)
+        else:
+            print('Warning DV mini for TIC {0:d} Does not Exist!!!'.format(curTic))
+            copyfile(inFile, outFile)
+    elif len(curPns) > 1:
+        inFiles = []
+#        if miniExists:
+        if len(miniList)>0:
+            inFiles.append(miniList[0])
+        else:
+            print('Warning DV mini for TIC {0:d} Does not Exist!!!'.format(curTic))
+
+        for curPn in curPns:
+            inFiles.append(os.path.join(sourceDir, 'tec-s{0:04d}-{1:016d}-{2:02d}.pdf'.format(SECTOR, curTic, curPn)))
+        comstring = 'gs -dBATCH -dNOPAUSE -q -sDEVICE=pdfwrite -sOutputFile={0} '.format(outFile)
+        for ifil in inFiles:
+            comstring += ' {0} '.format(ifil)
+        tmp = call(comstring, shell=True)
+
+        print('help2')
+    return outFile
 
 
 if __name__ == '__main__':
     # Parse the command line arguments for multiprocessing
-    # With Gnu parallel with 13 cores
-    # seq 0 15 | parallel --results merge_results python merge4tev.py -w {} -n 16
+    # The TICs are merged in a pool of nWrk processes
+    # python merge4tev.py -n 16
     parser = argparse.ArgumentParser()
-    parser.add_argument("-w", type=int,\
-                        default = 0, \
-                        help="Worker ID Number 0 through nWrk-1")
     parser.add_argument("-n", type=int,\
                         default = 1, \
                         help="Number of Workers")
@@ -30,7 +67,6 @@ if __name__ == '__main__':
 
     args = parser.parse_args() 
     # These are for parallel procoessing
-    wID = int(args.w)
     nWrk = int(args.n)
 
     # get run parameters
@@ -73,40 +109,17 @@ if __name__ == '__main__':
     
     uniqTicIds = np.unique(ticIds)
     
-    for i, curTic in enumerate(uniqTicIds):
-        print('{:d} of {:d} -- {:d}'.format(i, len(uniqTicIds), curTic))
-        if np.mod(i, nWrk) == wID:
-            idxTic = np.where(ticIds == curTic)[0]
-            outFile = os.path.join(outDir, 'tec-s{0:04d}-{1:016d}-00001_dvm.pdf'.format(useSector, curTic))
-            miniList = glob.glob(os.path.join(miniDir,'{0}*{1:016d}*{2}'.format(miniHdr,curTic,miniTail)))
-    #        miniFile = os.path.join(miniDir, '{0}{1:016d}{2}'.format(miniHdr,curTic,miniTail))
-    #        miniExists = os.path.isfile(miniFile)
-            if len(idxTic) == 1:
-                curPn = pns[idxTic[0]]
-                inFile = os.path.join(sourceDir, 'tec-s{0:04d}-{1:016d}-{2:02d}.pdf'.format(SECTOR, curTic, curPn))
-    
-    #            if miniExists:
-                if len(miniList)>0:
-                    comstring = 'gs -dBATCH -dNOPAUSE -q -sDEVICE=pdfwrite -sOutputFile={0} {1} {2}'.format(outFile, miniList[0], inFile)
-                    tmp = call(comstring, shell=True)
-                else:
-                    print('Warning DV mini for TIC {0:d} Does not Exist!!!'.format(curTic))
-                    copyfile(inFile, outFile)
-            elif len(idxTic) > 1:
-                inFiles = []
-    #            if miniExists:
-                if len(miniList)>0:
-                    inFiles.append(miniList[0])
-                else:
-                    print('Warning DV mini for TIC {0:d} Does not Exist!!!'.format(curTic))
-
-                for ii in idxTic:
-                    inFiles.append(os.path.join(sourceDir, 'tec-s{0:04d}-{1:016d}-{2:02d}.pdf'.format(SECTOR, curTic, pns[ii])))
-                comstring = 'gs -dBATCH -dNOPAUSE -q -sDEVICE=pdfwrite -sOutputFile={0} '.format(outFile)
-                for ifil in inFiles:
-                    comstring += ' {0} '.format(ifil)
-                tmp = call(comstring, shell=True)
-    
-                print('help2')
+    workArgs = []
+    costs = []
+    for curTic in uniqTicIds:
+        idxTic = np.where(ticIds == curTic)[0]
+        workArgs.append((curTic, pns[idxTic], sourceDir, outDir, miniDir, \
+                         miniHdr, miniTail, SECTOR, useSector))
+        # Cost is the number of pdfs gs has to merge
+        costs.append(len(idxTic)+1)
+    taskNames = ['TIC {0:d}'.format(x) for x in uniqTicIds]
+    results, failed = run_tasks(merge_tic_worker, workArgs, costs, nWorkers=nWrk, \
+                                taskNames=taskNames)
+    exit_if_failed(failed)
 print('help')
     
@@ -8,7 +8,8 @@ This routine brings in all the TEC attributes and metrics
 
 import numpy as np
 import pickle
-from gather_tce_fromdvxml import tce_seed
+from gather_tce_fromdvxml import TceCatalog
+from tce_join import join_values, join_index
 import os
 from subprocess import call
 import math
@@ -16,17 +17,18 @@ import h5py
 import argparse
 import glob
 import tec_run_parameters as tecrp
+from tec_scheduler import run_tasks, exit_if_failed
 
 
 def make_data_dirs(prefix, sector, epic):
     secDir = 'S{0:02d}'.format(sector)
     localDir = os.path.join(prefix,secDir)
     if not os.path.exists(localDir):
-        os.mkdir(localDir)
+        os.makedirs(localDir, exist_ok=True)
     epcDir = '{0:04d}'.format(int(math.floor(epic/1000.0)))
     localDir = os.path.join(prefix,secDir,epcDir)
     if not os.path.exists(localDir):
-        os.mkdir(localDir)
+        os.makedirs(localDir, exist_ok=True)
     return localDir
 
 
@@ -72,29 +74,148 @@ def transit_duration(rstar, logg, per, ecc):
 
     return durat
 
+def rank_ramp(vals, lims):
+    """ Log rank ramp that is 0 at lims[0] falling to log10(0.1)
+        at lims[1] and clamped beyond
+        INPUT:
+          vals - array of the metric
+          lims - [best, worst] metric values of the ramp
+        OUTPUT:
+          rank - log10 rank in [-1, 0]
+    """
+    rank = 1.0 - (vals-lims[0])/(lims[1] - lims[0])*0.9
+    rank = np.clip(rank, 0.1, 1.0)
+    return np.log10(rank)
+
 def idx_filter(idx, *array_list):
     new_array_list = []
     for array in array_list:
         new_array_list.append(array[idx])
     return new_array_list
 
+def tec_report_worker(args):
+    """ Make the png and/or merged pdf TEC report for one TCE.
+        Used with tec_scheduler.run_tasks """
+    i, curTic, curPn, mrkStr, doPNGs, doMergeSum, summaryFolder, summaryPrefix, \
+            summaryPostfix, pngFolder, pdfFolder, sesMesDir, SECTOR, SECTOR1, \
+            SECTOR2, multi_sector_flag, tgt_2min = args
+    if doPNGs:
+        if tgt_2min:
+            inputFile = os.path.join(summaryFolder,'{0}s{1:04d}-s{2:04d}-{3:016d}-{4:02d}{5}'.format(summaryPrefix,SECTOR1,SECTOR2,curTic,curPn,summaryPostfix))
+        else: # FTL DV report file name format
+            inputFile = os.path.join(summaryFolder,'{0}{1:016d}{2}{3:02d}.pdf'.format(summaryPrefix,curTic,summaryPostfix,curPn))
+            #inputFile = os.path.join(summaryFolder,'{0}{1:016d}-s{2:04d}-s{3:04d}{4}{5:02d}.pdf'.format(summaryPrefix,curTic,SECTOR1,SECTOR2,summaryPostfix,curPn))
+        outputFile = os.path.join(pngFolder,'{0:04d}-{1:016d}-{2:02d}.png'.format(i, curTic, curPn))
+        comstring = 'gs -dBATCH -dNOPAuSE -sDEVICE=png16m -r300 -o {0} {1}'.format(outputFile, inputFile)
+        tmp = call(comstring, shell=True)
+    if doMergeSum:
+
+        # Make a temporary pdfmark file for adding Tier level and keywords to pdf
+        #mrkFile = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic),'pdfmarks_{0:016d}_{1:02d}.txt'.format(curTic,curPn))
+        #mrkOut = open(mrkFile,'w')
+        #mrkOut.write('/pdfmark where {pop}{userdict /pdfmark /cleartomark load put} ifelse\n')
+        #mrkOut.write('[ /Rect [ 15 735 500 785 ] /DA ([1 0 0] rg /Cour 20 Tf) /BS << /W 0 >> /Q 0 /Subtype /FreeText /SrcPg 1\n')
+        #mrkOut.write('/Contents ({}) /ANN pdfmark\n'.format(mrkStr))
+        #mrkOut.close()
+        # Make a ps file for adding Tier level and keywords to pdf
+        # via https://stackoverflow.com/questions/18769314/add-text-on-1st-page-of-a-pdf-file
+        mrkFile = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic),'tecres_{0:016d}_{1:02d}.ps'.format(curTic,curPn))
+        mrkOut = open(mrkFile,'w')
+        mrkOut.write('%!\n')
+        mrkOut.write('<< /EndPage {0 eq{0 eq{\n')
+        mrkOut.write('/Arial findfont 22 scalefont setfont newpath 15 770 moveto 1 0 0 setrgbcolor ({0}) show\n'.format(mrkStr))
+        mrkOut.write('} if true}{pop false} ifelse} >> setpagedevice\n')
+        mrkOut.close()
+        
+        if tgt_2min:
+            inputFile1 = os.path.join(summaryFolder,'{0}s{1:04d}-s{2:04d}-{3:016d}-{4:02d}*dvs.pdf'.format(summaryPrefix,SECTOR1,SECTOR2,curTic,curPn,summaryPostfix))
+        else:  # FTL file format
+            inputFile1 = os.path.join(summaryFolder,'{0}{1:016d}{2}{3:02d}.pdf'.format(summaryPrefix,curTic,summaryPostfix,curPn))
+            #inputFile1 = os.path.join(summaryFolder,'{0}{1:016d}-s{2:04d}-s{3:04d}{4}{5:02d}.pdf'.format(summaryPrefix,curTic,SECTOR1,SECTOR2,summaryPostfix,curPn))
+
+        inputFileList = glob.glob(inputFile1)
+        if not len(inputFileList) == 1:
+            raise IOError('Error: not found or multiple DV summaries found for {0:d} pn {1:d}'.format(curTic, curPn))
+        inputFile1 = inputFileList[0]
+        #outputFile = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic),'tecsummary_{0:016d}_{1:02d}.pdf'.format(curTic,curPn))
+        # Add TEC tier level and keywords to summary page with imagemagick convert
+        #comstring = "convert -density 500 {0} -pointsize 25 -draw \"text 20,150 '{1}'\"  {2}".format(inputFile1, mrkStr, outputFile)
+        #print(comstring)
+        #tmp = call(comstring, shell=True)
+        #inputFile1 = outputFile
+        inputFile2 = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic), 'tess_{0:016d}_{1:02d}-modshift.pdf'.format(curTic,curPn))
+        inputFile3 = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic), 'tess_{0:016d}_{1:02d}_med-modshift.pdf'.format(curTic,curPn))
+        # Check that modshift files exist
+        if not os.path.isfile(inputFile2):
+            inputFile2 = ''
+        if not os.path.isfile(inputFile3):
+            inputFile3 = ''
+    
+        inputFileList = []
+        if multi_sector_flag:
+            for curSec in np.arange(SECTOR1,SECTOR2+1):
+                inputFile4 = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic), 'tess_diffImg_{0:016d}_{1:02d}_{2:02d}.pdf'.format(curTic,curPn,curSec))
+                if os.path.isfile(inputFile4):
+                    inputFileList.append(inputFile4)
+            # Summar centriod figure
+            inputFile4 = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic), 'tess_diffImg_{0:016d}_{1:02d}_centsum.pdf'.format(curTic,curPn))
+            if os.path.isfile(inputFile4):
+                inputFileList.append(inputFile4)
+            for curSec in np.arange(SECTOR1, SECTOR2+1):
+                inputFile4 = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic), 'tess_mods_diffImg_{0:016d}_{1:02d}_{2:02d}.pdf'.format(curTic,curPn,curSec))
+                if os.path.isfile(inputFile4):
+                    inputFileList.append(inputFile4)
+            for curSec in np.arange(SECTOR1, SECTOR2+1):
+                inputFile4 = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic), 'tess_bsc_diffImg_{0:016d}_{1:02d}_{2:02d}.pdf'.format(curTic,curPn,curSec))
+                if os.path.isfile(inputFile4):
+                    inputFileList.append(inputFile4)
+        else:
+            inputFile4 = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic), 'tess_diffImg_{0:016d}_{1:02d}_{2:02d}.pdf'.format(curTic,curPn,SECTOR1))
+            inputFileList.append(inputFile4)
+            inputFile5 = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic), 'tess_mods_diffImg_{0:016d}_{1:02d}_{2:02d}.pdf'.format(curTic,curPn,SECTOR1))
+            if os.path.isfile(inputFile5):
+                inputFileList.append(inputFile5)
+            inputFile6 = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic), 'tess_bsc_diffImg_{0:016d}_{1:02d}_{2:02d}.pdf'.format(curTic,curPn,SECTOR1))
+            if os.path.isfile(inputFile6):
+                inputFileList.append(inputFile6)
+    
+        # Look for Twexo page
+        inputFile7 = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic), 'twexo_{0:016d}.pdf'.format(curTic))
+        if os.path.isfile(inputFile7):
+            inputFileList.append(inputFile7)
+
+        outputFile = os.path.join(pdfFolder,'tec-s{3:04d}-{1:016d}-{2:02d}.pdf'.format(i, curTic, curPn, SECTOR2))
+        outputFile2 = os.path.join(pdfFolder,'tec-s{3:04d}-{1:016d}-{2:02d}_mrg.pdf'.format(i, curTic, curPn, SECTOR2))
+        #comstring = 'convert {0} {1} {2}'.format(inputFile1, inputFile2, outputFile)
+        comstring = 'gs -dBATCH -dNOPAUSE -q -sDEVICE=pdfwrite -sOutputFile={0} -dPDFSETTINGS=/prepress {4} {1} {2} {3}'.format(outputFile, inputFile1, inputFile2, inputFile3, mrkFile)
+        #comstring = 'gs -dBATCH -dNOPAUSE -q -sDEVICE=pdfwrite -sOutputFile={0} {1} {2} {3}'.format(outputFile, inputFile1, inputFile2, inputFile3)
+        for ifil in inputFileList:
+            comstring += ' {0} '.format(ifil)
+
+        tmp = call(comstring, shell=True)
+        # Add pdfmark text
+        #print(outputFile)
+        #comstring = 'gs -dBATCH -dNOPAUSE -sDEVICE=pdfwrite -sOutputFile={0} -dPDFSETTINGS=/prepress {1} {2}'.format(outputFile2, mrkFile, outputFile)
+        #print(comstring)
+        #tmp = call(comstring, shell=True)
+    return curTic, curPn
+
 if __name__ == '__main__':
     # Parse the command line arguments for multiprocessing
-    # With Gnu parallel with 13 cores
-    # seq 0 12 | parallel --results rank_tces_results python rank_tces.py -w {} -n 13
+    # With one worker only the Tier files are made.  With more workers
+    #  the TEC reports are also made in a pool of nWrk processes
+    # python rank_tces.py -n 13
     parser = argparse.ArgumentParser()
-    parser.add_argument("-w", type=int,\
-                        default = 0, \
-                        help="Worker ID Number 0 through nWrk-1")
     parser.add_argument("-n", type=int,\
                         default = 1, \
                         help="Number of Workers")
-    
+    parser.add_argument("--notiers", action='store_true', \
+                        help="Only make the reports, do not rewrite the Tier files")
 
     args = parser.parse_args() 
     # These are for parallel procoessing
-    wID = int(args.w)
     nWrk = int(args.n)
+    writeTiers = not args.notiers
 
     # get run parameters
     run_name            = tecrp.run_name
@@ -157,8 +278,7 @@ if __name__ == '__main__':
 
     # Load the tce data h5
     tceSeedInFile = run_name + '_tce.h5'
-    tcedata = tce_seed()
-    all_tces = tcedata.fill_objlist_from_hd5f(tceSeedInFile)
+    tcecat = TceCatalog(tceSeedInFile)
     
     # Define maximum good planet radius
     maxPlanetRadiusRearth = 25.0
@@ -190,31 +310,32 @@ if __name__ == '__main__':
     centlims = [2.0, 3.0]
     oelims = [0.05, 5.0e-2]
     
-    alltic = np.array([x.epicId for x in all_tces], dtype=np.int64)
-    allpn = np.array([x.planetNum for x in all_tces], dtype=int)
-    allatvalid = np.array([x.at_valid for x in all_tces], dtype=int)
-    allrp = np.array([x.at_rp for x in all_tces])
-    allrstar = np.array([x.rstar for x in all_tces])
-    alllogg = np.array([x.logg for x in all_tces])
-    allper = np.array([x.at_period for x in all_tces])
-    alltmags = np.array([x.tmag for x in all_tces])
-    allmes = np.array([x.mes for x in all_tces])
-    allsnr = np.array([x.at_snr for x in all_tces])
-    alldur = np.array([x.at_dur for x in all_tces])
-    allsolarflux = np.array([x.at_effflux for x in all_tces])
-    allatdep = np.array([x.at_depth for x in all_tces])
-    alltrpvalid = np.array([x.trp_valid for x in all_tces], dtype=int)
-    alltrpdep = np.array([x.trp_depth for x in all_tces])
-    allsesinmes = np.array([x.maxsesinmes for x in all_tces])
-    allcentoot = np.array([x.cent_oot_offset for x in all_tces])
-    allcentoote = np.array([x.cent_oot_offset_e for x in all_tces])
-    allcenttic = np.array([x.cent_tic_offset for x in all_tces])
-    allcenttice = np.array([x.cent_tic_offset_e for x in all_tces])
-    alloesig = np.array([x.oe_signif for x in all_tces])
+    alltic = np.asarray(tcecat['epicId'], dtype=np.int64)
+    allpn = np.asarray(tcecat['planetNum'], dtype=int)
+    allatvalid = np.asarray(tcecat['at_valid'], dtype=int)
+    allrp = tcecat['at_rp']
+    allrstar = tcecat['rstar']
+    alllogg = tcecat['logg']
+    allper = tcecat['at_period']
+    alltmags = tcecat['tmag']
+    allmes = tcecat['mes']
+    allsnr = tcecat['at_snr']
+    alldur = tcecat['at_dur']
+    allsolarflux = tcecat['at_effflux']
+    allatdep = tcecat['at_depth']
+    alltrpvalid = np.asarray(tcecat['trp_valid'], dtype=int)
+    alltrpdep = tcecat['trp_depth']
+    allsesinmes = tcecat['maxsesinmes']
+    allcentoot = tcecat['cent_oot_offset']
+    allcentoote = tcecat['cent_oot_offset_e']
+    allcenttic = tcecat['cent_tic_offset']
+    allcenttice = tcecat['cent_tic_offset_e']
+    alloesig = tcecat['oe_signif']
     allcentootsig = allcentoot/allcentoote
     allcentticsig = allcenttic/allcenttice
     allcentootsig = np.where(allcentootsig < 0.0, 99.0, allcentootsig)
     allcentticsig = np.where(allcentticsig < 0.0, 99.0, allcentticsig)
+    allnsec = np.sum(tcecat['all_sectors'] >= 0, axis=1)
 
 
     # Load the  flux vetting
@@ -223,11 +344,7 @@ if __name__ == '__main__':
     fvpn = dataBlock['f1']
     fvvet = dataBlock['f2']
     
-    allvet = np.zeros_like(allpn)
-    for i in range(len(allvet)):
-        idx = np.where((alltic[i] == fvtic) & (allpn[i] == fvpn))[0]
-        if len(idx) > 0:
-            allvet[i] = fvvet[idx]
+    allvet = join_values(alltic, allpn, fvtic, fvpn, fvvet).astype(allpn.dtype)
     # only keep tces with both valid dv and trapezoid fits
     # and flux vetted pass
     idx = np.where((allatvalid == 1) & (alltrpvalid == 1) & (allsolarflux > 0.0) & \
@@ -235,10 +352,10 @@ if __name__ == '__main__':
     alltic, allpn, allrp, allrstar, alllogg, allper, alltmags, \
             allmes, allsnr, alldur, allsolarflux, allatdep, alltrpdep, allsesinmes, \
             allcentootsig, allcentticsig, alloesig,\
-            allcentoote, allcenttice = idx_filter(idx, \
+            allcentoote, allcenttice, allnsec = idx_filter(idx, \
             alltic, allpn, allrp, allrstar, alllogg, allper, alltmags, \
             allmes, allsnr, alldur, allsolarflux, allatdep, alltrpdep, allsesinmes, \
-            allcentootsig, allcentticsig, alloesig, allcentoote, allcenttice)
+            allcentootsig, allcentticsig, alloesig, allcentoote, allcenttice, allnsec)
 
     # load the modshift test information
     dtypeseq=['i4','i4']
@@ -319,32 +436,27 @@ if __name__ == '__main__':
     smFedPN1 = smFedPN1[idx]
 
     # Load the PDC fit goodness statistics
-    pdcTic = np.array([], dtype=int)
-    pdcPn = np.array([], dtype=int)
-    pdcNoi = np.array([], dtype=float)
-    pdcCor = np.array([], dtype=float)
+    #  These are stored in alltic order so no join is needed
+    nTce = len(alltic)
+    pdcNoi = np.ones((nTce,), dtype=float)
+    pdcCor = np.zeros((nTce,), dtype=float)
+    # For multisector run find minimum pdc added Noise
+    #  Also results were only valid for sector 4 onwards
+    firstSec = 4
+    if SECTOR1 > firstSec:
+        firstSec = SECTOR1
     for i, curTic in enumerate(alltic):
         curPn = allpn[i]
-        # For multisector run find minimum pdc added Noise
-        #  Also results were only valid for sector 4 onwards
-        firstSec = 4
-        if SECTOR1 > firstSec:
-            firstSec = SECTOR1
-        minPdcNoi = 1.0
-        maxPdcCor = 0.0
         for jj in np.arange(firstSec,SECTOR2+1):
             pdcResults = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic), 'tess_flxwcent_{0:016d}_{1:02d}_{2:02d}.h5d'.format(curTic,curPn, jj))
             if os.path.isfile(pdcResults):
                 f = h5py.File(pdcResults,'r')
                 pdcStats = np.array(f['pdc_stats'])
-                if pdcStats[1] < minPdcNoi:
-                    minPdcNoi = pdcStats[1]
-                if pdcStats[2] > maxPdcCor:
-                    maxPdcCor = pdcStats[2]
-        pdcTic = np.append(pdcTic, curTic)
-        pdcPn = np.append(pdcPn, curPn)
-        pdcNoi = np.append(pdcNoi, minPdcNoi)
-        pdcCor = np.append(pdcCor, maxPdcCor)
+                f.close()
+                if pdcStats[1] < pdcNoi[i]:
+                    pdcNoi[i] = pdcStats[1]
+                if pdcStats[2] > pdcCor[i]:
+                    pdcCor[i] = pdcStats[2]
 
     # load the momentum dump transit fraction data
     dtypeseq=['i4','i4','f8']
@@ -353,7 +465,44 @@ if __name__ == '__main__':
     mdPN = dataBlock['f1']
     mdFrac = dataBlock['f2']
 
-               
+    # Merge all the result tables onto the ranked TCEs by (TIC, planet)
+    #  -1 index means the TCE is not in that table
+    hasMod = join_index(alltic, allpn, modTic, modPN) >= 0
+    hasMod2 = join_index(alltic, allpn, modTic2, modPN2) >= 0
+    hasSw = join_index(alltic, allpn, swTic, swPN) >= 0
+    hasSm = join_index(alltic, allpn, smFedTic1, smFedPN1) >= 0
+    hasMd = join_index(alltic, allpn, mdTic, mdPN) >= 0
+    allUniqFlg = join_values(alltic, allpn, modTic, modPN, modUniqFlg, fill=-1)
+    allSecFlg = join_values(alltic, allpn, modTic, modPN, modSecFlg, fill=-1)
+    allSecOvrFlg = join_values(alltic, allpn, modTic, modPN, modSecOvrFlg, fill=-1)
+    allModOESig = join_values(alltic, allpn, modTic, modPN, modOESig, fill=np.nan)
+    allUniqFlg2 = join_values(alltic, allpn, modTic2, modPN2, modUniqFlg2, fill=-1)
+    allSecFlg2 = join_values(alltic, allpn, modTic2, modPN2, modSecFlg2, fill=-1)
+    allSecOvrFlg2 = join_values(alltic, allpn, modTic2, modPN2, modSecOvrFlg2, fill=-1)
+    allModOESig2 = join_values(alltic, allpn, modTic2, modPN2, modOESig2, fill=np.nan)
+    allSwResidRatio = join_values(alltic, allpn, swTic, swPN, swResidRatio, fill=np.nan)
+    allMdFrac = join_values(alltic, allpn, mdTic, mdPN, mdFrac, fill=np.nan)
+
+    # TOI match flag. A TCE may match several TOI rows, the best
+    #  federation quality among them decides direct match or not
+    toiRow = join_index(toiFedTic, toiFedPN, alltic, allpn)
+    ib = np.where(toiRow >= 0)[0]
+    hasToi = np.zeros((nTce,), dtype=bool)
+    hasToi[toiRow[ib]] = True
+    toiMaxQual = np.full((nTce,), np.iinfo(np.int64).min, dtype=np.int64)
+    np.maximum.at(toiMaxQual, toiRow[ib], toiFedQual[ib])
+    allMatchFlg = np.zeros((nTce,), dtype=int)
+    allMatchFlg[hasToi] = np.where(toiMaxQual[hasToi] == 1, 1, -1)
+    # multiplanet systems can fall through the cracks add another flag
+    #  of nearby TOI exists so one needs to investigate the relationship
+    allMatchFlg[(allMatchFlg == 0) & np.isin(alltic, toiFedTic)] = 3
+    # Look to previous Planet match
+    #  and nearby previous planet was found independent of ephemeris
+    hasKp = join_index(alltic, allpn, kpFedTic, kpFedPN) >= 0
+    kpNear = np.isin(alltic, kpFedTic)
+    allMatchFlg[kpNear] = 4
+    allMatchFlg[hasKp] = 2
+
     # calculate expected duration
     expdur = transit_duration(allrstar, alllogg, allper, 0.0)
     durrat = np.abs(1.0 - alldur / expdur)
@@ -362,344 +511,128 @@ if __name__ == '__main__':
     depdiff = np.abs((allatdep - alltrpdep)/allatdep)
     
     # Planet radius rank
-    rprank = 1.0 - (allrp-rplims[0])/(rplims[1] - rplims[0])*0.9
-    rprank[rprank<0.1] = 0.1
-    rprank[rprank>1.0] = 1.0
-    rprank = np.log10(rprank)
-
+    rprank = rank_ramp(allrp, rplims)
     # MES rank
-    mesrank = (allmes-meslims[1])/(meslims[0]-meslims[1])*0.9 + 0.1    
-    mesrank[mesrank<0.1] = 0.1
-    mesrank[mesrank>1.0] = 1.0
-    mesrank = np.log10(mesrank)
-    
+    mesrank = rank_ramp(allmes, meslims)
     #tess mag rank
-    tmagrank = 1.0 - (alltmags-tessmaglims[0])/(tessmaglims[1]-tessmaglims[0])*0.9
-    tmagrank[tmagrank<0.1] = 0.1
-    tmagrank[tmagrank>1.0] = 1.0
-    tmagrank = np.log10(tmagrank)
-
+    tmagrank = rank_ramp(alltmags, tessmaglims)
     # duration expectation
-    durratrank = 1.0 - (durrat - durratlims[0])/(durratlims[1] - durratlims[0])*0.9
-    durratrank[durratrank<0.1] = 0.1
-    durratrank[durratrank>1.0] = 1.0
-    durratrank = np.log10(durratrank)
-
+    durratrank = rank_ramp(durrat, durratlims)
     # earth solar flux
-    solarfrank = 1.0 - (allsolarflux - solarfluxlims[0])/(solarfluxlims[1] - solarfluxlims[0])*0.9
-    solarfrank[solarfrank<0.1] = 0.1
-    solarfrank[solarfrank>1.0] = 1.0
-    solarfrank = np.log10(solarfrank)
-    
+    solarfrank = rank_ramp(allsolarflux, solarfluxlims)
     # snr 2 mes ratio
-    snr2mesrank = 1.0 - (snrrat-snr2meslims[0])/(snr2meslims[1] - snr2meslims[0])*0.9
-    snr2mesrank[snr2mesrank<0.1] = 0.1
-    snr2mesrank[snr2mesrank>1.0] = 1.0
-    snr2mesrank = np.log10(snr2mesrank)
-    
+    snr2mesrank = rank_ramp(snrrat, snr2meslims)
     # dv vs trapezoid depth similarity
-    depsimrank = 1.0 - (depdiff - reldepthlims[0])/(reldepthlims[1] - reldepthlims[0])*0.9
-    depsimrank[depsimrank<0.1] = 0.1
-    depsimrank[depsimrank>1.0] = 1.0
-    depsimrank = np.log10(depsimrank)
-    
+    depsimrank = rank_ramp(depdiff, reldepthlims)
     # Centroid oot offset
-#    centootrank = 1.0 - (allcentootsig - centlims[0])/(centlims[1] - centlims[1])*0.9
-#    centootrank[centootrank<0.1] = 0.1
-#    centootrank[centootrank>1.0] = 1.0
-#    centootrank = np.log10(centootrank)
-    
+#    centootrank = rank_ramp(allcentootsig, centlims)
     # Centroid tic offset
-#    centticrank = 1.0 - (allcentticsig - centlims[0])/(centlims[1] - centlims[1])*0.9
-#    centticrank[centticrank<0.1] = 0.1
-#    centticrank[centticrank>1.0] = 1.0
-#    centticrank = np.log10(centticrank)
+#    centticrank = rank_ramp(allcentticsig, centlims)
     
 #    totrank = (rprank + mesrank + tmagrank + durratrank + solarfrank + snr2mesrank+\
 #                depsimrank + centootrank + centticrank) / 9.0 + 1.0
     totrank = (rprank + mesrank + tmagrank + durratrank + solarfrank + snr2mesrank+\
                 depsimrank) / 7.0 + 1.0
 
-    if nWrk == 1 :
+    # Tier 1 must have no centroid issues, primary signif, no secondary (else albedo or period half),
+    # and no odd/even sig
+    # Evaluate every flag for all TCEs at once.  A TCE missing from a
+    #  result table does not get that table's flag
+    OEThresh = np.where(allsnr > highSNROE, OEThreshHighSNR, OEThreshDefault)
+    flgCenOOT = (allcentootsig > centlims[1]) | (allcentoote < 0.0)
+    flgCenTIC = (allcentticsig > centlims[1]) | (allcenttice < 0.0)
+    flgUniqAlt = hasMod & (allUniqFlg == 0)
+    flgUniqDV = hasMod2 & (allUniqFlg2 == 0)
+    flgSecAlt = hasMod & (allSecFlg == 1) & (allSecOvrFlg == 0)
+    flgSecAltPlan = hasMod & (allSecFlg == 1) & (allSecOvrFlg != 0)
+    flgSecDV = hasMod2 & (allSecFlg2 == 1) & (allSecOvrFlg2 == 0)
+    flgSecDVPlan = hasMod2 & (allSecFlg2 == 1) & (allSecOvrFlg2 != 0)
+    flgOEAlt = hasMod & (allModOESig > OEThresh)
+    flgOEDV = hasMod2 & (allModOESig2 > OEThresh)
+    flgSweet = hasSw & (allSwResidRatio < minSweetResidRatio)
+    flgOthTCE = hasSm
+    # Note: not currently checking pdcCor correlation metric
+    flgPDC = pdcNoi < minPDCNoiseMetric
+    flgRpBig = allrp > maxPlanetRadiusRearth
+    flgMoDump = hasMd & (allMdFrac > maxMomentumDumpFraction)
+    # fc is the cause flags for going to Tier 2
+    #  fc[12] is shared by secondary-is-planet and momentum dump
+    allfc = np.column_stack([flgCenOOT, flgCenTIC, flgUniqAlt, flgUniqDV, \
+                    flgSecAlt, flgSecDV, flgOEAlt, flgOEDV, flgSweet, \
+                    flgOthTCE, flgPDC, flgRpBig, flgSecAltPlan | flgMoDump, \
+                    flgSecDVPlan, np.zeros((nTce,), dtype=bool)]).astype(int)
+    # cause strings in the order they are reported
+    fcStrFlgs = [(flgCenOOT, 'CenOOT_'), (flgCenTIC, 'CenTIC_'), \
+                 (flgUniqAlt, 'UniqAlt_'), (flgUniqDV, 'UniqDV_'), \
+                 (flgSecAlt, 'HasSecAlt_'), (flgSecAltPlan, 'HasSecAltPlanet?_'), \
+                 (flgSecDV, 'HasSecDV_'), (flgSecDVPlan, 'HasSecDVPlanet?_'), \
+                 (flgOEAlt, 'OEAlt_'), (flgOEDV, 'OEDV_'), \
+                 (flgSweet, 'Sweet_'), (flgOthTCE, 'OthTCEMtch_'), \
+                 (flgPDC, 'PDCsummaryPostfix_'), (flgRpBig, 'RpBig_'), \
+                 (flgMoDump, 'MoDump_')]
+    #centroids and secondary is planet dont count as flag
+    allnFlags = flgUniqAlt.astype(int) + flgUniqDV + flgSecAlt + flgSecDV + \
+                flgOEAlt + flgOEDV + flgSweet + flgOthTCE + flgPDC + \
+                flgRpBig + flgMoDump
+    alltier1 = np.logical_not(np.any(allfc, axis=1))
+    allhasSec = flgSecAlt | flgSecDV
+    # undo sweet fail if sweet test is the only fail and no other flags thrown
+    allsweetFail = flgSweet & (allnFlags != 1)
+    allsweetBypass = flgSweet & (allnFlags == 1)
+
+    if writeTiers:
         fout1 = open(fileOut1,'w')
         fout2 = open(fileOut2, 'w')
         fout3 = open(fileOut3, 'w')              
+    workArgs = []
+    costs = []
+    taskNames = []
     ia = np.argsort(-totrank)
     for i in range(len(ia)):
-        if np.mod(i, nWrk) == wID:
-            j = ia[i]
-            # Look for a TOI match
-            matchFlg = 0
-            # fc is the cause flags for going to Tier 2
-            fc = np.zeros((15,), dtype=int)
-            fc_str = ''
-            ib = np.where((alltic[j] == toiFedTic) & (allpn[j] == toiFedPN))[0]
-            if len(ib)>0:
-                # Was it a direct match or not
-                mtch = np.max(toiFedQual[ib])
-                if mtch == 1:
-                    matchFlg = 1
-                else:
-                    matchFlg = -1
-            # multiplanet systems can fall through the cracks add another flag
-            #  of nearby TOI exists so one needs to investigate the relationship
-            if matchFlg == 0:
-                ib = np.where((alltic[j] == toiFedTic))[0]
-                if len(ib)>0:
-                    # has some kind of neighbor with previously identified toi
-                    matchFlg = 3
-            # Look to previous Planet match
-            ib = np.where((alltic[j] == kpFedTic) & (allpn[j] == kpFedPN))[0]
-            if len(ib)>0:
-                matchFlg = 2
-            # now look for a nearby previous planet was found independent of ephemeris
-            if not matchFlg == 2:
-                ib = np.where((alltic[j] == kpFedTic))[0]
-                if len(ib)>0:
-                    matchFlg = 4
-            curstr = '{0:016d} {1:d} {2:f} {3:d}\n'.format(alltic[j], allpn[j], totrank[j], matchFlg)
-            print(curstr)
-    
-            # Find modshift data to place in tier
-            kidx = np.where((alltic[j] == modTic) & (allpn[j] == modPN))[0]
-            kidx2 = np.where((alltic[j] == modTic2) & (allpn[j] == modPN2))[0]
-            # Find sweet data 
-            kswidx = np.where((alltic[j] == swTic) & (allpn[j] == swPN))[0]
-            # Find self match TCE
-            ksmidx = np.where((alltic[j] == smFedTic1) & (allpn[j] == smFedPN1))[0]
-            # Find PDC Goodness stat data
-            kpdcidx = np.where((alltic[j] == pdcTic) & (allpn[j] == pdcPn))[0]
-            # Find Momentum deump data
-            kmdidx = np.where((alltic[j] == mdTic) & (allpn[j] == mdPN))[0]
-            # Find planet radius
-            curRp = allrp[j]
-            curSNR = allsnr[j]
-
-            # Tier 1 must have no centroid issues, primary signif, no secondary (else albedo or period half),
-            # and no odd/even sig
-            tier1 = True
-            hasSec = False
-            nFlags = 0
-            if allcentootsig[j] > centlims[1] or allcentoote[j] < 0.0:
-                tier1 = False
-                fc[0] = 1
-                fc_str = fc_str + 'CenOOT_'
-                #nFlags = nFlags + 1 #centroids dont count as flag
-            if allcentticsig[j] > centlims[1] or allcenttice[j] < 0.0:
-                tier1 = False
-                fc[1] = 1
-                fc_str = fc_str + 'CenTIC_'
-                #nFlags = nFlags + 1 #centroids dont count as flag
-            if modUniqFlg[kidx] == 0:
-                tier1 = False
-                fc[2] = 1
-                fc_str = fc_str + 'UniqAlt_'
-                nFlags = nFlags + 1
-            if modUniqFlg2[kidx2] == 0:
-                tier1 = False
-                fc[3] = 1
-                fc_str = fc_str + 'UniqDV_'
-                nFlags = nFlags + 1
-            if modSecFlg[kidx] == 1:
-                if modSecOvrFlg[kidx] == 0:
-                    tier1 = False
-                    fc[4] = 1
-                    hasSec = True
-                    fc_str = fc_str + 'HasSecAlt_'
-                    nFlags = nFlags + 1
-                else:
-                    tier1 = False
-                    fc[12] = 1
-                    fc_str = fc_str + 'HasSecAltPlanet?_'
-                    #nFlags = nFlags + 1 #not flag
-            if modSecFlg2[kidx2] == 1:
-                if modSecOvrFlg2[kidx2] == 0:
-                    tier1 = False
-                    fc[5] = 1
-                    hasSec = True
-                    fc_str = fc_str + 'HasSecDV_'
-                    nFlags = nFlags + 1
-                else:
-                    tier1 = False
-                    fc[13] = 1
-                    fc_str = fc_str + 'HasSecDVPlanet?_'
-                    #nFlags = nFlags + 1 #  not flag
-            OEThresh = OEThreshDefault
-            if curSNR > highSNROE:
-                OEThresh = OEThreshHighSNR 
-            if modOESig[kidx] > OEThresh:
-                tier1 = False
-                fc[6] = 1
-                fc_str = fc_str + 'OEAlt_'
-                nFlags = nFlags + 1
-            if modOESig2[kidx2] > OEThresh:
-                tier1 = False
-                fc[7] = 1
-                fc_str = fc_str + 'OEDV_'
-                nFlags = nFlags + 1
-            sweetFail = False
-            if len(kswidx)>0:
-                # Look for sweet test results
-                if swResidRatio[kswidx] < minSweetResidRatio:
-                    tier1 = False
-                    fc[8] = 1
-                    sweetFail = True
-                    fc_str = fc_str + 'Sweet_'
-                    nFlags = nFlags + 1
-            # Other TCE match
-            if len(ksmidx)>0:
-                tier1 = False
-                fc[9] = 1
-                fc_str = fc_str + 'OthTCEMtch_'
-                nFlags = nFlags + 1
-            # PDC goodness stat
-            if len(kpdcidx)>0:
-                if pdcNoi[kpdcidx] < minPDCNoiseMetric:# and pdcCor[kpdcidx] <:
-                    # Note: not currently checking correlation metric
-                    tier1 = False
-                    fc[10] = 1
-                    fc_str = fc_str + 'PDCsummaryPostfix_'
-                    nFlags = nFlags + 1
-            # Planet radius too big caution
-            if curRp > maxPlanetRadiusRearth:
-                tier1 = False
-                fc[11] = 1
-                fc_str = fc_str +'RpBig_'
-                nFlags = nFlags + 1
-            # Momentum dump on events caution
-            if len(kmdidx)>0:
-                if mdFrac[kmdidx] > maxMomentumDumpFraction:
-                    tier1 = False
-                    fc[12] = 1
-                    fc_str = fc_str + 'MoDump_'
-                    nFlags = nFlags + 1
-
-            # undo sweet fail if sweet test is the only fail and no other flags thrown
-            if sweetFail and nFlags == 1:
-                sweetFail = False
-                print('TIC {0:d} PN {1:d} bypass sweet fail'.format(alltic[j], allpn[j]))
-            reportIt = False
-            if tier1:
-                if nWrk == 1:
-                    fout1.write(curstr)
-                mrkStr = 'Tier 1'
-                reportIt = True
-            if (not tier1) and (not hasSec) and (not sweetFail):
-                curstr2 = ''.join(str(x) for x in fc)
-                mrkStr = 'Tier 2 {}'.format(fc_str)
-                if nWrk == 1:
-                    fout2.write('{} {} {}\n'.format(curstr[0:-1],curstr2, fc_str))
-                reportIt = True
-            if (not tier1) and (not reportIt):
-                mrkStr = 'Tier 3 {} {}'.format(hasSec, sweetFail)
-                if nWrk == 1:
-                    fout3.write('{} {} {}\n'.format(curstr[0:-1],hasSec,sweetFail))
-                reportIt = True
-            if doPNGs and reportIt:
-                if tgt_2min:
-                    inputFile = os.path.join(summaryFolder,'{0}s{1:04d}-s{2:04d}-{3:016d}-{4:02d}{5}'.format(summaryPrefix,SECTOR1,SECTOR2,alltic[j],allpn[j],summaryPostfix))
-                else: # FTL DV report file name format
-                    inputFile = os.path.join(summaryFolder,'{0}{1:016d}{2}{3:02d}.pdf'.format(summaryPrefix,alltic[j],summaryPostfix,allpn[j]))
-                    #inputFile = os.path.join(summaryFolder,'{0}{1:016d}-s{2:04d}-s{3:04d}{4}{5:02d}.pdf'.format(summaryPrefix,alltic[j],SECTOR1,SECTOR2,summaryPostfix,allpn[j]))
-                outputFile = os.path.join(pngFolder,'{0:04d}-{1:016d}-{2:02d}.png'.format(i, alltic[j], allpn[j]))
-                comstring = 'gs -dBATCH -dNOPAuSE -sDEVICE=png16m -r300 -o {0} {1}'.format(outputFile, inputFile)
-                tmp = call(comstring, shell=True)
-            if doMergeSum and reportIt:
-                curTic = alltic[j]
-                curPn = allpn[j]
-
-                # Make a temporary pdfmark file for adding Tier level and keywords to pdf
-                #mrkFile = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic),'pdfmarks_{0:016d}_{1:02d}.txt'.format(curTic,curPn))
-                #mrkOut = open(mrkFile,'w')
-                #mrkOut.write('/pdfmark where {pop}{userdict /pdfmark /cleartomark load put} ifelse\n')
-                #mrkOut.write('[ /Rect [ 15 735 500 785 ] /DA ([1 0 0] rg /Cour 20 Tf) /BS << /W 0 >> /Q 0 /Subtype /FreeText /SrcPg 1\n')
-                #mrkOut.write('/Contents ({}) /ANN pdfmark\n'.format(mrkStr))
-                #mrkOut.close()
-                # Make a ps file for adding Tier level and keywords to pdf
-                # via https://stackoverflow.com/questions/18769314/add-text-on-1st-page-of-a-pdf-file
-                mrkFile = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic),'tecres_{0:016d}_{1:02d}.ps'.format(curTic,curPn))
-                mrkOut = open(mrkFile,'w')
-                mrkOut.write('%!\n')
-                mrkOut.write('<< /EndPage {0 eq{0 eq{\n')
-                mrkOut.write('/Arial findfont 22 scalefont setfont newpath 15 770 moveto 1 0 0 setrgbcolor ({0}) show\n'.format(mrkStr))
-                mrkOut.write('} if true}{pop false} ifelse} >> setpagedevice\n')
-                mrkOut.close()
-                
-                if tgt_2min:
-                    inputFile1 = os.path.join(summaryFolder,'{0}s{1:04d}-s{2:04d}-{3:016d}-{4:02d}*dvs.pdf'.format(summaryPrefix,SECTOR1,SECTOR2,alltic[j],allpn[j],summaryPostfix))
-                else:  # FTL file format
-                    inputFile1 = os.path.join(summaryFolder,'{0}{1:016d}{2}{3:02d}.pdf'.format(summaryPrefix,alltic[j],summaryPostfix,allpn[j]))
-                    #inputFile1 = os.path.join(summaryFolder,'{0}{1:016d}-s{2:04d}-s{3:04d}{4}{5:02d}.pdf'.format(summaryPrefix,alltic[j],SECTOR1,SECTOR2,summaryPostfix,allpn[j]))
-
-                inputFileList = glob.glob(inputFile1)
-                if not len(inputFileList) == 1:
-                    print('Error: not found or multiple DV summaries found for {0:d} pn {1:d}'.format(alltic[j], allpn[j]))
-                    exit()
-                inputFile1 = inputFileList[0]
-                #outputFile = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic),'tecsummary_{0:016d}_{1:02d}.pdf'.format(curTic,curPn))
-                # Add TEC tier level and keywords to summary page with imagemagick convert
-                #comstring = "convert -density 500 {0} -pointsize 25 -draw \"text 20,150 '{1}'\"  {2}".format(inputFile1, mrkStr, outputFile)
-                #print(comstring)
-                #tmp = call(comstring, shell=True)
-                #inputFile1 = outputFile
-                inputFile2 = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic), 'tess_{0:016d}_{1:02d}-modshift.pdf'.format(curTic,curPn))
-                inputFile3 = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic), 'tess_{0:016d}_{1:02d}_med-modshift.pdf'.format(curTic,curPn))
-                # Check that modshift files exist
-                if not os.path.isfile(inputFile2):
-                    inputFile2 = ''
-                if not os.path.isfile(inputFile3):
-                    inputFile3 = ''
-    
-                inputFileList = []
-                if multi_sector_flag:
-                    for curSec in np.arange(SECTOR1,SECTOR2+1):
-                        inputFile4 = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic), 'tess_diffImg_{0:016d}_{1:02d}_{2:02d}.pdf'.format(curTic,curPn,curSec))
-                        if os.path.isfile(inputFile4):
-                            inputFileList.append(inputFile4)
-                    # Summar centriod figure
-                    inputFile4 = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic), 'tess_diffImg_{0:016d}_{1:02d}_centsum.pdf'.format(curTic,curPn))
-                    if os.path.isfile(inputFile4):
-                        inputFileList.append(inputFile4)
-                    for curSec in np.arange(SECTOR1, SECTOR2+1):
-                        inputFile4 = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic), 'tess_mods_diffImg_{0:016d}_{1:02d}_{2:02d}.pdf'.format(curTic,curPn,curSec))
-                        if os.path.isfile(inputFile4):
-                            inputFileList.append(inputFile4)
-                    for curSec in np.arange(SECTOR1, SECTOR2+1):
-                        inputFile4 = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic), 'tess_bsc_diffImg_{0:016d}_{1:02d}_{2:02d}.pdf'.format(curTic,curPn,curSec))
-                        if os.path.isfile(inputFile4):
-                            inputFileList.append(inputFile4)
-                else:
-                    inputFile4 = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic), 'tess_diffImg_{0:016d}_{1:02d}_{2:02d}.pdf'.format(curTic,curPn,SECTOR1))
-                    inputFileList.append(inputFile4)
-                    inputFile5 = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic), 'tess_mods_diffImg_{0:016d}_{1:02d}_{2:02d}.pdf'.format(curTic,curPn,SECTOR1))
-                    if os.path.isfile(inputFile5):
-                        inputFileList.append(inputFile5)
-                    inputFile6 = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic), 'tess_bsc_diffImg_{0:016d}_{1:02d}_{2:02d}.pdf'.format(curTic,curPn,SECTOR1))
-                    if os.path.isfile(inputFile6):
-                        inputFileList.append(inputFile6)
-    
-                # Look for Twexo page
-                inputFile7 = os.path.join(make_data_dirs(sesMesDir, SECTOR, curTic), 'twexo_{0:016d}.pdf'.format(curTic))
-                if os.path.isfile(inputFile7):
-                    inputFileList.append(inputFile7)
-
-                outputFile = os.path.join(pdfFolder,'tec-s{3:04d}-{1:016d}-{2:02d}.pdf'.format(i, alltic[j], allpn[j], SECTOR2))
-                outputFile2 = os.path.join(pdfFolder,'tec-s{3:04d}-{1:016d}-{2:02d}_mrg.pdf'.format(i, alltic[j], allpn[j], SECTOR2))
-                #comstring = 'convert {0} {1} {2}'.format(inputFile1, inputFile2, outputFile)
-                comstring = 'gs -dBATCH -dNOPAUSE -q -sDEVICE=pdfwrite -sOutputFile={0} -dPDFSETTINGS=/prepress {4} {1} {2} {3}'.format(outputFile, inputFile1, inputFile2, inputFile3, mrkFile)
-                #comstring = 'gs -dBATCH -dNOPAUSE -q -sDEVICE=pdfwrite -sOutputFile={0} {1} {2} {3}'.format(outputFile, inputFile1, inputFile2, inputFile3)
-                for ifil in inputFileList:
-                    comstring += ' {0} '.format(ifil)
-
-                tmp = call(comstring, shell=True)
-                # Add pdfmark text
-                #print(outputFile)
-                #comstring = 'gs -dBATCH -dNOPAUSE -sDEVICE=pdfwrite -sOutputFile={0} -dPDFSETTINGS=/prepress {1} {2}'.format(outputFile2, mrkFile, outputFile)
-                #print(comstring)
-                #tmp = call(comstring, shell=True)
-            
-    print("hello world")
-    if nWrk == 1:
+        j = ia[i]
+        matchFlg = allMatchFlg[j]
+        fc = allfc[j]
+        fc_str = ''.join(curs for curflg, curs in fcStrFlgs if curflg[j])
+        curstr = '{0:016d} {1:d} {2:f} {3:d}\n'.format(alltic[j], allpn[j], totrank[j], matchFlg)
+        print(curstr)
+
+        tier1 = alltier1[j]
+        hasSec = allhasSec[j]
+        sweetFail = allsweetFail[j]
+        if allsweetBypass[j]:
+            print('TIC {0:d} PN {1:d} bypass sweet fail'.format(alltic[j], allpn[j]))
+        reportIt = False
+        if tier1:
+            if writeTiers:
+                fout1.write(curstr)
+            mrkStr = 'Tier 1'
+            reportIt = True
+        if (not tier1) and (not hasSec) and (not sweetFail):
+            curstr2 = ''.join(str(x) for x in fc)
+            mrkStr = 'Tier 2 {}'.format(fc_str)
+            if writeTiers:
+                fout2.write('{} {} {}\n'.format(curstr[0:-1],curstr2, fc_str))
+            reportIt = True
+        if (not tier1) and (not reportIt):
+            mrkStr = 'Tier 3 {} {}'.format(hasSec, sweetFail)
+            if writeTiers:
+                fout3.write('{} {} {}\n'.format(curstr[0:-1],hasSec,sweetFail))
+            reportIt = True
+        if (doPNGs or doMergeSum) and reportIt:
+            workArgs.append((i, alltic[j], allpn[j], mrkStr, doPNGs, doMergeSum, \
+                             summaryFolder, summaryPrefix, summaryPostfix, pngFolder, \
+                             pdfFolder, sesMesDir, SECTOR, SECTOR1, SECTOR2, \
+                             multi_sector_flag, tgt_2min))
+            # Reports with more sectors have more pages to merge
+            costs.append(allnsec[j])
+            taskNames.append('TIC {0:d} PN {1:d}'.format(alltic[j], allpn[j]))
+    if writeTiers:
         fout1.close()
         fout2.close()
         fout3.close()
+    # The reports are made in a pool of nWrk processes
+    results, failed = run_tasks(tec_report_worker, workArgs, costs, nWorkers=nWrk, \
+                                taskNames=taskNames)
+
+    print("hello world")
+    exit_if_failed(failed)
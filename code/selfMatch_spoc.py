@@ -11,7 +11,7 @@ import csv
 import cjb_utils as cjb
 import scipy.special as spec
 import toidb_federate as fed
-from gather_tce_fromdvxml import tce_seed
+from gather_tce_fromdvxml import TceCatalog
 import time
 import json
 import cjb_utils as cjb
@@ -108,16 +108,42 @@ def getTICSep(tic1, tic2):
 
 
 
-def coughlin_sigmap(p1,p2):
-    up1 = p1
-    up2 = p2
-    if up1 > up2:
-        tmp = up2
-        up2 = up1
-        up1 = tmp
-    delP = (up1 - up2)/up1
-    delPp = abs(delP - round(delP))
-    return np.sqrt(2.0)*spec.erfcinv(delPp)
+class period_index:
+    """ TCE periods sorted once so the TCEs with a period near an
+        integer ratio of a given period are found with range queries
+        rather than evaluating fed.coughlin_sigmap against every TCE
+    """
+    def __init__(self, periods):
+        self.periods = np.asarray(periods, dtype=float)
+        # Only positive periods are indexed
+        gd = np.where(self.periods > 0.0)[0]
+        self.srt = gd[np.argsort(self.periods[gd], kind='mergesort')]
+        self.srtPer = self.periods[self.srt]
+
+    def candidates(self, per, sigThresh):
+        """ Indices into periods, in increasing order, with
+            fed.coughlin_sigmap(per, periods) > sigThresh
+        """
+        if len(self.srtPer) == 0 or not per > 0.0:
+            return np.array([], dtype=int)
+        # fed.coughlin_sigmap > sigThresh when the ratio of the longer to
+        #  shorter period is within tol of an integer.  Widen the ranges
+        #  a bit for round off and apply the exact test at the end
+        tol = spec.erfc(sigThresh/np.sqrt(2.0)) * 1.01 + 1.0e-12
+        nLong = np.arange(1, int(self.srtPer[-1]/per + tol) + 2)
+        nShrt = np.arange(1, int(per/self.srtPer[0] + tol) + 2)
+        lo = np.concatenate((per*(nLong - tol), per/(nShrt + tol)))
+        hi = np.concatenate((per*(nLong + tol), per/(nShrt - tol)))
+        ilo = np.searchsorted(self.srtPer, lo, side='left')
+        ihi = np.searchsorted(self.srtPer, hi, side='right')
+        nIn = ihi - ilo
+        nTot = np.sum(nIn)
+        if nTot == 0:
+            return np.array([], dtype=int)
+        # Expand the index ranges [ilo, ihi)
+        j = np.repeat(ilo - (np.cumsum(nIn) - nIn), nIn) + np.arange(nTot)
+        idx = np.unique(self.srt[j])
+        return idx[fed.coughlin_sigmap(per, self.periods[idx]) > sigThresh]
 
 
 def genericFed(per, epc, tryper, tryepc, trydur, trypn, trytic, tStart, tEnd):
@@ -151,8 +177,7 @@ if __name__ == '__main__':
 
     # Load the tce data h5
     tceSeedInFile = run_name + '_tce.h5'
-    tcedata = tce_seed()
-    all_tces = tcedata.fill_objlist_from_hd5f(tceSeedInFile)
+    tcecat = TceCatalog(tceSeedInFile)
     # Check to see if cadence to time mappting is available
     hasCadTimeMap = False
     if os.path.exists('cadnoVtimemap.txt'):
@@ -164,21 +189,21 @@ if __name__ == '__main__':
 
 
     
-    alltic = np.array([x.epicId for x in all_tces], dtype=np.int64)
-    allpn = np.array([x.planetNum for x in all_tces], dtype=int)
-    allatvalid = np.array([x.at_valid for x in all_tces], dtype=int)
-    allrp = np.array([x.at_rp for x in all_tces])
-    allper = np.array([x.at_period for x in all_tces])
-    alldur = np.array([x.at_dur for x in all_tces])
-    allepc = np.array([x.at_epochbtjd for x in all_tces])
-    alltrpvalid = np.array([x.trp_valid for x in all_tces], dtype=int)
-    alltrpdur = np.array([x.trp_dur for x in all_tces])
-    alltrpepc = np.array([x.trp_epochbtjd for x in all_tces])
-    alltcedur = np.array([x.pulsedur for x in all_tces])
-    alltceepc = np.array([x.tce_epoch for x in all_tces])
-    alltceper = np.array([x.tce_period for x in all_tces])
-    alltceCadStrt = np.array([x.data_start for x in all_tces], dtype=np.int64)
-    alltceCadEnd = np.array([x.data_end for x in all_tces], dtype=np.int64)
+    alltic = np.asarray(tcecat['epicId'], dtype=np.int64)
+    allpn = np.asarray(tcecat['planetNum'], dtype=int)
+    allatvalid = np.asarray(tcecat['at_valid'], dtype=int)
+    allrp = tcecat['at_rp']
+    allper = tcecat['at_period']
+    alldur = tcecat['at_dur']
+    allepc = tcecat['at_epochbtjd']
+    alltrpvalid = np.asarray(tcecat['trp_valid'], dtype=int)
+    alltrpdur = tcecat['trp_dur']
+    alltrpepc = tcecat['trp_epochbtjd']
+    alltcedur = tcecat['pulsedur']
+    alltceepc = tcecat['tce_epoch']
+    alltceper = tcecat['tce_period']
+    alltceCadStrt = np.asarray(tcecat['data_start'], dtype=np.int64)
+    alltceCadEnd = np.asarray(tcecat['data_end'], dtype=np.int64)
     # Go through each tce and use valid fits from dv, trpzd, tce in that order for matching
     useper = np.zeros_like(allper)
     useepc = np.zeros_like(allper)
@@ -222,6 +247,9 @@ if __name__ == '__main__':
     pcCadStrt = gtCadStrt
     pcCadEnd = gtCadEnd
     
+    # Sort the periods once for finding signals at integer period ratios
+    perIndex = period_index(gtPer)
+
     # Use this for debugging
 #    idx = np.where(pcTIC == 220432563)[0]
 #    pcTIC, pcTOI, pcPer, pcEpc, pcDur = cjb.idx_filter(idx, pcTIC, pcTOI,\
@@ -246,24 +274,17 @@ if __name__ == '__main__':
             uowStartUse = uowStart
             uowEndUse = uowEnd
         
-        # Remove all signals on the current tic
-        idx = np.where(np.logical_not((curTic == gtTIC)))[0]
-        usePer = gtPer[idx]
-        useEpc = gtEpc[idx]
-        useTic = gtTIC[idx]
-        useToi = gtTOI[idx]
-        useDur = gtDur[idx]
-        sigMatch = np.zeros((len(usePer),), dtype=float)
-        for j in range(len(usePer)):
-            sigMatch[j] = coughlin_sigmap(curper, usePer[j])
-        idxSig = np.where(sigMatch > 3.0)[0]
+        # Signals at an integer period ratio, removing all signals on
+        #  the current tic
+        idxSig = perIndex.candidates(curper, 3.0)
+        idxSig = idxSig[gtTIC[idxSig] != curTic]
         if len(idxSig) > 0:
             # Potential match
-            tryper = usePer[idxSig]
-            tryepc = useEpc[idxSig]
+            tryper = gtPer[idxSig]
+            tryepc = gtEpc[idxSig]
             trypn = np.ones_like(idxSig)
-            trydur = useDur[idxSig]
-            trytic = useTic[idxSig]
+            trydur = gtDur[idxSig]
+            trytic = gtTIC[idxSig]
             bstpn, bsttic, bstMatch, bstStat, bstPeriodRatio, bstPeriodRatioFlag, bstFederateFlag, nFed = \
                     genericFed(curper, curepc, tryper, tryepc, trydur, trypn, trytic, uowStartUse, uowEndUse)
             # If federation found calculate spatial separation between TICs
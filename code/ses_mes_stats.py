@@ -22,22 +22,33 @@ import os
 import math
 import fluxts_conditioning as flux_cond
 import kep_wavelets as kw
-from gather_tce_fromdvxml import tce_seed
+import cjb_utils as cjb
+from gather_tce_fromdvxml import TceCatalog
+from tce_join import join_index, read_tce_list
 import scipy.stats as st
 from statsmodels import robust
 import argparse
+import hashlib
 import tec_run_parameters as tecrp
+from tec_scheduler import run_tasks, exit_if_failed
+
+# Wavelet search constants.  These go into the sesmes input hash
+WAVELET_LEN = 12
+VARIANCE_FILTER_FACTOR = 15
+# Trial durations as multiples of the search duration for the MES
+#  duration grid
+DURATION_GRID_FACTORS = np.array([0.5, 0.75, 1.0, 1.5, 2.0])
 
 
 def make_data_dirs(prefix, sector, epic):
     secDir = 'S{0:02d}'.format(sector)
     localDir = os.path.join(prefix,secDir)
     if not os.path.exists(localDir):
-        os.mkdir(localDir)
+        os.makedirs(localDir, exist_ok=True)
     epcDir = '{0:04d}'.format(int(math.floor(epic/1000.0)))
     localDir = os.path.join(prefix,secDir,epcDir)
     if not os.path.exists(localDir):
-        os.mkdir(localDir)
+        os.makedirs(localDir, exist_ok=True)
     return localDir
 
 
@@ -265,22 +276,433 @@ def get_ses_stats(corr, norm, corr_r, norm_r, phi, phiDur, events, time, oCadNo,
         all_chases, newMnMes, newMnMes_r, mnSes2mnMes, mnSes2mnMes_r, all_corr, \
         all_norm, all_time, all_cadNo
     
+def mes_duration_grid(corr, norm, phi, phiDur):
+    """ MES at each trial duration from the peak SES of every transit
+        as in get_ses_stats
+        INPUT:
+          corr, norm - [nDur, nCad] statistic time series at valid cadences
+          phi - phase of the valid cadences
+          phiDur - transit duration in phase
+        OUTPUT:
+          mes - [nDur] MES, 0 if there are fewer than 2 transits
+    """
+    nDur = corr.shape[0]
+    mes = np.zeros((nDur,))
+    runcad = np.arange(corr.shape[1])
+    tmpcad = runcad[np.abs(phi) <= phiDur]
+    if len(tmpcad) == 0:
+        return mes
+    # Contiguous in transit cadences are one transit
+    evtId = np.cumsum(np.insert(np.diff(tmpcad) > 1, 0, False))
+    nEvt = evtId[-1] + 1
+    if nEvt < 2:
+        return mes
+    sumCorr = np.zeros((nDur,))
+    sumNorm2 = np.zeros((nDur,))
+    durIdx = np.arange(nDur)
+    for i in range(nEvt):
+        evtCad = tmpcad[evtId == i]
+        curCorr = corr[:,evtCad]
+        curNorm = norm[:,evtCad]
+        ia = np.argmax(curCorr/curNorm, axis=1)
+        sumCorr = sumCorr + curCorr[durIdx,ia]
+        sumNorm2 = sumNorm2 + curNorm[durIdx,ia]**2
+    mes = sumCorr/np.sqrt(sumNorm2)
+    return mes
+
+def code_hash(fileNames):
+    """ Hash of the source files of the ses/mes calculation so outputs
+        made by different code are not mistaken for current ones """
+    hsh = hashlib.sha1()
+    for fil in fileNames:
+        with open(fil, 'rb') as fp:
+            hsh.update(fp.read())
+    return hsh.hexdigest()
+
+def ses_mes_input_hash(arrays, params):
+    """ Hash of everything a tess_sesmes output depends on
+        INPUT:
+          arrays - list of numpy arrays (light curve, bad times, ...)
+          params - list of scalar parameters and constants
+        OUTPUT:
+          hash hex string
+    """
+    hsh = hashlib.sha1()
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr)
+        hsh.update('{0} {1}\n'.format(arr.dtype.str, arr.shape).encode())
+        hsh.update(arr.tobytes())
+    for par in params:
+        hsh.update('{0!r}\n'.format(par).encode())
+    return hsh.hexdigest()
+
+def stored_input_hash(fileName):
+    """ Input hash saved with a tess_sesmes output.  '' if there is no
+        output or it was made before the hash was saved """
+    if not os.path.isfile(fileName):
+        return ''
+    try:
+        with h5py.File(fileName, 'r') as f:
+            return str(f.attrs.get('inputHash', ''))
+    except (IOError, OSError):
+        # Unreadable, e.g. a write that did not finish
+        return ''
+
+def ses_mes_worker(args):
+    """ Detrend and calculate the SES/MES statistics for one TCE
+        and write its tess_sesmes h5d file.
+        Used with tec_scheduler.run_tasks """
+    td, dvDataDir, outputDir, SECTOR, cadPerHr, badTimes, validFrac, \
+            firstFilterScaleFac, codeHash, overWrite, doDebug = args
+    epicid = td.epicId
+    print(epicid)
+    pn = td.planetNum
+    period = 0.0
+    epoch = 0.0
+    duration = 0.0
+    depth = 0.0
+    if td.at_valid == 1:
+        period = td.at_period
+        epoch = td.at_epochbtjd
+        duration = td.at_dur
+        depth = td.at_depth
+    elif td.trp_valid == 1:
+        period = td.tce_period
+        epoch = td.trp_epochbtjd
+        duration = td.trp_dur
+        depth = td.trp_depth
+    else:
+        period = td.tce_period
+        epoch = td.tce_epoch
+        duration = td.pulsedur
+        depth = 1000.0
+    fileOutput = os.path.join(make_data_dirs(outputDir, SECTOR, epicid), 'tess_sesmes_{0:016d}_{1:02d}.h5d'.format(epicid,pn))
+    localDir = make_data_dirs(dvDataDir,SECTOR,epicid)
+    fileInput = os.path.join(localDir, 'tess_dvts_{0:016d}_{1:02d}.h5d'.format(epicid,pn))
+    f = h5py.File(fileInput,'r')
+    # Decide which flux time series to use pdc or lc_init
+    # ***NOTE harmonic filter is not being used so pdf flux should be used
+    #useFlux = np.array(f['lc_init'])
+    #  ***If flux is norm subtracted at 1.0 to it
+    #useFlux = useFlux + 1.0
+    useFlux = np.array(f['pdc_flux'])
+    #useFlux3 = np.array(f['lc_white'])
+    #useFlux3 = useFlux3 + 1.0
+    vd = np.array(f['valid_data_flag'])
+    time = np.array(f['timetbjd'])
+    cadNo = np.array(f['cadenceNo'])
+    f.close()
+    # Skip the TCE if its output was made from the same inputs
+    inputHash = ses_mes_input_hash([useFlux, vd, time, cadNo, badTimes, \
+                    td.all_sectors, td.all_cadstart, td.all_cadend], \
+                    [float(period), float(epoch), float(duration), float(depth), \
+                    float(td.pulsedur), float(td.mes), cadPerHr, validFrac, \
+                    firstFilterScaleFac, WAVELET_LEN, VARIANCE_FILTER_FACTOR, \
+                    list(DURATION_GRID_FACTORS), codeHash])
+    if overWrite or not stored_input_hash(fileOutput) == inputHash:
+        print('pulse: {:f} fitdur: {:f}'.format(td.pulsedur, duration))
+        searchDurationHours = np.max([td.pulsedur, duration])
+        # Cap duration at 15 hours
+        searchDurationHours = np.min([searchDurationHours, 15.0])
+
+        origMes = td.mes
+        print('Orig ',origMes, epicid, pn)
+        # Remove cadences within 5 minutes of a skyline time
+        vd[cjb.near_times(time, badTimes, 5.0/60.0/24.0)] = False
+        if doDebug:
+            tmpx = np.arange(len(useFlux))
+            plt.plot(useFlux, '.')
+            plt.plot(tmpx[vd], useFlux[vd], '.')
+            
+            plt.show()
+            
+        # assign sector numbers to data
+        secnum = np.ones_like(cadNo, dtype=int)
+        idxSec = np.where(td.all_sectors>=0)[0]
+        all_sectors = td.all_sectors[idxSec]
+        all_cadstart = td.all_cadstart[idxSec]
+        all_cadend = td.all_cadend[idxSec]
+        nSec = len(all_sectors)
+        if len(all_sectors)>1:
+            for kk in range(nSec):
+                idx = np.where((cadNo >= all_cadstart[kk]) & (cadNo <= all_cadend[kk])  )[0]
+                secnum[idx] = all_sectors[kk]
+        
+        # Mark data in transit as deweighted during detrending
+        ootvd = np.full_like(vd, True)
+        phi = phaseData(time, period, epoch)
+        idx = np.where(np.abs(phi) < duration/2.0/24.0/period)[0]
+        ootvd[idx] = False
+        
+        # Make a reference transit signal shape
+        ztmp = phi * period
+        ref_sig = trapezoid(ztmp, depth/1.0e6, duration/24.0, duration/24.0/1.1)
+#                if doDebug:
+#                    plt.plot(ref_sig, '.')
+#                    plt.show()
+        # Determine empirical noise from flux time series
+        vdootIdx = np.where(vd & ootvd)[0]
+        flux_level = np.median(useFlux[vdootIdx])
+        flux_diff = np.diff(useFlux[vdootIdx]) / flux_level
+        emp_noise = robust.mad(flux_diff)/np.sqrt(2.0)
+        print('Empirical Noise [ppm]: {0:.1f}'.format(emp_noise*1.0e6))
+#                if doDebug:
+#                    plt.plot(flux_diff, '.')
+#                    plt.show()
+        # Add noise to reference transit signal
+        ref_noise = np.random.randn(len(useFlux))*emp_noise + 1.0
+        ref_sig = ref_sig*ref_noise
+#                if doDebug:
+#                    plt.plot(ref_sig, '.')
+#                    plt.show()
+        
+        # For ETE6 only there was unexpectedly extra data after 
+        #  indice 1348. Mark those aftr 1348 as invalid now
+        #vd[1349:] = False
+        
+        # For Sector 1 data there was a crappy part 
+        #vd[2465:2750] = False
+        # detrend data fixe edges
+        # Verify that there is enough data to do analysis
+        # Also do a period cut
+        
+        # Need to update the valid data fraction for multi-sector
+        # For single sector this would catch data that was missing
+        # because previous planets detected removed too much data
+        #    avoid the 'swiss' cheese light curves
+        #  but for multi-sector the light curve can have long gaps
+        #  of missing sectors this is not the intent of the check
+        # Need to look for long gaps and remove these from the calculation
+        # Protect against no valid data
+        idxGd = np.where(vd)[0]
+        if not len(idxGd) == 0:
+            # Time differences
+            gdTime = time[idxGd]
+            difftime = np.diff(gdTime)
+            jumpidx = np.where(np.abs(difftime)>7.0)[0]
+            vdFracUse = np.copy(vd)
+            timeFracUse = np.copy(time)
+            for jj in jumpidx:
+                jumptimebeg = gdTime[jj]
+                jumptimeend = gdTime[jj+1]
+                itmp = np.where((timeFracUse >=jumptimebeg) & (timeFracUse<=jumptimeend))[0]
+                ibeg = np.min(itmp)
+                iend = np.max(itmp)
+                vdFracUse = np.delete(vdFracUse, np.arange(ibeg,iend))
+                timeFracUse = np.delete(timeFracUse, np.arange(ibeg,iend))
+            # Also need to remove from last valid time
+            tmpx = np.arange(len(vdFracUse))
+            maxGdidx = np.max(tmpx[vdFracUse])
+            itmp = np.where(timeFracUse>=timeFracUse[maxGdidx])[0]
+            vdFracUse = vdFracUse[0:itmp[0]]
+            if len(vdFracUse)>0:
+                vdfrac = float(len(np.where(vdFracUse)[0]))/len(vdFracUse)
+            else:
+                vdfrac = 0.0
+        else:
+            vdfrac = 0.0
+        if len(np.where(vd)[0]) > 200 and period > 0.3 and duration/24.0/period < 0.2 and vdfrac>validFrac:
+            print('Valid fraction: {:f}'.format(vdfrac))
+            # Look for large differences due to harmonic filter being applied.
+            # ***NOTE harmonic filter is not being used for TESS***
+            #tmpcad = np.arange(len(vd))
+            #idx = np.where(vd)[0]
+            #tmpcad = tmpcad[idx]
+            #tmpflux = useFlux[idx]
+            #linfit = st.linregress(tmpcad, tmpflux)
+            #tmp_linflat = tmpflux / (linfit[0]*tmpcad + linfit[1])
+            #tmpflux = useFlux2[idx]
+            #linfit = st.linregress(tmpcad, tmpflux)
+            #tmp_linflat2 = tmpflux / (linfit[0]*tmpcad + linfit[1])
+            #tmpflux = useFlux3[idx]
+            #linfit = st.linregress(tmpcad, tmpflux)
+            #tmp_linflat3 = tmpflux / (linfit[0]*tmpcad + linfit[1])
+            
+            #plt.plot(tmpcad, tmp_linflat, '.')
+            #plt.show()
+            #plt.plot(tmpcad, tmp_linflat2, '.')
+            #plt.show()
+            #plt.plot(tmpcad, tmp_linflat3, '.')
+            #plt.show()
+            #tmpdiff = tmp_linflat - tmp_linflat2
+            #print(robust.mad(tmpdiff))
+
+            #plt.plot(tmpcad, tmpdiff, '.')
+            #plt.show()
+            #tmpdiff = tmp_linflat - tmp_linflat3
+            #print(robust.mad(tmpdiff))
+            #plt.plot(tmpcad, tmpdiff, '.')
+            #plt.show()
+            #doDebug=False
+            final_smooth_flux, bad_edge_flag = flux_cond.detrend_with_smoothn_edgefix(\
+                                useFlux, vd, ootvd, int(np.ceil(cadPerHr*searchDurationHours)), fixEdge=True, \
+                                 medfiltScaleFac=10, gapThreshold=5, edgeExamWindow=8, \
+                                 edgeSig=6.0, edgeMinCad=50, debug=doDebug, secNum=secnum)
+            #doDebug=True
+            # fill gaps and extend to power of two
+            fillWindow = int(np.ceil(cadPerHr*searchDurationHours*firstFilterScaleFac*3))
+            final_smooth_flux_ext, vd_ext = flux_cond.fill_extend_fluxts(final_smooth_flux, \
+                                                        vd, fillWindow, doExtend=True, debug=False)
+            final_ref_sig_ext, vd_ext = flux_cond.fill_extend_fluxts(ref_sig, \
+                                                        vd, fillWindow, doExtend=True, debug=False)
+            #plt.cla()
+            #plt.plot(final_smooth_flux_ext, '.')
+            #plt.plot(final_ref_sig_ext, '.')
+            #if doDebug:
+            #    plt.show()
+            #else:
+            #    plt.pause(0.002)
+            waveletLen = WAVELET_LEN
+            searchLen = np.int32(np.round(cadPerHr * searchDurationHours))
+            varianceFilterFactor = VARIANCE_FILTER_FACTOR
+            varianceFilterWindow = searchLen * varianceFilterFactor
+            wavObj = kw.waveletObject(waveletLen, final_smooth_flux_ext, varianceFilterWindow)
+            # Grid of trial durations that includes searchLen.  They all
+            #  use the wavelet and whitening coefficients of searchLen
+            durGridLen = np.maximum(np.round(cadPerHr * searchDurationHours * \
+                                    DURATION_GRID_FACTORS), 1).astype(int)
+            durGridLen = np.unique(np.append(durGridLen, searchLen))
+            iSearch = np.where(durGridLen == searchLen)[0][0]
+            # The reference signal uses the whitening coefficients of the
+            #  flux time series so both go through in one stacked pass
+            durNormTS, durCorrTS = kw.compute_statistic_time_series_stack(wavObj, durGridLen, \
+                                None, np.vstack((final_smooth_flux_ext, final_ref_sig_ext)))
+            normTS = durNormTS[iSearch]
+            corrTS = durCorrTS[0,iSearch]
+            corrTS_ref = durCorrTS[1,iSearch]
+            normTS_ref = normTS
+            #plt.cla()
+            #plt.plot(corrTS/normTS, '.')
+            #plt.plot(corrTS_ref/normTS_ref, '.')
+            #if doDebug:
+            #    plt.show()
+            #else:
+            #    plt.pause(0.002)
+            #plt.cla()
+            #plt.plot(1.0e6/normTS, '.')
+            #if doDebug:
+            #    plt.show()
+            #else:
+            #    plt.pause(0.002)
+            useNormTS = normTS[vd_ext]
+            useCorrTS = corrTS[vd_ext]
+            useNormTS_ref = normTS_ref[vd_ext]
+            useCorrTS_ref = corrTS_ref[vd_ext]
+            usePhase = phaseData(time[vd], period, epoch)
+            phaseDur = duration / 24.0 / period
+            useEvents = assignEvents(time[vd], epoch, usePhase, period, phaseDur)
+            useTime = time[vd]
+            useCadNo = cadNo[vd]
+            #doDebug=False
+            newMes, newMes_r, ses2Mes, ses2Mes_r, newNTran, Chases_sumry, \
+            allSes, allChases, \
+                    newMnMes,newMnMes_r, \
+                    mnSes2mnMes, mnSes2mnMes_r, \
+                    allCorr, allNorm, allTime, allCadNo = get_ses_stats(useCorrTS, useNormTS,
+                                        useCorrTS_ref, useNormTS_ref, \
+                                        usePhase, phaseDur, useEvents, useTime, useCadNo, origMes, debug=doDebug)
+            durGridHours = durGridLen / float(cadPerHr)
+            mesDurGrid = mes_duration_grid(durCorrTS[0][:,vd_ext], durNormTS[:,vd_ext], \
+                                           usePhase, phaseDur)
+            #doDebug = True
+            if newNTran > 1:
+                validSes = 1
+            else:
+                validSes = 0
+            validAltDet = 1
+        else:
+            print('Too little data for analysis epic: {0:d} pn: {1:d}'.format(epicid, pn))
+            print('NDat: {0:d} P: {1:f} phaseCoverage: {2:f} validFraction {3:f}'.format(len(np.where(vd)[0]),period, duration/24.0/period,vdfrac))
+            validAltDet = 0
+            validSes = 0
+            newMes = 0.0
+            ses2Mes = 3.0
+            newNTran = 1
+            Chases_sumry = 0.0
+            allSes = np.array([0.0])
+            allChases = np.array([0.0])
+            allCorr = np.array([0.0])
+            allNorm = np.array([0.0])
+            allTime = np.array([0.0])
+            allCadNo = np.array([0], dtype=int)
+            final_smooth_flux = np.array([0.0])
+            bad_edge_flag = np.array([0.0])
+            vd_ext = np.array([0.0])
+            final_smooth_flux_ext = np.array([0.0])
+            normTS = np.array([0.0])
+            corrTS = np.array([0.0])
+            newMnMes = 0.0
+            mnSes2mnMes = 3.0
+            usePhase = np.array([0.0])
+            useEvents = np.array([0.0])
+            phaseDur = 0.0
+            newMes_r = 0.0
+            ses2Mes_r = 3.0
+            newMnMes_r = 0.0
+            mnSes2mnMes_r = 3.0
+            durGridHours = np.array([0.0])
+            mesDurGrid = np.array([0.0])
+            
+        #print(fileOutput)
+        f = h5py.File(fileOutput,'w')
+        tmp = f.create_dataset('altDetrend', data=final_smooth_flux, compression='gzip')
+        tmp = f.create_dataset('validData', data=vd, compression='gzip')
+        tmp = f.create_dataset('time', data=time, compression='gzip')
+        tmp = f.create_dataset('cadNo', data=cadNo, compression='gzip')
+        tmp = f.create_dataset('phi', data=usePhase, compression='gzip')
+        tmp = f.create_dataset('events', data=useEvents, compression='gzip')
+        tmp = f.create_dataset('initFlux', data=useFlux, compression='gzip')
+        tmp = f.create_dataset('bad_edge_flag', data=bad_edge_flag, compression='gzip')
+        tmp = f.create_dataset('altDetrend_ext', data=final_smooth_flux_ext, compression='gzip')
+        tmp = f.create_dataset('valid_data_flag_ext', data=vd_ext, compression='gzip')
+        tmp = f.create_dataset('normTS', data=normTS, compression='gzip')
+        tmp = f.create_dataset('corrTS', data=corrTS, compression='gzip')
+        tmp = f.create_dataset('validSes', data=np.array([validSes], dtype=int))
+        tmp = f.create_dataset('newMes', data=np.array([newMes], dtype=float))
+        tmp = f.create_dataset('validAltDet', data=np.array([validAltDet], dtype=int))
+        tmp = f.create_dataset('ses2Mes', data=np.array([ses2Mes], dtype=float))
+        tmp = f.create_dataset('newNTran', data=np.array([newNTran], dtype=int))
+        tmp = f.create_dataset('chasesSumry', data=np.array([Chases_sumry], dtype=float))
+        tmp = f.create_dataset('allSes', data=allSes, compression='gzip')
+        tmp = f.create_dataset('allChases', data=allChases, compression='gzip')
+        tmp = f.create_dataset('allCorr', data=allCorr, compression='gzip')
+        tmp = f.create_dataset('allNorm', data=allNorm, compression='gzip')
+        tmp = f.create_dataset('allTime', data=allTime, compression='gzip')
+        tmp = f.create_dataset('allCadNo', data=allCadNo, compression='gzip')
+        
+        tmp = f.create_dataset('newMnMes', data=np.array([newMnMes], dtype=float))
+        tmp = f.create_dataset('mnSes2mnMes', data=np.array([mnSes2mnMes], dtype=float))
+        tmp = f.create_dataset('phaseDur', data=np.array([phaseDur], dtype=float))
+        tmp = f.create_dataset('newMes_r', data=np.array([newMes_r], dtype=float))
+        tmp = f.create_dataset('ses2Mes_r', data=np.array([ses2Mes_r], dtype=float))
+        tmp = f.create_dataset('newMnMes_r', data=np.array([newMnMes_r], dtype=float))
+        tmp = f.create_dataset('mnSes2mnMes_r', data=np.array([mnSes2mnMes_r], dtype=float))
+        tmp = f.create_dataset('durGridHours', data=durGridHours)
+        tmp = f.create_dataset('mesDurGrid', data=mesDurGrid)
+        # Written last so an output cut short is not taken as current
+        f.attrs['inputHash'] = inputHash
+
+        f.close()
+    else:
+        print('Inputs unchanged skipping {0:d} {1:d}'.format(epicid, pn))
+        
+    return fileOutput
+
 if __name__ == "__main__":
     # Parse the command line arguments for multiprocessing
-    # With Gnu parallel with 13 cores
-    # seq 0 12 | parallel --results ses_mes_results python ses_mes_stats.py -w {} -n 13
+    # The TCEs are done in a pool of nWrk processes
+    # python ses_mes_stats.py -n 13
     parser = argparse.ArgumentParser()
-    parser.add_argument("-w", type=int,\
-                        default = 0, \
-                        help="Worker ID Number 0 through nWrk-1")
     parser.add_argument("-n", type=int,\
                         default = 1, \
                         help="Number of Workers")
+    parser.add_argument("-t", type=str,\
+                        default = None, \
+                        help="File of TIC and PN to limit the run to")
     
 
     args = parser.parse_args() 
     # These are for parallel procoessing
-    wID = int(args.w)
     nWrk = int(args.n)
 
     # get run parameters
@@ -307,7 +729,9 @@ if __name__ == "__main__":
     # are missing. Those are treated as missing sectors
     # and are removed from the validFrac calculation
     validFrac = 0.56
-    overWrite = True
+    # Outputs are redone when their input hash differs from the current
+    #  inputs.  overWrite = True redoes every TCE
+    overWrite = False
 
     # Skyline data excises loud cadecnes
     skyline_file = 'skyline_data_' + run_name + '.txt'
@@ -326,333 +750,33 @@ if __name__ == "__main__":
                             # firstFilterScaleFac*searchDurationHours medfilt window
 
     # Load the tce data h5
-    tcedata = tce_seed()
-    all_tces = tcedata.fill_objlist_from_hd5f(tceSeedInFile)
+    tcecat = TceCatalog(tceSeedInFile)
 
     # These next few lines can be used to examine a single target    
-#    all_epics = np.array([x.epicId for x in all_tces], dtype=np.int64)
-#    all_pns = np.array([x.planetNum for x in all_tces], dtype=int)
+#    all_epics = np.asarray(tcecat['epicId'], dtype=np.int64)
+#    all_pns = np.asarray(tcecat['planetNum'], dtype=int)
 #    ia = np.where((all_epics == 278139637) & (all_pns == 3))[0]
 #    doDebug = True
     # Loop over tces and perform various ses, mes, chases tests
-    cnt = 0
     doDebug = False
-    # This for loop can be used for debugging
-    #for td in all_tces[ia[0]:ia[0]+1]:
-    # Normal for loop
-    for td in all_tces:
-        epicid = td.epicId
-        print(cnt, epicid)
-        cnt = cnt+1
-        if np.mod(cnt, nWrk) == wID:
-            if np.mod(cnt,10) == 0:
-                print(cnt)
-    
-            pn = td.planetNum
-            period = 0.0
-            epoch = 0.0
-            duration = 0.0
-            depth = 0.0
-            if td.at_valid == 1:
-                period = td.at_period
-                epoch = td.at_epochbtjd
-                duration = td.at_dur
-                depth = td.at_depth
-            elif td.trp_valid == 1:
-                period = td.tce_period
-                epoch = td.trp_epochbtjd
-                duration = td.trp_dur
-                depth = td.trp_depth
-            else:
-                period = td.tce_period
-                epoch = td.tce_epoch
-                duration = td.pulsedur
-                depth = 1000.0
-            fileOutput = os.path.join(make_data_dirs(outputDir, SECTOR, epicid), 'tess_sesmes_{0:016d}_{1:02d}.h5d'.format(epicid,pn))
-            fileExists = os.path.isfile(fileOutput)
-            if (not fileExists) or overWrite:
-                print('pulse: {:f} fitdur: {:f}'.format(td.pulsedur, duration))
-                searchDurationHours = np.max([td.pulsedur, duration])
-                # Cap duration at 15 hours
-                searchDurationHours = np.min([searchDurationHours, 15.0])
-        
-                origMes = td.mes
-                print('Orig ',origMes, epicid, pn)
-                localDir = make_data_dirs(dvDataDir,SECTOR,epicid)
-                fileInput = os.path.join(localDir, 'tess_dvts_{0:016d}_{1:02d}.h5d'.format(epicid,pn))
-                f = h5py.File(fileInput,'r')
-                # Decide which flux time series to use pdc or lc_init
-                # ***NOTE harmonic filter is not being used so pdf flux should be used
-                #useFlux = np.array(f['lc_init'])
-                #  ***If flux is norm subtracted at 1.0 to it
-                #useFlux = useFlux + 1.0
-                useFlux = np.array(f['pdc_flux'])
-                #useFlux3 = np.array(f['lc_white'])
-                #useFlux3 = useFlux3 + 1.0
-                vd = np.array(f['valid_data_flag'])
-                time = np.array(f['timetbjd'])
-                cadNo = np.array(f['cadenceNo'])
-                for jj, curTime in enumerate(time):
-                    diff = np.abs(curTime - badTimes)
-                    if np.min(diff) < 5.0/60.0/24.0:
-                        vd[jj] = False
-                if doDebug:
-                    tmpx = np.arange(len(useFlux))
-                    plt.plot(useFlux, '.')
-                    plt.plot(tmpx[vd], useFlux[vd], '.')
-                    
-                    plt.show()
-                    
-                # assign sector numbers to data
-                secnum = np.ones_like(cadNo, dtype=int)
-                idxSec = np.where(td.all_sectors>=0)[0]
-                td.all_sectors = td.all_sectors[idxSec]
-                td.all_cadstart = td.all_cadstart[idxSec]
-                td.all_cadend = td.all_cadend[idxSec]
-                nSec = len(td.all_sectors)
-                if len(td.all_sectors)>1:
-                    for kk in range(nSec):
-                        idx = np.where((cadNo >= td.all_cadstart[kk]) & (cadNo <= td.all_cadend[kk])  )[0]
-                        secnum[idx] = td.all_sectors[kk]
-                
-                # Mark data in transit as deweighted during detrending
-                ootvd = np.full_like(vd, True)
-                phi = phaseData(time, period, epoch)
-                idx = np.where(np.abs(phi) < duration/2.0/24.0/period)[0]
-                ootvd[idx] = False
-                
-                # Make a reference transit signal shape
-                ztmp = phi * period
-                ref_sig = trapezoid(ztmp, depth/1.0e6, duration/24.0, duration/24.0/1.1)
-#                if doDebug:
-#                    plt.plot(ref_sig, '.')
-#                    plt.show()
-                # Determine empirical noise from flux time series
-                vdootIdx = np.where(vd & ootvd)[0]
-                flux_level = np.median(useFlux[vdootIdx])
-                flux_diff = np.diff(useFlux[vdootIdx]) / flux_level
-                emp_noise = robust.mad(flux_diff)/np.sqrt(2.0)
-                print('Empirical Noise [ppm]: {0:.1f}'.format(emp_noise*1.0e6))
-#                if doDebug:
-#                    plt.plot(flux_diff, '.')
-#                    plt.show()
-                # Add noise to reference transit signal
-                ref_noise = np.random.randn(len(useFlux))*emp_noise + 1.0
-                ref_sig = ref_sig*ref_noise
-#                if doDebug:
-#                    plt.plot(ref_sig, '.')
-#                    plt.show()
-                
-                # For ETE6 only there was unexpectedly extra data after 
-                #  indice 1348. Mark those aftr 1348 as invalid now
-                #vd[1349:] = False
-                
-                # For Sector 1 data there was a crappy part 
-                #vd[2465:2750] = False
-                # detrend data fixe edges
-                # Verify that there is enough data to do analysis
-                # Also do a period cut
-                
-                # Need to update the valid data fraction for multi-sector
-                # For single sector this would catch data that was missing
-                # because previous planets detected removed too much data
-                #    avoid the 'swiss' cheese light curves
-                #  but for multi-sector the light curve can have long gaps
-                #  of missing sectors this is not the intent of the check
-                # Need to look for long gaps and remove these from the calculation
-                # Protect against no valid data
-                idxGd = np.where(vd)[0]
-                if not len(idxGd) == 0:
-                    # Time differences
-                    gdTime = time[idxGd]
-                    difftime = np.diff(gdTime)
-                    jumpidx = np.where(np.abs(difftime)>7.0)[0]
-                    vdFracUse = np.copy(vd)
-                    timeFracUse = np.copy(time)
-                    for jj in jumpidx:
-                        jumptimebeg = gdTime[jj]
-                        jumptimeend = gdTime[jj+1]
-                        itmp = np.where((timeFracUse >=jumptimebeg) & (timeFracUse<=jumptimeend))[0]
-                        ibeg = np.min(itmp)
-                        iend = np.max(itmp)
-                        vdFracUse = np.delete(vdFracUse, np.arange(ibeg,iend))
-                        timeFracUse = np.delete(timeFracUse, np.arange(ibeg,iend))
-                    # Also need to remove from last valid time
-                    tmpx = np.arange(len(vdFracUse))
-                    maxGdidx = np.max(tmpx[vdFracUse])
-                    itmp = np.where(timeFracUse>=timeFracUse[maxGdidx])[0]
-                    vdFracUse = vdFracUse[0:itmp[0]]
-                    if len(vdFracUse)>0:
-                        vdfrac = float(len(np.where(vdFracUse)[0]))/len(vdFracUse)
-                    else:
-                        vdfrac = 0.0
-                else:
-                    vdfrac = 0.0
-                if len(np.where(vd)[0]) > 200 and period > 0.3 and duration/24.0/period < 0.2 and vdfrac>validFrac:
-                    print('Valid fraction: {:f}'.format(vdfrac))
-                    # Look for large differences due to harmonic filter being applied.
-                    # ***NOTE harmonic filter is not being used for TESS***
-                    #tmpcad = np.arange(len(vd))
-                    #idx = np.where(vd)[0]
-                    #tmpcad = tmpcad[idx]
-                    #tmpflux = useFlux[idx]
-                    #linfit = st.linregress(tmpcad, tmpflux)
-                    #tmp_linflat = tmpflux / (linfit[0]*tmpcad + linfit[1])
-                    #tmpflux = useFlux2[idx]
-                    #linfit = st.linregress(tmpcad, tmpflux)
-                    #tmp_linflat2 = tmpflux / (linfit[0]*tmpcad + linfit[1])
-                    #tmpflux = useFlux3[idx]
-                    #linfit = st.linregress(tmpcad, tmpflux)
-                    #tmp_linflat3 = tmpflux / (linfit[0]*tmpcad + linfit[1])
-                    
-                    #plt.plot(tmpcad, tmp_linflat, '.')
-                    #plt.show()
-                    #plt.plot(tmpcad, tmp_linflat2, '.')
-                    #plt.show()
-                    #plt.plot(tmpcad, tmp_linflat3, '.')
-                    #plt.show()
-                    #tmpdiff = tmp_linflat - tmp_linflat2
-                    #print(robust.mad(tmpdiff))
-        
-                    #plt.plot(tmpcad, tmpdiff, '.')
-                    #plt.show()
-                    #tmpdiff = tmp_linflat - tmp_linflat3
-                    #print(robust.mad(tmpdiff))
-                    #plt.plot(tmpcad, tmpdiff, '.')
-                    #plt.show()
-                    #doDebug=False
-                    final_smooth_flux, bad_edge_flag = flux_cond.detrend_with_smoothn_edgefix(\
-                                        useFlux, vd, ootvd, int(np.ceil(cadPerHr*searchDurationHours)), fixEdge=True, \
-                                         medfiltScaleFac=10, gapThreshold=5, edgeExamWindow=8, \
-                                         edgeSig=6.0, edgeMinCad=50, debug=doDebug, secNum=secnum)
-                    #doDebug=True
-                    # fill gaps and extend to power of two
-                    fillWindow = int(np.ceil(cadPerHr*searchDurationHours*firstFilterScaleFac*3))
-                    final_smooth_flux_ext, vd_ext = flux_cond.fill_extend_fluxts(final_smooth_flux, \
-                                                                vd, fillWindow, doExtend=True, debug=False)
-                    final_ref_sig_ext, vd_ext = flux_cond.fill_extend_fluxts(ref_sig, \
-                                                                vd, fillWindow, doExtend=True, debug=False)
-                    #plt.cla()
-                    #plt.plot(final_smooth_flux_ext, '.')
-                    #plt.plot(final_ref_sig_ext, '.')
-                    #if doDebug:
-                    #    plt.show()
-                    #else:
-                    #    plt.pause(0.002)
-                    waveletLen = 12
-                    searchLen = np.int32(np.round(cadPerHr * searchDurationHours))
-                    varianceFilterFactor = 15
-                    varianceFilterWindow = searchLen * varianceFilterFactor
-                    wavObj = kw.waveletObject(waveletLen, final_smooth_flux_ext, varianceFilterWindow)
-                    trial_pulse = kw.set_trial_transit_pulse(searchLen)            
-                    normTS, corrTS = kw.compute_statistic_time_series(wavObj, searchLen, trial_pulse)
-
-                    wavObj_ref = kw.waveletObject(waveletLen, final_ref_sig_ext, varianceFilterWindow)
-                    trial_pulse = kw.set_trial_transit_pulse(searchLen)
-                    # Replace the whitening coefficients from the original time series
-                    wavObj_ref.whiteningCoeffs = wavObj.whiteningCoeffs
-                    normTS_ref, corrTS_ref = kw.compute_statistic_time_series(wavObj_ref, searchLen, trial_pulse)
-                    #plt.cla()
-                    #plt.plot(corrTS/normTS, '.')
-                    #plt.plot(corrTS_ref/normTS_ref, '.')
-                    #if doDebug:
-                    #    plt.show()
-                    #else:
-                    #    plt.pause(0.002)
-                    #plt.cla()
-                    #plt.plot(1.0e6/normTS, '.')
-                    #if doDebug:
-                    #    plt.show()
-                    #else:
-                    #    plt.pause(0.002)
-                    useNormTS = normTS[vd_ext]
-                    useCorrTS = corrTS[vd_ext]
-                    useNormTS_ref = normTS_ref[vd_ext]
-                    useCorrTS_ref = corrTS_ref[vd_ext]
-                    usePhase = phaseData(time[vd], period, epoch)
-                    phaseDur = duration / 24.0 / period
-                    useEvents = assignEvents(time[vd], epoch, usePhase, period, phaseDur)
-                    useTime = time[vd]
-                    useCadNo = cadNo[vd]
-                    #doDebug=False
-                    newMes, newMes_r, ses2Mes, ses2Mes_r, newNTran, Chases_sumry, \
-                    allSes, allChases, \
-                            newMnMes,newMnMes_r, \
-                            mnSes2mnMes, mnSes2mnMes_r, \
-                            allCorr, allNorm, allTime, allCadNo = get_ses_stats(useCorrTS, useNormTS,
-                                                useCorrTS_ref, useNormTS_ref, \
-                                                usePhase, phaseDur, useEvents, useTime, useCadNo, origMes, debug=doDebug)
-                    #doDebug = True
-                    if newNTran > 1:
-                        validSes = 1
-                    else:
-                        validSes = 0
-                    validAltDet = 1
-                else:
-                    print('Too little data for analysis epic: {0:d} pn: {1:d}'.format(epicid, pn))
-                    print('NDat: {0:d} P: {1:f} phaseCoverage: {2:f} validFraction {3:f}'.format(len(np.where(vd)[0]),period, duration/24.0/period,vdfrac))
-                    validAltDet = 0
-                    validSes = 0
-                    newMes = 0.0
-                    ses2Mes = 3.0
-                    newNTran = 1
-                    Chases_sumry = 0.0
-                    allSes = np.array([0.0])
-                    allChases = np.array([0.0])
-                    allCorr = np.array([0.0])
-                    allNorm = np.array([0.0])
-                    allTime = np.array([0.0])
-                    allCadNo = np.array([0], dtype=int)
-                    final_smooth_flux = np.array([0.0])
-                    bad_edge_flag = np.array([0.0])
-                    vd_ext = np.array([0.0])
-                    final_smooth_flux_ext = np.array([0.0])
-                    normTS = np.array([0.0])
-                    corrTS = np.array([0.0])
-                    newMnMes = 0.0
-                    mnSes2mnMes = 3.0
-                    usePhase = np.array([0.0])
-                    useEvents = np.array([0.0])
-                    phaseDur = 0.0
-                    newMes_r = 0.0
-                    ses2Mes_r = 3.0
-                    newMnMes_r = 0.0
-                    mnSes2mnMes_r = 3.0
-                    
-                #print(fileOutput)
-                f = h5py.File(fileOutput,'w')
-                tmp = f.create_dataset('altDetrend', data=final_smooth_flux, compression='gzip')
-                tmp = f.create_dataset('validData', data=vd, compression='gzip')
-                tmp = f.create_dataset('time', data=time, compression='gzip')
-                tmp = f.create_dataset('cadNo', data=cadNo, compression='gzip')
-                tmp = f.create_dataset('phi', data=usePhase, compression='gzip')
-                tmp = f.create_dataset('events', data=useEvents, compression='gzip')
-                tmp = f.create_dataset('initFlux', data=useFlux, compression='gzip')
-                tmp = f.create_dataset('bad_edge_flag', data=bad_edge_flag, compression='gzip')
-                tmp = f.create_dataset('altDetrend_ext', data=final_smooth_flux_ext, compression='gzip')
-                tmp = f.create_dataset('valid_data_flag_ext', data=vd_ext, compression='gzip')
-                tmp = f.create_dataset('normTS', data=normTS, compression='gzip')
-                tmp = f.create_dataset('corrTS', data=corrTS, compression='gzip')
-                tmp = f.create_dataset('validSes', data=np.array([validSes], dtype=int))
-                tmp = f.create_dataset('newMes', data=np.array([newMes], dtype=float))
-                tmp = f.create_dataset('validAltDet', data=np.array([validAltDet], dtype=int))
-                tmp = f.create_dataset('ses2Mes', data=np.array([ses2Mes], dtype=float))
-                tmp = f.create_dataset('newNTran', data=np.array([newNTran], dtype=int))
-                tmp = f.create_dataset('chasesSumry', data=np.array([Chases_sumry], dtype=float))
-                tmp = f.create_dataset('allSes', data=allSes, compression='gzip')
-                tmp = f.create_dataset('allChases', data=allChases, compression='gzip')
-                tmp = f.create_dataset('allCorr', data=allCorr, compression='gzip')
-                tmp = f.create_dataset('allNorm', data=allNorm, compression='gzip')
-                tmp = f.create_dataset('allTime', data=allTime, compression='gzip')
-                tmp = f.create_dataset('allCadNo', data=allCadNo, compression='gzip')
-                
-                tmp = f.create_dataset('newMnMes', data=np.array([newMnMes], dtype=float))
-                tmp = f.create_dataset('mnSes2mnMes', data=np.array([mnSes2mnMes], dtype=float))
-                tmp = f.create_dataset('phaseDur', data=np.array([phaseDur], dtype=float))
-                tmp = f.create_dataset('newMes_r', data=np.array([newMes_r], dtype=float))
-                tmp = f.create_dataset('ses2Mes_r', data=np.array([ses2Mes_r], dtype=float))
-                tmp = f.create_dataset('newMnMes_r', data=np.array([newMnMes_r], dtype=float))
-                tmp = f.create_dataset('mnSes2mnMes_r', data=np.array([mnSes2mnMes_r], dtype=float))
-
-                f.close()
-                
+    # This can be used for debugging
+    #tcecat = tcecat[ia[0]:ia[0]+1]
+    # Only redo the listed TCEs
+    if args.t is not None:
+        runTic, runPn = read_tce_list(args.t)
+        tcecat = tcecat[join_index(tcecat['epicId'], tcecat['planetNum'], \
+                                   runTic, runPn) >= 0]
+    # Code the ses/mes results depend on
+    codeHash = code_hash([__file__, kw.__file__, flux_cond.__file__, \
+                          flux_cond.smth.__file__, cjb.__file__])
+    workArgs = [(td, dvDataDir, outputDir, SECTOR, cadPerHr, badTimes, \
+                 validFrac, firstFilterScaleFac, codeHash, overWrite, doDebug) \
+                 for td in tcecat]
+    # Cost is the number of cadences over the observed sectors
+    idxSec = tcecat['all_sectors'] >= 0
+    allncad = np.sum(np.where(idxSec, tcecat['all_cadend'] - tcecat['all_cadstart'] + 1, 0), axis=1)
+    taskNames = ['TIC {0:d} PN {1:d}'.format(x, y) for x, y in \
+                 zip(tcecat['epicId'], tcecat['planetNum'])]
+    results, failed = run_tasks(ses_mes_worker, workArgs, allncad, nWorkers=nWrk, \
+                                taskNames=taskNames)
+    exit_if_failed(failed)
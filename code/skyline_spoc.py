@@ -14,7 +14,7 @@ import numpy as np
 import cjb_utils as cjb
 import scipy.special as spec
 import toidb_federate as fed
-from gather_tce_fromdvxml import tce_seed
+from gather_tce_fromdvxml import TceCatalog
 import matplotlib.pyplot as plt
 from statsmodels import robust
 import os
@@ -35,6 +35,20 @@ def genericFed(per, epc, tryper, tryepc, trydur, trypn, trytic, tStart, tEnd):
     
     return bstpn, bsttic, bstMatch, bstStat, bstPeriodRatio, bstPeriodRatioFlag, bstFederateFlag
 
+def skyline_histogram(ts, periods, epochs, durations):
+    """ Number of ephemerides in transit at every cadence of ts.  The
+        transit windows of all the ephemerides are added into a
+        difference array and summed once, rather than adding up a full
+        length ephemeris vector for each one
+        OUTPUT:
+          skylineData - int64 array length of ts.ts
+    """
+    which, lo, hi = ts.makeEphemWindows(periods, epochs, durations)
+    diff = np.zeros((ts.nt+1,), dtype=np.int64)
+    np.add.at(diff, lo, 1)
+    np.add.at(diff, hi, -1)
+    return np.cumsum(diff[0:-1])
+
 
 if __name__ == '__main__':
 
@@ -54,22 +68,21 @@ if __name__ == '__main__':
     
     # Load the tce data h5
     tceSeedInFile = run_name + '_tce.h5'
-    tcedata = tce_seed()
-    all_tces = tcedata.fill_objlist_from_hd5f(tceSeedInFile)
+    tcecat = TceCatalog(tceSeedInFile)
     
-    alltic = np.array([x.epicId for x in all_tces], dtype=np.int64)
-    allpn = np.array([x.planetNum for x in all_tces], dtype=int)
-    allatvalid = np.array([x.at_valid for x in all_tces], dtype=int)
-    allrp = np.array([x.at_rp for x in all_tces])
-    allper = np.array([x.at_period for x in all_tces])
-    alldur = np.array([x.at_dur for x in all_tces])
-    allepc = np.array([x.at_epochbtjd for x in all_tces])
-    alltrpvalid = np.array([x.trp_valid for x in all_tces], dtype=int)
-    alltrpdur = np.array([x.trp_dur for x in all_tces])
-    alltrpepc = np.array([x.trp_epochbtjd for x in all_tces])
-    alltcedur = np.array([x.pulsedur for x in all_tces])
-    alltceepc = np.array([x.tce_epoch for x in all_tces])
-    alltceper = np.array([x.tce_period for x in all_tces])
+    alltic = np.asarray(tcecat['epicId'], dtype=np.int64)
+    allpn = np.asarray(tcecat['planetNum'], dtype=int)
+    allatvalid = np.asarray(tcecat['at_valid'], dtype=int)
+    allrp = tcecat['at_rp']
+    allper = tcecat['at_period']
+    alldur = tcecat['at_dur']
+    allepc = tcecat['at_epochbtjd']
+    alltrpvalid = np.asarray(tcecat['trp_valid'], dtype=int)
+    alltrpdur = tcecat['trp_dur']
+    alltrpepc = tcecat['trp_epochbtjd']
+    alltcedur = tcecat['pulsedur']
+    alltceepc = tcecat['tce_epoch']
+    alltceper = tcecat['tce_period']
     # Go through each tce and use valid fits from dv, trpzd, tce in that order for matching
     useper = np.zeros_like(allper)
     useepc = np.zeros_like(allper)
@@ -102,17 +115,10 @@ if __name__ == '__main__':
     usedur[idx] = 5.0
 
     ts = fed.timeseries(uowStart, uowEnd)
-    skylineData = np.zeros_like(ts.ephemCentral, dtype=np.int64)
     
     print('alpha')
 
-    for i in range(len(alltic)):
-        curTic = alltic[i]
-        curper = useper[i]
-        curepc = useepc[i]
-        curdur = usedur[i]
-        ts = ts.makeEphemVector(curper,curepc,curdur)
-        skylineData = skylineData + np.copy(ts.ephemFull)
+    skylineData = skyline_histogram(ts, useper, useepc, usedur)
 
     medSkyline = np.median(skylineData)
     madSkyline = robust.mad(skylineData)
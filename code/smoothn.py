@@ -188,6 +188,102 @@ def robustWeights(r, iFin, h):
     w = np.where(np.logical_not(np.isfinite(w)), 0.0, w)
     return w
     
+def smoothn_batch(yin, w=None, s=1.0, robust=True, tolZ=1.0e-5, maxIter=100):
+    """Penalized least-squares smoothing of many data vectors at once
+       with a common fixed smoothing parameter.  Each row of yin is
+       smoothed exactly as smoothn(yin[i], w[i], s) would, but the DCTs
+       and iterations are done on the whole 2-D array.  There is no GCV
+       search for s since the rows share it.
+       INPUT:
+       yin - [nVec, nData] data vectors one row per vector
+       w - [0-1] data weights same shape as yin or 1-D of length nData
+       s - smoothing parameter
+       robust, tolZ, maxIter - see smoothn
+       OUTPUT:
+       z - [nVec, nData] smoothed model for each data vector
+       w - final weighting array
+       s - smoothing parameter
+       exitflag - [nVec] flag if solution converged before maxIter
+    """
+    y = np.array(yin, dtype=np.double, copy=True, ndmin=2)
+    nVec, noe = y.shape
+    if noe < 2: # Too few elements return and do nothging
+        return y, w, s, np.ones((nVec,), dtype=bool)
+    isWeighted = np.full((nVec,), False)
+    if w is None:
+        w = np.ones_like(y)
+    else:
+        w = np.broadcast_to(np.asarray(w, dtype=np.double), y.shape)
+        isWeighted[:] = True
+    isFinite = np.isfinite(y)
+    isWeighted = np.logical_or(isWeighted, np.logical_not(isFinite.all(axis=1)))
+    w = np.where(isFinite, w, 0.0)
+    w = w / w.max(axis=1, keepdims=True)
+
+    # Creation of the Lambda tensor
+    lam = -2.0 + 2.0 * np.cos((np.linspace(1.0,noe,noe)-1.0)*np.pi/noe)
+    gamma = 1.0 / (1.0 + s * lam**2)
+
+    # Initialize a rough guess at the smooth function if weighting is involved
+    #  and do linear interpolation for nans in data vector
+    z = np.zeros_like(y)
+    fullx = np.arange(noe)
+    for i in np.where(np.logical_not(isFinite.all(axis=1)))[0]:
+        gdIdx = np.where(isFinite[i])[0]
+        y[i] = np.interp(fullx, fullx[gdIdx], y[i,gdIdx])
+    if np.any(isWeighted):
+        zInit = dct(y, type=2, norm='ortho', axis=1)
+        zeroIdx = int(np.ceil(noe/10))
+        zInit[:,zeroIdx:] = 0.0
+        zInit = dct(zInit, type=3, norm='ortho', axis=1)
+        z[isWeighted] = zInit[isWeighted]
+    wTot = w
+    # Relaxation Factor
+    RF = np.where(isWeighted, 1.75, 1.0)[:,np.newaxis]
+    exitFlag = np.ones((nVec,), dtype=bool)
+    nRobustSteps = 3 if robust else 1
+    for robustStep in range(nRobustSteps):
+        # Rows drop out of the iteration once they converge
+        active = np.full((nVec,), True)
+        nit = 0
+        while np.any(active) and nit < maxIter:
+            nit = nit + 1
+            za = z[active]
+            dcty = dct(wTot[active] * (y[active] - za) + za, type=2, norm='ortho', axis=1)
+            znew = RF[active] * dct(gamma * dcty, type=3, norm='ortho', axis=1) + \
+                        (1.0 - RF[active]) * za
+            tol = LA.norm(za - znew, axis=1) / LA.norm(znew, axis=1)
+            # if no weighted/missing data tol=0.0 (no iter)
+            tol = np.where(isWeighted[active], tol, 0.0)
+            z[active] = znew
+            idxAct = np.where(active)[0]
+            active[idxAct[tol <= tolZ]] = False
+        exitFlag = np.logical_and(exitFlag, np.logical_not(active))
+        if robust: # robust smoothing iteratively re-weight outliers
+            # average leverage
+            h = np.sqrt(1.0 + 16.0 * s)
+            h = np.sqrt(1.0 + h) / np.sqrt(2.0) / h
+            # take robust weights into account
+            wTot = w * robustWeightsBatch(y-z, isFinite, h)
+            isWeighted[:] = True
+    return z, w, s, exitFlag
+
+def robustWeightsBatch(r, iFin, h):
+    """ robustWeights for each row of a 2-D residual array """
+    rFin = np.where(iFin, r, np.nan)
+    mad = np.nanmedian(np.abs(rFin - np.nanmedian(rFin, axis=1, keepdims=True)), \
+                       axis=1, keepdims=True) #median abs deviation
+    with np.errstate(divide='ignore', invalid='ignore'):
+        u = np.abs(r / (1.4826 * mad) / np.sqrt(1.-h)) # studentized residuals
+    c = 4.685
+    u = u / c
+    u2 = u * u
+    w = (1.0 - u2)**2
+    w = np.where(u > 1.0, 0.0, w)
+    w = np.where(np.logical_not(iFin), 0.0, w)
+    w = np.where(np.logical_not(np.isfinite(w)), 0.0, w)
+    return w
+    
 # Run the test of the smoothn
 if __name__ == "__main__":
     x = np.linspace(0,100,2**8)
@@ -209,4 +305,17 @@ if __name__ == "__main__":
     plt.show()
     
    
-       
\ No newline at end of file
+       
+    # Check the batch smoother matches smoothn row by row
+    nVec = 20
+    yb = np.outer(np.ones(nVec), y) + np.random.randn(nVec, len(x))/10.0
+    yb[:, 100:110] = np.nan
+    yb[3, 40:45] = np.nan
+    wb = np.ones_like(yb)
+    wb[:, 150:160] = 0.0
+    zb = smoothn_batch(yb, wb, 10.0)
+    maxDiff = 0.0
+    for i in range(nVec):
+        zs = smoothn(yb[i], wb[i], 10.0)
+        maxDiff = np.max([maxDiff, np.max(np.abs(zs[0]-zb[0][i]))])
+    print('smoothn_batch max abs difference to smoothn: {0:g}'.format(maxDiff))
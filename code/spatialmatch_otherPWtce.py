@@ -13,7 +13,6 @@ import pickle
 import numpy as np
 import toidb_federate as fed
 from gather_tce_fromdvxml import tce_seed
-import scipy.special as spec
 import csv
 import sys
 import time
@@ -96,18 +95,6 @@ def query_ticcone(curRa, curDec, searchRad):
 
     return ticList
 
-def coughlin_sigmap(p1,p2):
-    up1 = p1
-    up2 = p2
-    if up1 > up2:
-        tmp = up2
-        up2 = up1
-        up1 = tmp
-    delP = (up1 - up2)/up1
-    delPp = abs(delP - round(delP))
-    return np.sqrt(2.0)*spec.erfcinv(delPp)
-
-
 if __name__ == '__main__':
     fout = open('spatialmatch_otherP_sector48_20220601.txt', 'w')
     
@@ -244,9 +231,7 @@ if __name__ == '__main__':
             trypn = allpn[idx]
             trydur = usedur[idx]
             trytic = alltic[idx]
-            sigMatch = np.zeros((len(tryper),), dtype=np.float)
-            for j in range(len(tryper)):
-                sigMatch[j] = coughlin_sigmap(curper, tryper[j])
+            sigMatch = fed.coughlin_sigmap(curper, tryper)
             idxSigia = np.argsort(sigMatch)[-1]
             bstpn = trypn[idxSigia]
             bsttic = trytic[idxSigia]
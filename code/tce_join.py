@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Join tables of TCE results on (TIC, planet number).
+The stages merge the TCE seed table with the results of other stages
+(flux triage, modshift, sweet, federation, ...).  Rather than searching
+the other table for every TCE, the (TIC, planet number) pair is packed
+into a single int64 key and matched with a sorted merge.
+"""
+
+import numpy as np
+
+# Planet numbers are multiplied into the key below this value
+PN_KEY_BASE = 1000
+
+def tce_key(tic, pn):
+    """ Pack TIC and planet number into a single int64 key
+        INPUT:
+          tic - TIC id scalar or array
+          pn - planet number scalar or array
+        OUTPUT:
+          key - int64 tic*PN_KEY_BASE + pn
+    """
+    return np.asarray(tic, dtype=np.int64) * PN_KEY_BASE + \
+            np.asarray(pn, dtype=np.int64)
+
+def join_index(tic, pn, othTic, othPn):
+    """ For every (tic, pn) find the row in the other table with the
+        same (othTic, othPn).  If the other table has repeated entries
+        the first row is used
+        INPUT:
+          tic, pn - arrays of TIC and planet number to look up
+          othTic, othPn - arrays of TIC and planet number of other table
+        OUTPUT:
+          idx - int array length of tic with row index into other table
+                -1 where (tic, pn) is not in the other table
+    """
+    key = np.atleast_1d(tce_key(tic, pn))
+    othKey = np.atleast_1d(tce_key(othTic, othPn))
+    if len(othKey) == 0:
+        return np.full(key.shape, -1, dtype=int)
+    # stable sort keeps the first of any repeated keys leftmost
+    srt = np.argsort(othKey, kind='mergesort')
+    srtKey = othKey[srt]
+    j = np.searchsorted(srtKey, key, side='left')
+    j = np.minimum(j, len(srtKey)-1)
+    idx = np.where(srtKey[j] == key, srt[j], -1)
+    return idx
+
+def join_values(tic, pn, othTic, othPn, othValues, fill=0):
+    """ Pull the othValues column from the other table onto the
+        (tic, pn) rows.  Rows without a match get fill
+        OUTPUT:
+          vals - array length of tic with dtype of othValues
+    """
+    othValues = np.asarray(othValues)
+    idx = join_index(tic, pn, othTic, othPn)
+    vals = np.full(idx.shape + othValues.shape[1:], fill, dtype=othValues.dtype)
+    ia = np.where(idx >= 0)[0]
+    vals[ia] = othValues[idx[ia]]
+    return vals
+
+def read_tce_list(fileName):
+    """ Read a text file of TIC and planet number, one TCE per line
+        OUTPUT:
+          tic - int64 array of TIC ids
+          pn - int array of planet numbers
+    """
+    dataBlock = np.loadtxt(fileName, dtype=np.int64, ndmin=2)
+    return dataBlock[:,0], dataBlock[:,1].astype(int)
+
+
+if __name__ == '__main__':
+    # Check the merge join against the brute force search
+    np.random.seed(1)
+    nTce = 5000
+    tic = np.random.randint(1, 400000000, size=nTce//3+1)
+    tic = np.repeat(tic, 3)[0:nTce]
+    pn = np.tile(np.arange(1, 4), nTce)[0:nTce]
+    keep = np.random.rand(nTce) < 0.7
+    othTic = tic[keep]
+    othPn = pn[keep]
+    othVals = np.random.randint(0, 2, size=len(othTic))
+    shf = np.random.permutation(len(othTic))
+    othTic, othPn, othVals = othTic[shf], othPn[shf], othVals[shf]
+
+    vals = join_values(tic, pn, othTic, othPn, othVals)
+    chkVals = np.zeros_like(pn)
+    for i in range(nTce):
+        idx = np.where((tic[i] == othTic) & (pn[i] == othPn))[0]
+        if len(idx) > 0:
+            chkVals[i] = othVals[idx[0]]
+    print('Join matches brute force: {0}'.format(np.array_equal(vals, chkVals)))
+    print('Missing rows: {0:d}'.format(np.sum(join_index(tic, pn, othTic, othPn) < 0)))
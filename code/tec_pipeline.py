@@ -0,0 +1,525 @@
+# -*- coding: utf-8 -*-
+"""
+Run the TEC stages as a DAG and only redo what changed.
+Each stage declares the files it reads and writes (from the names built
+on tec_run_parameters.run_name and the per-TCE files under the
+tec_root + tec_run_name S## directories) and the run parameters it uses.
+A stage is re-run when the content hash of any input, its parameters,
+its script (or the local modules it imports) or its outputs differ from
+its last successful run.
+Hashes are cached by modification time and size so unchanged files are
+not re-read.  Because inputs are compared by content, a stage that
+re-runs but writes identical outputs does not trigger the stages after
+it.  Stages whose inputs are ready run concurrently
+(e.g., sweet, modump and the federations).
+For stages that take -t, when the only changed input is the TCE seed
+table the stage is run on just the TCEs whose rows changed.
+The state is kept in run_name + '_pipeline_state.json' and the stage
+output goes to pipeline_logs/<stage>.log
+
+python tec_pipeline.py -n 20 -j 4
+python tec_pipeline.py --status
+"""
+
+import numpy as np
+import os
+import sys
+import glob
+import json
+import ast
+import time
+import hashlib
+import argparse
+import subprocess
+import threading
+import h5py
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from tce_join import tce_key
+import tec_run_parameters as tecrp
+
+
+class tec_stage(object):
+    """ One step of the TEC run
+        name - short stage name
+        cmd - script and its arguments
+        inputs - file names or glob patterns read by the stage.
+                 Patterns may use {run}, {wrk} and {dat} for run_name,
+                 tec_root+tec_run_name and data_root_dir
+        outputs - file names or glob patterns written by the stage
+        rawInputs - exported data read by the stage.  These are
+                 checked by modification time and size only
+        params - tec_run_parameters names the stage uses
+        nArg - smallest -n number of workers to pass, 0 if the stage
+               does not take -n
+        tceArg - stage takes -t file of TIC PN to limit the run to
+        optional - only run with --optional
+        after - other stages that must finish first
+    """
+    def __init__(self, name, cmd, inputs=[], outputs=[], rawInputs=[], \
+                 params=[], nArg=0, tceArg=False, optional=False, after=[]):
+        self.name = name
+        self.cmd = cmd
+        self.inputs = inputs
+        self.outputs = outputs
+        self.rawInputs = rawInputs
+        self.params = params
+        self.nArg = nArg
+        self.tceArg = tceArg
+        self.optional = optional
+        self.after = after
+
+TCE_FILE = '{run}_tce.h5'
+TRIAGE_FILE = 'spoc_fluxtriage_{run}.txt'
+DVTS_FILES = '{wrk}/S*/*/tess_dvts_*.h5d'
+# Per target DV statistics linked from the tess_dvts files
+DVSTATS_FILES = '{wrk}/S*/*/tess_dvstats_*.h5d'
+SESMES_FILES = '{wrk}/S*/*/tess_sesmes_*.h5d'
+CADMAP_FILE = 'cadnoVtimemap.txt'
+RUN_PARAMS = ['run_name', 'sector_number', 'start_sector', 'end_sector', \
+              'multi_sector_flag', 'tec_root', 'tec_run_name']
+
+def tec_stages():
+    """ The TEC run in the order of the procedure doc """
+    stages = [
+        tec_stage('gather', ['gather_tce_fromdvxml.py'], outputs=[TCE_FILE], \
+                  rawInputs=['{dat}' + tecrp.dv_results_dir + '/*dvr.xml*'], \
+                  params=['run_name', 'data_root_dir', 'dv_results_dir'], nArg=1),
+        tec_stage('dump', ['dump_tce_info.py'], inputs=[TCE_FILE], \
+                  outputs=['{run}_tce.txt'], params=['run_name']),
+        tec_stage('dvts', ['dvts_bulk_resamp.py'], outputs=[DVTS_FILES, DVSTATS_FILES, CADMAP_FILE], \
+                  rawInputs=['{dat}' + tecrp.dv_time_series_dir + '/*dvt.fits*'], \
+                  params=RUN_PARAMS + ['data_root_dir', 'dv_time_series_dir', \
+                  'ftl_10min', 'ftl_200sec', 'tgt_2min'], nArg=1),
+        tec_stage('skyline', ['skyline_spoc.py'], inputs=[TCE_FILE, CADMAP_FILE], \
+                  outputs=['skyline_data_{run}.txt'], params=RUN_PARAMS),
+        tec_stage('federate_knownP', ['federate_knownPWtce.py'], inputs=[TCE_FILE, CADMAP_FILE], \
+                  outputs=['federate_knownP_{run}.txt'], \
+                  params=RUN_PARAMS + ['data_root_dir', 'dv_results_dir']),
+        tec_stage('selfMatch', ['selfMatch_spoc.py'], inputs=[TCE_FILE, CADMAP_FILE], \
+                  outputs=['selfMatch_{run}.txt'], params=RUN_PARAMS),
+        tec_stage('dv_report_page', ['get_dv_report_page.py'], inputs=[TCE_FILE], \
+                  outputs=['{wrk}/S*/*/tess_diffImg_*.pdf'], \
+                  rawInputs=['{dat}' + tecrp.dv_reports_dir + '/*dvr.pdf'], \
+                  params=RUN_PARAMS + ['data_root_dir', 'dv_reports_dir', \
+                  'dv_file_prefix', 'dv_file_postfix'], nArg=1),
+        tec_stage('tpf', ['tpf_bulk_resamp.py'], inputs=[TCE_FILE, DVTS_FILES, DVSTATS_FILES], \
+                  outputs=['{wrk}/S*/*/tess_tpf_*.h5d'], \
+                  rawInputs=['{dat}' + tecrp.target_pixel_dir + '/*_tp.fits*'], \
+                  params=RUN_PARAMS + ['data_root_dir', 'target_pixel_dir', \
+                  'lc_file_prefix', 'lc_file_postfix', 'ftl_10min', \
+                  'ftl_200sec', 'tgt_2min'], optional=True),
+        tec_stage('ses_mes', ['ses_mes_stats.py'], \
+                  inputs=[TCE_FILE, 'skyline_data_{run}.txt', DVTS_FILES, \
+                  DVSTATS_FILES], \
+                  outputs=[SESMES_FILES], params=RUN_PARAMS + ['cadPerHr'], \
+                  nArg=1, tceArg=True),
+        tec_stage('federate_toi', ['federate_toiWtce.py'], inputs=[TCE_FILE, CADMAP_FILE], \
+                  outputs=['federate_toiWtce_{run}.txt'], \
+                  params=RUN_PARAMS + ['run_date']),
+        tec_stage('flux_triage', ['flux_triage.py'], inputs=[TCE_FILE, SESMES_FILES], \
+                  outputs=[TRIAGE_FILE], \
+                  params=RUN_PARAMS + ['data_root_dir', 'dv_results_dir']),
+        tec_stage('modshift_med', ['modshift_test.py', '1'], \
+                  inputs=[TCE_FILE, TRIAGE_FILE, DVTS_FILES, DVSTATS_FILES, \
+                  SESMES_FILES], \
+                  outputs=['spoc_modshift_med_{run}.txt', \
+                  '{wrk}/S*/*/tess_trpzdfit_*_1.txt'], params=RUN_PARAMS),
+        tec_stage('sweet', ['sweet_test.py'], \
+                  inputs=[TCE_FILE, TRIAGE_FILE, SESMES_FILES], \
+                  outputs=['spoc_sweet_{run}.txt'], params=RUN_PARAMS),
+        tec_stage('flxwcent', ['grab_flxwcent.py'], inputs=[TCE_FILE, TRIAGE_FILE], \
+                  outputs=['{wrk}/S*/*/tess_flxwcent_*.h5d'], \
+                  rawInputs=['{dat}' + tecrp.light_curve_dir + '/*_lc.fits*'], \
+                  params=RUN_PARAMS + ['data_root_dir', 'light_curve_dir', \
+                  'lc_file_prefix', 'lc_file_postfix', 'ftl_10min', \
+                  'ftl_200sec', 'tgt_2min']),
+        tec_stage('modump', ['modump_check.py'], \
+                  inputs=[TCE_FILE, TRIAGE_FILE, SESMES_FILES, CADMAP_FILE], \
+                  outputs=['spoc_modump_{run}.txt'], params=RUN_PARAMS),
+        tec_stage('twexo', ['gen_twexo.py'], inputs=[TRIAGE_FILE], \
+                  outputs=['{wrk}/S*/*/twexo_*.pdf'], params=RUN_PARAMS),
+        tec_stage('modshift', ['modshift_test.py', '2'], \
+                  inputs=[TCE_FILE, TRIAGE_FILE, SESMES_FILES], \
+                  outputs=['spoc_modshift_{run}.txt', \
+                  '{wrk}/S*/*/tess_trpzdfit_*_2.txt'], params=RUN_PARAMS),
+        tec_stage('centroid', ['centroid_form_basic.py'], \
+                  inputs=[TCE_FILE, TRIAGE_FILE, SESMES_FILES, \
+                  '{wrk}/S*/*/tess_trpzdfit_*_2.txt', '{wrk}/S*/*/tess_tpf_*.h5d', \
+                  '{wrk}/S*/*/tess_flxwcent_*.h5d'], \
+                  outputs=['{wrk}/S*/*/tess_bsc_diffImg_*.pdf'], \
+                  params=RUN_PARAMS + ['cadPerHr'], nArg=1, tceArg=True, \
+                  optional=True),
+        tec_stage('rank', ['rank_tces.py'], \
+                  inputs=[TCE_FILE, TRIAGE_FILE, 'spoc_modshift_{run}.txt', \
+                  'spoc_modshift_med_{run}.txt', 'spoc_sweet_{run}.txt', \
+                  'federate_toiWtce_{run}.txt', 'federate_knownP_{run}.txt', \
+                  'selfMatch_{run}.txt', 'spoc_modump_{run}.txt', \
+                  '{wrk}/S*/*/tess_flxwcent_*.h5d'], \
+                  outputs=['spoc_ranking_Tier1_{run}.txt', 'spoc_ranking_Tier2_{run}.txt', \
+                  'spoc_ranking_Tier3_{run}.txt'], params=RUN_PARAMS),
+        # reports redoes the ranking to pick the reports, but leaves the
+        #  Tier files written by rank alone
+        tec_stage('reports', ['rank_tces.py', '--notiers'], \
+                  inputs=['spoc_ranking_Tier1_{run}.txt', 'spoc_ranking_Tier2_{run}.txt', \
+                  'spoc_ranking_Tier3_{run}.txt', '{wrk}/S*/*/tess_diffImg_*.pdf', \
+                  '{wrk}/S*/*/twexo_*.pdf', '{wrk}/S*/*/tess_bsc_diffImg_*.pdf'], \
+                  outputs=['{wrk}/pdfs/tec-*.pdf'], \
+                  rawInputs=['{dat}' + tecrp.dv_reports_dir + '/*dvs*.pdf'], \
+                  params=RUN_PARAMS + ['data_root_dir', 'dv_reports_dir', \
+                  'dv_file_prefix', 'dv_file_postfix', 'ftl_10min', \
+                  'ftl_200sec', 'tgt_2min'], nArg=2, after=['modshift_med']),
+        tec_stage('merge4tev', ['merge4tev.py'], inputs=['{wrk}/pdfs/tec-*.pdf'], \
+                  outputs=['{wrk}/tevpdfs/tec-*.pdf'], \
+                  rawInputs=['{dat}' + tecrp.dv_reports_dir + '/*dvm.pdf'], \
+                  params=RUN_PARAMS + ['data_root_dir', 'dv_reports_dir', \
+                  'dv_file_prefix', 'dv_file_postfix'], nArg=1)
+        ]
+    return stages
+
+def stage_dependencies(stages):
+    """ A stage depends on the stages that write any of its inputs
+        plus its after list
+        OUTPUT:
+          deps - dict of stage name to set of upstream stage names
+    """
+    writers = {}
+    for st in stages:
+        for pat in st.outputs:
+            writers[pat] = st.name
+    deps = {}
+    for st in stages:
+        deps[st.name] = set(st.after)
+        for pat in st.inputs:
+            if pat in writers and not writers[pat] == st.name:
+                deps[st.name].add(writers[pat])
+    return deps
+
+def expand_pattern(pat):
+    return pat.format(run=tecrp.run_name, wrk=tecrp.tec_root + tecrp.tec_run_name, \
+                      dat=tecrp.data_root_dir)
+
+def pattern_files(pat):
+    """ Files matching a stage file pattern, sorted """
+    curPat = expand_pattern(pat)
+    if glob.has_magic(curPat):
+        return sorted(glob.glob(curPat))
+    if os.path.isfile(curPat):
+        return [curPat]
+    return []
+
+def file_hash(fileName, blockSize=1<<20):
+    hsh = hashlib.sha1()
+    with open(fileName, 'rb') as fp:
+        for blk in iter(lambda: fp.read(blockSize), b''):
+            hsh.update(blk)
+    return hsh.hexdigest()
+
+class file_signatures(object):
+    """ Content hashes of files cached by modification time and size
+        so a file is only read again when it was touched
+    """
+    def __init__(self, cache=None):
+        self.cache = {} if cache is None else cache
+        self.lock = threading.Lock()
+
+    def file(self, fileName):
+        stt = os.stat(fileName)
+        with self.lock:
+            ent = self.cache.get(fileName)
+        if ent is not None and ent[0] == stt.st_mtime_ns and ent[1] == stt.st_size:
+            return ent[2]
+        hsh = file_hash(fileName)
+        with self.lock:
+            self.cache[fileName] = [stt.st_mtime_ns, stt.st_size, hsh]
+        return hsh
+
+    def pattern(self, pat, statOnly=False):
+        """ One hash for all the files of a pattern.  '' if there are none """
+        fileList = pattern_files(pat)
+        if len(fileList) == 0:
+            return ''
+        hsh = hashlib.sha1()
+        for fil in fileList:
+            if statOnly:
+                stt = os.stat(fil)
+                sig = '{0:d} {1:d}'.format(stt.st_mtime_ns, stt.st_size)
+            else:
+                sig = self.file(fil)
+            hsh.update('{0} {1}\n'.format(fil, sig).encode())
+        return hsh.hexdigest()
+
+def local_imports(fileName):
+    """ The script plus every module in its directory that it imports,
+        directly or through those modules.  tec_run_parameters is left
+        out since the stages hash the parameters they use by value
+        OUTPUT:
+          fileList - sorted list of .py files
+    """
+    codeDir = os.path.dirname(fileName)
+    found = set()
+    todo = [fileName]
+    while len(todo) > 0:
+        curFile = todo.pop()
+        if curFile in found:
+            continue
+        found.add(curFile)
+        with open(curFile, 'rb') as fp:
+            try:
+                tree = ast.parse(fp.read(), filename=curFile)
+            except SyntaxError:
+                # Still hashed, its imports just are not followed
+                continue
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modNames = [x.name for x in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and \
+                    node.module is not None:
+                modNames = [node.module]
+            else:
+                continue
+            for modName in modNames:
+                modName = modName.split('.')[0]
+                modFile = os.path.join(codeDir, modName + '.py')
+                if not modName == 'tec_run_parameters' and os.path.isfile(modFile):
+                    todo.append(modFile)
+    return sorted(found)
+
+def param_hash(st, sigs):
+    """ Hash of the stage script and the local modules it imports, its
+        arguments and the run parameters it uses """
+    hsh = hashlib.sha1()
+    hsh.update(' '.join(st.cmd).encode())
+    for fil in local_imports(st.cmd[0]):
+        hsh.update('{0} {1}\n'.format(fil, sigs.file(fil)).encode())
+    for par in st.params:
+        hsh.update('{0}={1!r}\n'.format(par, getattr(tecrp, par, None)).encode())
+    return hsh.hexdigest()
+
+def tce_row_hashes(fileName):
+    """ Hash of every row of the TCE seed table keyed by tce_key
+        OUTPUT:
+          rowHashes - dict of str(tce_key) to row hash
+    """
+    fp = h5py.File(fileName, 'r')
+    data = np.array(fp['dset'])
+    fp.close()
+    keys = tce_key(data['epicId'], data['planetNum'])
+    rowHashes = {}
+    for key, row in zip(keys, data):
+        rowHashes[str(key)] = hashlib.sha1(row.tobytes()).hexdigest()
+    return rowHashes
+
+def changed_tces(oldRows, newRows):
+    """ TIC and planet numbers of new TCEs and TCEs whose row changed """
+    keys = np.array([int(k) for k in newRows if oldRows.get(k) != newRows[k]], \
+                    dtype=np.int64)
+    keys = np.sort(keys)
+    return keys // 1000, np.mod(keys, 1000)
+
+class tec_pipeline(object):
+    """ Decide which stages are out of date and run them """
+    def __init__(self, stages, stateFile, nWorkers=1, logDir='pipeline_logs', \
+                 withOptional=False, force=[]):
+        self.stages = stages
+        self.bystage = dict((st.name, st) for st in stages)
+        self.deps = stage_dependencies(stages)
+        self.stateFile = stateFile
+        self.nWorkers = nWorkers
+        self.logDir = logDir
+        self.withOptional = withOptional
+        self.force = set(force)
+        self.state = {'files': {}, 'stages': {}, 'tceRows': {}}
+        if os.path.isfile(stateFile):
+            with open(stateFile, 'r') as fp:
+                self.state = json.load(fp)
+        self.sigs = file_signatures(self.state['files'])
+        self.lock = threading.Lock()
+
+    def save_state(self):
+        with self.lock:
+            # Only keep the TCE row tables some stage still refers to
+            used = set(ent.get('tce', '') for ent in self.state['stages'].values())
+            self.state['tceRows'] = dict((k, v) for k, v in \
+                    self.state['tceRows'].items() if k in used)
+            tmpFile = self.stateFile + '.tmp'
+            with open(tmpFile, 'w') as fp:
+                json.dump(self.state, fp)
+            os.replace(tmpFile, self.stateFile)
+
+    def current(self, st):
+        """ Signature of the stage as the files are now """
+        cur = {'params': param_hash(st, self.sigs), 'inputs': {}, 'outputs': {}}
+        for pat in st.inputs:
+            cur['inputs'][pat] = self.sigs.pattern(pat)
+        for pat in st.rawInputs:
+            cur['inputs'][pat] = self.sigs.pattern(pat, statOnly=True)
+        for pat in st.outputs:
+            cur['outputs'][pat] = self.sigs.pattern(pat)
+        cur['tce'] = cur['inputs'].get(TCE_FILE, '')
+        return cur
+
+    def plan(self, st):
+        """ What to do for stage st
+            OUTPUT:
+              action - 'fresh', 'tces' or 'run'
+              cur - current signature
+              reason - why the stage runs
+        """
+        cur = self.current(st)
+        prev = self.state['stages'].get(st.name)
+        if st.name in self.force:
+            return 'run', cur, 'forced'
+        if prev is None or not prev.get('ok', False):
+            return 'run', cur, 'no previous run'
+        if not cur['params'] == prev['params']:
+            return 'run', cur, 'script or parameters changed'
+        missOut = [pat for pat in st.outputs if cur['outputs'][pat] == '']
+        if len(missOut) > 0:
+            return 'run', cur, 'missing outputs {0}'.format(missOut)
+        chgOut = [pat for pat in st.outputs if not cur['outputs'][pat] == prev['outputs'].get(pat)]
+        chgIn = [pat for pat in cur['inputs'] if not cur['inputs'][pat] == prev['inputs'].get(pat)]
+        if len(chgIn) == 0 and len(chgOut) == 0:
+            return 'fresh', cur, ''
+        if st.tceArg and chgIn == [TCE_FILE] and len(chgOut) == 0 and \
+                prev['tce'] in self.state['tceRows']:
+            return 'tces', cur, 'TCE rows changed'
+        return 'run', cur, 'changed {0}'.format(chgIn + chgOut)
+
+    def run_stage(self, st):
+        """ Bring one stage up to date.  Returns True on success """
+        action, cur, reason = self.plan(st)
+        if action == 'fresh':
+            print('{0}: up to date'.format(st.name))
+            return True
+        cmd = [sys.executable] + list(st.cmd)
+        if st.nArg > 0:
+            # rank_tces.py only makes the reports with more than one worker
+            cmd = cmd + ['-n', '{0:d}'.format(max(self.nWorkers, st.nArg))]
+        newRows = None
+        if st.tceArg and not cur['tce'] == '':
+            newRows = tce_row_hashes(expand_pattern(TCE_FILE))
+        if action == 'tces':
+            tic, pn = changed_tces(self.state['tceRows'][self.state['stages'][st.name]['tce']], newRows)
+            print('{0}: {1} {2:d} TCEs'.format(st.name, reason, len(tic)))
+            if len(tic) == 0:
+                return self.record(st, cur, newRows)
+            tceListFile = '{0}_pipeline_{1}_tces.txt'.format(tecrp.run_name, st.name)
+            np.savetxt(tceListFile, np.column_stack((tic, pn)), fmt='%d')
+            cmd = cmd + ['-t', tceListFile]
+        else:
+            print('{0}: running, {1}'.format(st.name, reason))
+        if not os.path.exists(self.logDir):
+            os.makedirs(self.logDir, exist_ok=True)
+        logFile = os.path.join(self.logDir, st.name + '.log')
+        env = dict(os.environ)
+        env.setdefault('MPLBACKEND', 'Agg')
+        t0 = time.time()
+        with open(logFile, 'w') as fp:
+            rc = subprocess.call(cmd, stdout=fp, stderr=subprocess.STDOUT, env=env)
+        print('{0}: finished rc={1:d} in {2:.1f} s log {3}'.format(st.name, rc, \
+              time.time()-t0, logFile))
+        if not rc == 0:
+            with self.lock:
+                self.state['stages'][st.name] = {'ok': False}
+            return False
+        # Inputs are as they were at the start, outputs as written
+        for pat in st.outputs:
+            cur['outputs'][pat] = self.sigs.pattern(pat)
+        return self.record(st, cur, newRows)
+
+    def record(self, st, cur, newRows):
+        cur['ok'] = True
+        with self.lock:
+            self.state['stages'][st.name] = cur
+            if newRows is not None:
+                self.state['tceRows'][cur['tce']] = newRows
+        return True
+
+    def selected(self, st):
+        return self.withOptional or not st.optional
+
+    def status(self):
+        """ Print whether each stage would run.  Does not account for
+            upstream stages that would re-run first """
+        for st in self.stages:
+            if not self.selected(st):
+                print('{0:16s} optional, skipped'.format(st.name))
+                continue
+            action, cur, reason = self.plan(st)
+            print('{0:16s} {1:6s} {2}'.format(st.name, action, reason))
+
+    def run(self, maxStages=4):
+        """ Run the out of date stages.  A stage starts once all of its
+            upstream stages finished.  Stages downstream of a failure
+            are not run
+            OUTPUT:
+              result - dict of stage name to 'ok', 'failed', 'blocked'
+                       or 'skipped'
+        """
+        result = {}
+        pending = [st.name for st in self.stages]
+        running = {}
+        with ThreadPoolExecutor(max_workers=maxStages) as ex:
+            while len(pending) > 0 or len(running) > 0:
+                progress = False
+                for name in list(pending):
+                    upstream = self.deps[name]
+                    if not all(up in result for up in upstream):
+                        continue
+                    pending.remove(name)
+                    progress = True
+                    st = self.bystage[name]
+                    if not self.selected(st):
+                        result[name] = 'skipped'
+                    elif any(result[up] in ('failed', 'blocked') for up in upstream):
+                        print('{0}: blocked by failed upstream stage'.format(name))
+                        result[name] = 'blocked'
+                    else:
+                        running[ex.submit(self.run_stage, st)] = name
+                if len(running) == 0:
+                    if progress:
+                        continue
+                    # Nothing can ever start, a cycle or an unknown stage
+                    #  in an after list
+                    raise RuntimeError('Stages can not start: {0}'.format( \
+                        ', '.join('{0} waits on {1}'.format(name, \
+                        sorted(up for up in self.deps[name] if not up in result)) \
+                        for name in pending)))
+                doneSet, notDone = wait(list(running), return_when=FIRST_COMPLETED)
+                for fut in doneSet:
+                    name = running.pop(fut)
+                    try:
+                        ok = fut.result()
+                    except Exception as err:
+                        print('{0}: {1}'.format(name, err))
+                        ok = False
+                    result[name] = 'ok' if ok else 'failed'
+                    self.save_state()
+        return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int,\
+                        default = 1, \
+                        help="Number of Workers for the stages that take -n")
+    parser.add_argument("-j", type=int,\
+                        default = 4, \
+                        help="Number of stages run at the same time")
+    parser.add_argument("--optional", action='store_true', \
+                        help="Also run the optional tpf and centroid stages")
+    parser.add_argument("--force", nargs='*', default=[], \
+                        help="Stages to re-run regardless of their state")
+    parser.add_argument("--status", action='store_true', \
+                        help="Only report which stages are out of date")
+    args = parser.parse_args()
+
+    stateFile = tecrp.run_name + '_pipeline_state.json'
+    pipe = tec_pipeline(tec_stages(), stateFile, nWorkers=args.n, \
+                        withOptional=args.optional, force=args.force)
+    if args.status:
+        pipe.status()
+    else:
+        result = pipe.run(maxStages=args.j)
+        for st in pipe.stages:
+            print('{0:16s} {1}'.format(st.name, result[st.name]))
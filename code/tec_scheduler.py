@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Run the per TCE work of a stage over a pool of processes.
+The stages used to be split into -w/-n shards with np.mod(i, nWrk) == wID
+and launched by hand with GNU parallel.  The cost of a TCE varies a lot
+(number of sectors, cadences, pixels), so one shard often ran for hours
+after the rest finished.  Here all the tasks go to one
+concurrent.futures process pool, submitted largest estimated cost first,
+so the pool hands out work as workers free up and the long tasks do not
+straggle at the end.  A task that raises is reported and skipped rather
+than ending the run, and the stage exits with a non-zero status after
+all the other tasks finish so the failure is not lost.
+"""
+
+import numpy as np
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def schedule_order(costs):
+    """ Order to submit tasks, largest cost first.  Ties keep task order
+        INPUT:
+          costs - estimated cost of each task
+        OUTPUT:
+          order - int array of task indices
+    """
+    return np.argsort(-np.asarray(costs, dtype=float), kind='mergesort')
+
+def run_task(func, task):
+    """ Run func(task) catching any exception so it is passed back
+        to the scheduler rather than ending the run
+        OUTPUT:
+          ok - True if func returned
+          result - return value of func or the traceback string
+    """
+    try:
+        return True, func(task)
+    except Exception:
+        return False, traceback.format_exc()
+
+def run_tasks(func, tasks, costs=None, nWorkers=1, taskNames=None):
+    """ Run func on every task.  With nWorkers > 1 the tasks go to a
+        process pool largest cost first.  func must be a module level
+        function and the tasks must pickle
+        INPUT:
+          func - function of one argument run on each task
+          tasks - list of tasks
+          costs - estimated cost of each task, None runs in task order
+          nWorkers - number of processes, 1 runs in this process
+          taskNames - label for each task used in the failure messages
+        OUTPUT:
+          results - list of func(task) in task order, None for failed tasks
+          failed - list of indices of the tasks that failed
+    """
+    nTask = len(tasks)
+    if costs is None:
+        costs = np.zeros((nTask,))
+    if taskNames is None:
+        taskNames = ['{0:d}'.format(i) for i in range(nTask)]
+    results = [None] * nTask
+    failed = []
+    if nWorkers == 1:
+        for i in range(nTask):
+            ok, res = run_task(func, tasks[i])
+            if ok:
+                results[i] = res
+            else:
+                print('Task {0} failed\n{1}'.format(taskNames[i], res))
+                failed.append(i)
+    else:
+        # Reseed numpy in each worker so forked workers do not all
+        #  draw the same random numbers from the parent state
+        with ProcessPoolExecutor(max_workers=nWorkers, initializer=np.random.seed) as ex:
+            futs = {}
+            for i in schedule_order(costs):
+                futs[ex.submit(run_task, func, tasks[i])] = i
+            nDone = 0
+            for fut in as_completed(futs):
+                i = futs[fut]
+                nDone = nDone + 1
+                try:
+                    ok, res = fut.result()
+                except Exception:
+                    # The worker process died (e.g. killed for memory)
+                    ok, res = False, traceback.format_exc()
+                if ok:
+                    results[i] = res
+                else:
+                    print('Task {0} failed\n{1}'.format(taskNames[i], res))
+                    failed.append(i)
+                print('Done {0:d} of {1:d}'.format(nDone, nTask))
+    failed.sort()
+    if len(failed) > 0:
+        print('{0:d} of {1:d} tasks failed: {2}'.format(len(failed), nTask, \
+              ', '.join(taskNames[i] for i in failed)))
+    return results, failed
+
+def exit_if_failed(failed):
+    """ Exit with status 1 if any task failed so the shell or
+        tec_pipeline sees the stage as failed and reruns it
+        INPUT:
+          failed - list of failed task indices from run_tasks
+    """
+    if len(failed) > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    # Check ordering, in order results and a failing task
+    def cost_task(x):
+        if x == 3:
+            raise ValueError('bad task')
+        return x*x
+    tasks = list(range(10))
+    costs = np.random.rand(10)
+    print('Largest first: {0}'.format(np.all(np.diff(costs[schedule_order(costs)]) <= 0.0)))
+    results, failed = run_tasks(cost_task, tasks, costs, nWorkers=3)
+    print('Results in order: {0} Failed: {1}'.format( \
+          results == [x*x if x != 3 else None for x in tasks], failed))
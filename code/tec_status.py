@@ -7,7 +7,8 @@ AUTHOR: Christopher J. Burke
 """
 
 import numpy as np
-from gather_tce_fromdvxml import tce_seed
+from gather_tce_fromdvxml import TceCatalog
+from tce_join import join_values
 import os
 from subprocess import Popen, PIPE
 import math
@@ -73,14 +74,13 @@ if __name__ == '__main__':
     prereq = 0
     if (os.path.isfile(tceSeedInFile)):
         # Load the tce data h5
-        tcedata = tce_seed()
-        all_tces = tcedata.fill_objlist_from_hd5f(tceSeedInFile)
-        alltic = np.array([x.epicId for x in all_tces], dtype=np.int64)
-        all_pns = np.array([x.planetNum for x in all_tces], dtype=int)
-        allsolarflux = np.array([x.at_effflux for x in all_tces])
-        alltrpvalid = np.array([x.trp_valid for x in all_tces])
-        allatvalid = np.array([x.at_valid for x in all_tces], dtype=int)
-        allper = np.array([x.at_period for x in all_tces])
+        tcecat = TceCatalog(tceSeedInFile)
+        alltic = np.asarray(tcecat['epicId'], dtype=np.int64)
+        all_pns = np.asarray(tcecat['planetNum'], dtype=int)
+        allsolarflux = tcecat['at_effflux']
+        alltrpvalid = tcecat['trp_valid']
+        allatvalid = np.asarray(tcecat['at_valid'], dtype=int)
+        allper = tcecat['at_period']
 
         allUnqTic = np.unique(alltic)
         prereq = 1
@@ -209,11 +209,7 @@ if __name__ == '__main__':
             fvpn = dataBlock['f1']
             fvvet = dataBlock['f2']
             
-            allvet = np.zeros_like(all_pns)
-            for i in range(len(allvet)):
-                idx = np.where((alltic[i] == fvtic) & (all_pns[i] == fvpn))[0]
-                if len(idx) > 0:
-                    allvet[i] = fvvet[idx]
+            allvet = join_values(alltic, all_pns, fvtic, fvpn, fvvet).astype(all_pns.dtype)
         else:
             print('Triage File Does NOT Exist!')
 
@@ -21,6 +21,7 @@ http://adsabs.harvard.edu/abs/2015ApJS..217...31M
 
 import argparse
 import numpy as np
+import scipy.special as spec
 import sys
 
 import cjb_utils as cjb
@@ -45,33 +46,119 @@ class timeseries:
         self.tsjd = np.copy(self.ts + 2400000.5)
         self.ts = np.copy(self.ts) # whatever is left in self.ts is system 
                                         # used in calculation
-        self.ephemCentral = np.zeros((self.nt,), dtype=np.int8)
-        self.ephemFull = np.zeros_like(self.ephemCentral)
+        # The ephemeris is kept as runs of in transit cadences,
+        #  self.ts[ephemLo:ephemHi], rather than full length vectors.
+        #  ephemFull and ephemCentral are only filled out when asked for
+        self.ephemLo = np.array([], dtype=np.int64)
+        self.ephemHi = np.array([], dtype=np.int64)
         
     def makeEphemVector(self, period, epoch, duration):
-        """ Make the ephemeris arrays """
-        self.ephemCentral = np.zeros((self.nt,), dtype=np.int8)
-        self.ephemFull = np.zeros_like(self.ephemCentral)
-        phase = np.mod((self.ts - epoch), period) / period
-        phaseDuration = (duration / 24.0) / period / 2.0
-        idx = np.where(phase > 0.5)[0]
-        phase[idx] = phase[idx] - 1.0
-        idx = np.where(np.abs(phase) <= phaseDuration)[0]
-        self.ephemFull[idx] = 1
-        # Detect edges of sequences of ones
-        offsetdiff = np.diff(self.ephemFull)
-        offsetdiff = np.insert(offsetdiff, 0, self.ephemFull[0])
-        offsetdiff = np.insert(offsetdiff, len(offsetdiff), self.ephemFull[-1])
-        # Get indices that edges occur on 
-        idx = np.where(np.abs(offsetdiff) == 1)[0]
-        # Get mean of the edge indices in order to find central index
-        b = np.reshape(idx, (int((len(idx)/2)), 2))
-        c = np.zeros_like(b)
-        c[:,1] = 1
-        idx = np.int64((np.mean((b-c), 1)).flatten())
-        self.ephemCentral[idx] = 1
+        """ Make the ephemeris runs """
+        which, self.ephemLo, self.ephemHi = \
+                ephem_runs(*self.makeEphemWindows(period, epoch, duration))
         return self
-        
+
+    @property
+    def ephemFull(self):
+        """ 0/1 vector of in transit cadences """
+        diff = np.zeros((self.nt+1,), dtype=np.int8)
+        diff[self.ephemLo] = 1
+        diff[self.ephemHi] -= 1
+        return np.cumsum(diff[0:-1], dtype=np.int8)
+
+    @property
+    def ephemCentral(self):
+        """ 0/1 vector with the central cadence of each run of ephemFull """
+        central = np.zeros((self.nt,), dtype=np.int8)
+        central[(self.ephemLo + self.ephemHi - 1) // 2] = 1
+        return central
+
+    def makeEphemWindows(self, periods, epochs, durations):
+        """ In transit windows of many ephemerides at once.  The windows
+            cover the same cadences as ephemFull from makeEphemVector,
+            but as index ranges rather than a full length vector per
+            ephemeris
+            INPUT:
+              periods [day], epochs, durations [hr] - arrays of ephemerides
+            OUTPUT:
+              which - index of the ephemeris each window belongs to
+              lo, hi - window covers self.ts[lo:hi].  Windows of the same
+                       ephemeris do not overlap and are in time order
+        """
+        periods = np.atleast_1d(np.asarray(periods, dtype=float))
+        epochs = np.atleast_1d(np.asarray(epochs, dtype=float))
+        durations = np.atleast_1d(np.asarray(durations, dtype=float))
+        # The phase test finds no transits for these
+        gd = np.where(periods > 0.0)[0]
+        halfDur = durations[gd] / 24.0 / 2.0
+        kmin = np.floor((self.ts[0] - halfDur - epochs[gd]) / periods[gd]).astype(np.int64)
+        kmax = np.ceil((self.ts[-1] + halfDur - epochs[gd]) / periods[gd]).astype(np.int64)
+        nEvt = kmax - kmin + 1
+        evtStart = np.cumsum(nEvt) - nEvt
+        which = np.repeat(gd, nEvt)
+        k = np.repeat(kmin - evtStart, nEvt) + np.arange(np.sum(nEvt))
+        per = periods[which]
+        epc = epochs[which]
+        dur = durations[which]
+        center = epc + k * per
+        lo = np.searchsorted(self.ts, center - dur / 24.0 / 2.0, side='left')
+        hi = np.searchsorted(self.ts, center + dur / 24.0 / 2.0, side='right')
+        # Round off can put an edge a cadence away from where the
+        #  in_transit phase test puts it.  Move the edges to agree
+        for it in range(2):
+            j = np.maximum(lo-1, 0)
+            lo = lo - ((lo > 0) & in_transit(self.ts[j], per, epc, dur))
+            j = np.minimum(lo, self.nt-1)
+            lo = lo + ((lo < hi) & np.logical_not(in_transit(self.ts[j], per, epc, dur)))
+            j = np.minimum(hi, self.nt-1)
+            hi = hi + ((hi < self.nt) & in_transit(self.ts[j], per, epc, dur))
+            j = np.maximum(hi-1, 0)
+            hi = hi - ((hi > lo) & np.logical_not(in_transit(self.ts[j], per, epc, dur)))
+        # Windows longer than the period overlap the previous window
+        prevHi = np.insert(hi[0:-1], 0, 0)
+        prevHi[evtStart[nEvt > 0]] = 0
+        lo = np.maximum(lo, prevHi)
+        idx = np.where(hi > lo)[0]
+        return which[idx], lo[idx], hi[idx]
+
+
+def in_transit(t, period, epoch, duration):
+    """ Phase test for in transit times, element by element on arrays of
+        times and ephemerides """
+    phase = np.mod((t - epoch), period) / period
+    phase = np.where(phase > 0.5, phase - 1.0, phase)
+    phaseDuration = (duration / 24.0) / period / 2.0
+    return np.abs(phase) <= phaseDuration
+
+
+def ephem_runs(which, lo, hi):
+    """ Merge windows from makeEphemWindows that touch into the runs of
+        ones in ephemFull.  A run spanning several windows has a single
+        central cadence in ephemCentral
+        OUTPUT:
+          which, lo, hi - of the runs
+    """
+    if len(lo) == 0:
+        return which, lo, hi
+    newRun = np.ones((len(lo),), dtype=bool)
+    newRun[1:] = (which[1:] != which[0:-1]) | (lo[1:] != hi[0:-1])
+    runStart = np.where(newRun)[0]
+    runEnd = np.append(runStart[1:], len(lo)) - 1
+    return which[runStart], lo[runStart], hi[runEnd]
+
+
+
+def coughlin_sigmap(p1, p2):
+    """ Significance that periods p1 and p2 are at an integer ratio.
+        p1 and p2 broadcast against each other, e.g., p1[:,None] and
+        p2[None,:] gives the matrix of all pairs
+    """
+    up1 = np.minimum(p1, p2)
+    up2 = np.maximum(p1, p2)
+    delP = (up1 - up2)/up1
+    delPp = np.abs(delP - np.round(delP))
+    return np.sqrt(2.0)*spec.erfcinv(delPp)
+
 
 def federateFunction(period, epoch, ts, tcePeriods, tceEpochs, tceDurations):
     # Here are some algorithm parameters
@@ -89,38 +176,30 @@ def federateFunction(period, epoch, ts, tcePeriods, tceEpochs, tceDurations):
     minPer = minMult * period
     maxPer = maxMult * period
     curntce = len(tcePeriods)
-    # Make ephemeris vector for TOI
-    ts = ts.makeEphemVector(period, epoch, 1.0)
-    toiephem = ts.ephemCentral
-    toiephem2d = np.tile(toiephem, (curntce, 1))
-    nindatabase = np.sum(toiephem2d, 1)
-    idx = np.where(nindatabase == 0)[0]
-    nindatabase[idx] = 1
-    # Build the 2D ephem matrix for the TCEs
-    curngd = np.zeros((curntce,))
-    curngd2 = np.zeros_like(curngd)
-    allpers = np.zeros_like(curngd)
-    matchres = np.zeros_like(curngd)
-    tceephem2d = np.zeros_like(toiephem2d)
-    for kk in range(curntce):
-        tcePeriod = tcePeriods[kk]
-        allpers[kk] = tcePeriod
-        tceEpoch = tceEpochs[kk]
-        tceDuration = tceDurations[kk]
-        tceDuration = tceDuration * 2.0
-        if (tceDuration/24.0 / tcePeriod > 0.25):
-            tceDuration = tcePeriod * 0.25 * 24.0
-        if tcePeriod < 1.0:
-            durFloor = durFloorShort
-        tceDuration = np.max([tceDuration, durFloor])
-        ts = ts.makeEphemVector(tcePeriod, tceEpoch, tceDuration)
-        tceephem2d[kk,:] = ts.ephemFull
-        curngd2[kk] = np.max([1.0,np.sum(ts.ephemCentral)])
-        curngd[kk] = np.sum(ts.ephemFull)
-    inverttceephem2d = np.logical_not(tceephem2d)
-    corr1 = tceephem2d * toiephem2d
-    corr2 = inverttceephem2d * toiephem2d
-    stats = np.sum(corr1,1) / curngd2 - np.sum(corr2,1) / nindatabase
+    allpers = np.array(tcePeriods, dtype=float)
+    matchres = np.zeros((curntce,))
+    # Central cadence of the TOI transits, these are the ones in
+    #  ephemCentral of makeEphemVector
+    which, lo, hi = ephem_runs(*ts.makeEphemWindows(period, epoch, 1.0))
+    toiCentral = (lo + hi - 1) // 2
+    nindatabase = np.max([1, len(toiCentral)])
+    # TCE durations are doubled, capped at a quarter of the period, and
+    #  floored.  Once a TCE with period < 1 day is seen the shorter
+    #  floor applies to it and all the TCEs after it
+    tceDurs = np.array(tceDurations, dtype=float) * 2.0
+    idx = np.where(tceDurs/24.0 / allpers > 0.25)[0]
+    tceDurs[idx] = allpers[idx] * 0.25 * 24.0
+    durFloors = np.where(np.logical_or.accumulate(allpers < 1.0), \
+                         durFloorShort, durFloor)
+    tceDurs = np.maximum(tceDurs, durFloors)
+    # In transit windows of all TCEs
+    which, lo, hi = ephem_runs(*ts.makeEphemWindows(allpers, tceEpochs, tceDurs))
+    curngd2 = np.maximum(1.0, np.bincount(which, minlength=curntce))
+    # Count TOI central cadences inside the TCE windows rather than
+    #  multiplying full length ephemeris vectors
+    nInWindow = np.searchsorted(toiCentral, hi) - np.searchsorted(toiCentral, lo)
+    nIn = np.bincount(which, weights=nInWindow, minlength=curntce)
+    stats = nIn / curngd2 - (len(toiCentral) - nIn) / nindatabase
     idx = np.where((allpers < minPer) | (allpers > maxPer))[0]
     stats[idx] = -1.0
     if (period < minPeriod):
@@ -14,7 +14,7 @@ from statsmodels import robust
 import glob
 import os
 import math
-from gather_tce_fromdvxml import tce_seed
+from gather_tce_fromdvxml import TceCatalog
 import cjb_utils as cjb
 import tec_run_parameters as tecrp
 
@@ -36,17 +36,84 @@ def idx_filter(idx, *array_list):
         new_array_list.append(array[idx])
     return new_array_list
 
-def tpf_resamp(file, fileOut, RESAMP, lcFile):
+class tpf_pixel_reader(object):
+    """ Read the pixel time series of a tess_tpf h5d cube one pixel
+        at a time.  With the pixel chunked cubes written by tpf_resamp
+        each read only decompresses that pixel
+        tpfr = tpf_pixel_reader(fileName)
+        curFlx = tpfr.pixel(ii, jj)
+        allFlx = tpfr.stamp(cadIdx)
+    """
+    def __init__(self, fileName, dsetName='flux_array'):
+        self.fp = h5py.File(fileName, 'r')
+        self.dset = self.fp[dsetName]
+        self.shape = self.dset.shape
+
+    def pixel(self, ii, jj):
+        return self.dset[:, ii, jj]
+
+    def stamp(self, cadIdx=None, blockRows=1):
+        # All pixel time series as (nx*ny, time) with pixel ii, jj
+        #  in row ii*ny+jj.  cadIdx (index array, mask or slice) keeps
+        #  only those cadences.  The cube is read blockRows pixel rows at
+        #  a time so only the kept cadences of the whole stamp are in memory
+        nt, nx, ny = self.shape
+        if cadIdx is None:
+            cadIdx = slice(None)
+        tIdx = np.arange(nt)[cadIdx]
+        allFlx = np.empty((nx*ny, len(tIdx)), dtype=self.dset.dtype)
+        for i0 in range(0, nx, blockRows):
+            blk = self.dset[:, i0:i0+blockRows, :][tIdx]
+            nr = blk.shape[1]
+            allFlx[i0*ny:(i0+nr)*ny, :] = np.reshape(np.moveaxis(blk, 0, -1), \
+                                                     (nr*ny, len(tIdx)))
+        return allFlx
+
+    def close(self):
+        self.fp.close()
+
+def saturation_median_image(flux_array, valid_data_flag, blockRows=None):
+    """ Median image and saturated pixel flags over the valid cadences
+        of the (time, nx, ny) flux cube.  A pixel is saturated when it
+        is bright and its point-to-point scatter is very small.
+        INPUT:
+          flux_array - (time, nx, ny) flux cube
+          valid_data_flag - boolean of valid cadences
+          blockRows - None does the whole cube in one reduction.  Otherwise
+                      only blockRows rows of pixels are reduced at a time
+                      to bound the memory on very long cubes
+        OUTPUT:
+          saturate_pixel - (nx, ny) int 1 for saturated pixel
+          median_image - (nx, ny) median flux over valid cadences
+    """
+    nx = flux_array.shape[1]
+    ny = flux_array.shape[2]
+    saturate_pixel = np.zeros((nx, ny), dtype=int)
+    median_image = np.zeros((nx, ny))
+    if blockRows is None:
+        blockRows = nx
+    for i0 in range(0, nx, blockRows):
+        curflux = flux_array[valid_data_flag, i0:i0+blockRows, :]
+        diff_flux = np.diff(curflux, axis=0)
+        robmad = robust.mad(diff_flux, axis=0)
+        medval = np.median(curflux, axis=0)
+        median_image[i0:i0+blockRows, :] = medval
+        with np.errstate(divide='ignore', invalid='ignore'):
+            satflg = (medval > 1000.0) & (np.log10(robmad/medval) < -3.5)
+        saturate_pixel[i0:i0+blockRows, :] = satflg
+    return saturate_pixel, median_image
+
+def tpf_resamp(file, fileOut, RESAMP, lcFile, blockRows=None):
     """ Resample TESS target pixel file and save as h5d format
-        resamp - Resample factor just make it odd okay"""    
+        resamp - Resample factor just make it odd okay
+        blockRows - pixel rows per block for the saturation and median
+                    image, None for the whole cube at once"""    
     hdulist = fits.open(file)
     arr = hdulist[1].data[0]['FLUX']
     nImage = len(hdulist[1].data[:]['CADENCENO'])
     shp = arr.shape
     nx = shp[0]
     ny = shp[1]
-    saturate_pixel = np.zeros((nx, ny), dtype=int)
-    median_image = np.zeros((nx, ny))
 
     # Get header information that we should keep
     keepprihdr = ['TICID','SECTOR','CAMERA','CCD','PXTABLE','RA_OBJ', \
@@ -110,16 +177,8 @@ def tpf_resamp(file, fileOut, RESAMP, lcFile):
 
 
     # Identify saturated pixels
-    for i in range(nx):
-        for j in range(ny):
-            curflux = flux_array[:,i,j]
-            diff_flux = np.diff(curflux[valid_data_flag])
-            robmad = robust.mad(diff_flux)
-            medval = np.median(curflux[valid_data_flag])
-            median_image[i,j] = medval
-            if medval > 1000.0 and np.log10(robmad/medval) < -3.5:
-                saturate_pixel[i,j] = 1
-#                print("Saturated Pixel detected x: {0:d} y: {1:d}".format(i, j))
+    saturate_pixel, median_image = saturation_median_image(flux_array, \
+                                        valid_data_flag, blockRows=blockRows)
 
  
     # Now save data as h5py
@@ -129,8 +188,13 @@ def tpf_resamp(file, fileOut, RESAMP, lcFile):
     f = h5py.File(fileOut, 'w')
     tmp = f.create_dataset('cadenceNo', data=cadenceNo, compression='gzip') 
     tmp = f.create_dataset('timetbjd', data=timetbjd, compression='gzip')
-    tmp = f.create_dataset('flux_array', data=flux_array, compression='gzip')
-    tmp = f.create_dataset('flux_bkg_array', data=flux_bkg_array, compression='gzip')
+    # The cubes are chunked one pixel time series per chunk with the
+    #  fast lzf compressor so a single pixel is read without decompressing
+    #  the whole cube (see tpf_pixel_reader)
+    tmp = f.create_dataset('flux_array', data=flux_array, chunks=(newNImage,1,1), \
+                           compression='lzf', shuffle=True)
+    tmp = f.create_dataset('flux_bkg_array', data=flux_bkg_array, chunks=(newNImage,1,1), \
+                           compression='lzf', shuffle=True)
     tmp = f.create_dataset('dq_flag', data=dq_flag, compression='gzip') 
     tmp = f.create_dataset('valid_data_flag', data=valid_data_flag, compression='gzip')
     tmp = f.create_dataset('saturate_pixel', data=saturate_pixel, compression='gzip')
@@ -187,6 +251,9 @@ if __name__ == "__main__":
         raise Exception(__name__,': Error cadence type not properly defined')
 
     overwrite = False
+    # Set to a number of pixel rows to bound memory in the saturated pixel
+    #  and median image calculation on very long multi-sector cubes
+    pixBlockRows = None
 
     #  Directory list for Sector light curve files
     # Use this block for Multi-sector runs
@@ -307,10 +374,9 @@ if __name__ == "__main__":
     #   al that it uses is TIC.  If it exists it is made
     # Load the tce data h5
     tceSeedInFile = run_name + '_tce.h5'
-    tcedata = tce_seed()
-    all_tces = tcedata.fill_objlist_from_hd5f(tceSeedInFile)
+    tcecat = TceCatalog(tceSeedInFile)
 
-    alltic = np.unique(np.array([x.epicId for x in all_tces], dtype=np.int64))
+    alltic = np.unique(np.asarray(tcecat['epicId'], dtype=np.int64))
 
     cnt=0
 
@@ -327,7 +393,7 @@ if __name__ == "__main__":
                 if os.path.isfile(fileInput):
                     fileExists=os.path.isfile(fileOutput)
                     if (not fileExists) or overwrite:
-                        tpf_resamp(fileInput, fileOutput, RESAMP, fileLCInputList[0])
+                        tpf_resamp(fileInput, fileOutput, RESAMP, fileLCInputList[0], blockRows=pixBlockRows)
                     else:
                         print('Skipping ', fileOutput)
         cnt = cnt + 1